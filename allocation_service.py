@@ -0,0 +1,124 @@
+"""Local number allocation service for modellers numbering split files of one project at the same time.
+
+Example:
+    python allocation_service.py --store allocations.json --port 8765
+
+Each modeller enables Use allocation service in the numbering panel with the URL of the service.
+A numbering run then reserves ranges of numbers per prefix (the number without its trailing integer,
+e.g. W- for W-012) in one request, for all prefixes it needs at once. The service hands out every
+number only once, so numbers from different files do not collide when they are federated. The next
+free number of each prefix and a log of the reservations are kept in the store file, which is
+written on every reservation, so the service can be restarted without handing out numbers twice.
+
+The AllocationStore can also be used in-process instead of the service, e.g. in tests or scripts:
+    numbering_tool.NumberAllocation.backend = AllocationStore("allocations.json")
+"""
+
+import argparse
+import http.server
+import json
+import os
+import sys
+import threading
+import time
+
+
+class AllocationStore:
+    """Next free number per prefix and the reservations made, optionally backed by a JSON file"""
+
+    def __init__(self, path=None):
+        self.path = path
+        self.lock = threading.Lock()
+        self.data = {"next": {}, "reservations": []}
+        if path and os.path.exists(path):
+            with open(path) as f:
+                self.data = json.load(f)
+
+    def reserve(self, counts, owner=""):
+        """Reserve count numbers for each prefix, returning the reserved range of each prefix as (start, stop)"""
+        ranges = {}
+        with self.lock:
+            for prefix, count in counts.items():
+                if int(count) < 1:
+                    continue
+                start = self.data["next"].get(prefix, 1)
+                self.data["next"][prefix] = start + int(count)
+                ranges[prefix] = (start, start + int(count))
+            if ranges:
+                self.data["reservations"].append({"owner": owner, "time": round(time.time()), "ranges": ranges})
+                self.save()
+        return ranges
+
+    def save(self):
+        """Write the store to its file, replacing the previous file only when the new one is complete"""
+        if not self.path:
+            return
+        temp_path = self.path + ".tmp"
+        with open(temp_path, "w") as f:
+            json.dump(self.data, f)
+        os.replace(temp_path, self.path)
+
+
+class AllocationHandler(http.server.BaseHTTPRequestHandler):
+    """POST /reserve with {"counts": {prefix: count}, "owner": name} returns {"ranges": {prefix: [start, stop]}},
+    GET /status returns the next free number of each prefix"""
+
+    store = None
+
+    def send_json(self, status, data):
+        body = json.dumps(data).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path != "/status":
+            return self.send_json(404, {"error": f"Unknown path {self.path}"})
+        with self.store.lock:
+            self.send_json(200, {"next": dict(self.store.data["next"]), "reservations": len(self.store.data["reservations"])})
+
+    def do_POST(self):
+        if self.path != "/reserve":
+            return self.send_json(404, {"error": f"Unknown path {self.path}"})
+        try:
+            request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+            counts = {str(prefix): int(count) for prefix, count in request["counts"].items()}
+        except (ValueError, KeyError, TypeError, AttributeError) as e:
+            return self.send_json(400, {"error": f"Invalid reservation request: {e}"})
+        ranges = self.store.reserve(counts, str(request.get("owner", "")))
+        self.send_json(200, {"ranges": ranges})
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+
+def serve(store, host="127.0.0.1", port=8765, verbose=False):
+    """Run the service until interrupted"""
+    handler = type("Handler", (AllocationHandler,), {"store": store})
+    server = http.server.ThreadingHTTPServer((host, port), handler)
+    server.verbose = verbose
+    print(f"Allocating numbers on http://{host}:{port}, stored in {store.path or 'memory'}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--store", default="number_allocations.json", help="JSON file keeping the next free numbers and reservations")
+    parser.add_argument("--host", default="127.0.0.1", help="Address to listen on, e.g. 0.0.0.0 to serve the local network")
+    parser.add_argument("--port", type=int, default=8765, help="Port to listen on")
+    parser.add_argument("--verbose", action="store_true", help="Log every request")
+    args = parser.parse_args(argv)
+    serve(AllocationStore(args.store), args.host, args.port, args.verbose)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
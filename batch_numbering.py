@@ -0,0 +1,196 @@
+"""Number many IFC files in parallel Blender worker processes with one settings profile.
+
+Example:
+    python batch_numbering.py "models/**/*.ifc" --settings settings.json --output-dir numbered --workers 8
+    python batch_numbering.py "models/*.ifc" --settings settings.json --in-place --summary summary.json
+
+The settings profile is the JSON file written by Export Settings in the numbering panel.
+Each worker is a background Blender process with Bonsai enabled, which loads the numbering
+tool once and then numbers a share of the files one after the other, so Blender starts once
+per worker instead of once per file. A worker exits after --files-per-worker files and a
+fresh one takes over, which bounds the memory a worker can build up. The summary lists the
+numbered, removed and duplicate numbers and the timings of each file as CSV or JSON.
+The workers have no selection, so a profile set to number only the selected objects
+numbers all objects of each file.
+"""
+
+import argparse
+import concurrent.futures
+import csv
+import glob
+import json
+import math
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+
+SUMMARY_FIELDS = ["file", "status", "elements", "numbered", "removed", "duplicates",
+                  "load_seconds", "number_seconds", "write_seconds", "total_seconds", "messages"]
+
+
+def load_project(filepath):
+    """Load an IFC file into the Bonsai session of the worker, replacing the previous one"""
+    import bpy
+    bpy.ops.bim.load_project(filepath=filepath, should_start_fresh_session=True)
+
+
+def number_file(module, filepath, settings, output_path):
+    """Number one IFC file with the settings and write it to the output path, returning its summary row"""
+    import bpy
+    row = {"file": filepath, "status": "failed"}
+    start = time.perf_counter()
+    load_project(filepath)
+    row["load_seconds"] = round(time.perf_counter() - start, 3)
+
+    numbering_start = time.perf_counter()
+    log = module.MessageLog()
+    props = bpy.context.scene.ifc_numbering_settings
+    # A background Blender session has no selection, so profiles numbering the selected objects number all objects
+    profile_props = module.Settings.to_props({**settings, "selected_toggle": False}, props)
+    old_numbers = module.UndoOperator.read_numbers(log, profile_props)
+    if old_numbers is not None:
+        new_numbers = old_numbers.copy()
+        result = module.IFC_AssignNumbers.assign_numbers(log, profile_props, new_numbers)
+        numbers = [number for number in new_numbers.values() if number is not None]
+        row.update({
+            "status": "numbered" if result == {'FINISHED'} else "skipped",
+            "elements": len(new_numbers),
+            "numbered": sum(1 for key, number in new_numbers.items() if number is not None and old_numbers.get(key) != number),
+            "removed": sum(1 for key, number in new_numbers.items() if number is None and old_numbers.get(key) is not None),
+            "duplicates": len(numbers) - len(set(numbers)),
+        })
+    row["number_seconds"] = round(time.perf_counter() - numbering_start, 3)
+
+    write_start = time.perf_counter()
+    if row["status"] == "numbered":
+        module.get_ifc_file().write(output_path)
+    row["write_seconds"] = round(time.perf_counter() - write_start, 3)
+    row["total_seconds"] = round(time.perf_counter() - start, 3)
+    row["messages"] = "; ".join(f"{level}: {message}" for level, message in log.messages if level != "INFO")
+    return row
+
+
+def run_worker(args):
+    """Number the files given to this worker inside Blender, appending a JSON line per file to the results file"""
+    sys.path.insert(0, REPO_DIR)
+    import numbering_tool
+    with open(args.settings) as f:
+        settings = json.load(f)
+    with open(args.results, "a") as results:
+        for filepath in args.files:
+            try:
+                row = number_file(numbering_tool, filepath, settings, get_output_path(args, filepath))
+            except Exception as e:
+                row = {"file": filepath, "status": "failed", "messages": f"ERROR: {e}"}
+            results.write(json.dumps(row) + "\n")
+            results.flush()
+
+
+def get_output_path(args, filepath):
+    if args.in_place:
+        return filepath
+    return os.path.join(args.output_dir, os.path.basename(filepath))
+
+
+def get_files(patterns):
+    """Expand the glob patterns, largest files first so the longest jobs start early"""
+    files = {os.path.abspath(path) for pattern in patterns for path in glob.glob(pattern, recursive=True) if path.lower().endswith(".ifc")}
+    return sorted(files, key=lambda path: (-os.path.getsize(path), path))
+
+
+def get_chunks(files, workers, files_per_worker):
+    """Split the files into worker jobs of at most files_per_worker files, dealing the size-sorted files out in turn
+    so every job gets a similar mix of large and small files"""
+    chunk_count = max(math.ceil(len(files) / files_per_worker), min(workers, len(files)))
+    return [files[i::chunk_count] for i in range(chunk_count)]
+
+
+def run_chunk(args, files):
+    """Run one Blender worker on the files and collect its summary rows, marking the files it did not report as failed"""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        results_path = os.path.join(tmpdir, "results.jsonl")
+        command = [args.blender, "--background", "--threads", "1", "--python", os.path.abspath(__file__), "--",
+                   "--worker", "--settings", os.path.abspath(args.settings), "--results", results_path]
+        command += ["--in-place"] if args.in_place else ["--output-dir", os.path.abspath(args.output_dir)]
+        command += files
+        # One thread per worker process, so the workers together use the cores without oversubscribing them
+        env = dict(os.environ, OMP_NUM_THREADS="1", OPENBLAS_NUM_THREADS="1", MKL_NUM_THREADS="1")
+        process = subprocess.run(command, capture_output=True, text=True, env=env)
+        rows = []
+        if os.path.exists(results_path):
+            with open(results_path) as f:
+                rows = [json.loads(line) for line in f if line.strip()]
+    reported = {row["file"] for row in rows}
+    error = (process.stderr.strip().splitlines() or [f"exit code {process.returncode}"])[-1]
+    rows += [{"file": filepath, "status": "failed", "messages": f"ERROR: worker stopped before numbering the file ({error})"}
+             for filepath in files if filepath not in reported]
+    return rows
+
+
+def write_summary(rows, filepath):
+    """Write the summary rows as JSON or, for any other extension, as CSV"""
+    if filepath.lower().endswith(".json"):
+        with open(filepath, "w") as f:
+            json.dump(rows, f, indent=2)
+        return
+    with open(filepath, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=SUMMARY_FIELDS)
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def run_batch(args):
+    files = get_files(args.files)
+    if not files:
+        print("No IFC files found.")
+        return 1
+    if not args.in_place:
+        os.makedirs(args.output_dir, exist_ok=True)
+    workers = min(args.workers, len(files))
+    chunks = get_chunks(files, workers, args.files_per_worker)
+    print(f"Numbering {len(files)} files in {len(chunks)} jobs on {workers} workers")
+
+    start = time.perf_counter()
+    rows = []
+    # Threads only wait for their Blender process, the numbering itself runs in the worker processes
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+        for chunk_rows in concurrent.futures.as_completed([executor.submit(run_chunk, args, chunk) for chunk in chunks]):
+            for row in chunk_rows.result():
+                rows.append(row)
+                print(f"  {row['status']:<9} {row.get('numbered', 0):>8} numbered {row.get('total_seconds', 0):8.2f} s  {row['file']}")
+    rows.sort(key=lambda row: row["file"])
+    write_summary(rows, args.summary)
+
+    failed = sum(row["status"] == "failed" for row in rows)
+    print(f"\nNumbered {len(rows) - failed} of {len(rows)} files in {time.perf_counter() - start:.1f} s, wrote {args.summary}")
+    return 1 if failed else 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("files", nargs="+", help="IFC files or glob patterns (quoted, ** matches subfolders)")
+    parser.add_argument("--settings", required=True, help="Settings profile JSON exported from the numbering panel")
+    output = parser.add_mutually_exclusive_group(required=True)
+    output.add_argument("--output-dir", help="Folder for the numbered files, keeping their file names")
+    output.add_argument("--in-place", action="store_true", help="Overwrite the input files with the numbered files")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Number of parallel Blender workers")
+    parser.add_argument("--files-per-worker", type=int, default=20,
+                        help="Files a worker numbers before it exits and a fresh worker takes over, to bound its memory")
+    parser.add_argument("--blender", default=os.environ.get("BLENDER", "blender"), help="Blender executable with Bonsai enabled")
+    parser.add_argument("--summary", default="numbering_summary.csv", help="Summary output, .csv or .json")
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--results", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+    if args.worker:
+        run_worker(args)
+        return 0
+    return run_batch(args)
+
+
+if __name__ == "__main__":
+    # Blender passes the arguments of the script after "--"
+    sys.exit(main(sys.argv[sys.argv.index("--") + 1:] if "--" in sys.argv else None))
@@ -0,0 +1,436 @@
+"""Lightweight stand-ins for the Blender and Bonsai modules used by numbering_tool.py.
+
+Installing the stand-ins registers fake ``bpy``, ``mathutils``, ``bonsai.tool`` and
+``bonsai.bim.ifc`` modules in ``sys.modules``, so the add-on can be imported and
+driven on a plain Python interpreter with only ifcopenshell installed.
+Only the parts of the API that the numbering tool touches are implemented.
+"""
+
+import math
+import sys
+import types
+
+
+class Vector:
+    """Minimal 3D stand-in for mathutils.Vector."""
+
+    __slots__ = ("_v",)
+
+    def __init__(self, seq=(0.0, 0.0, 0.0)):
+        self._v = [float(c) for c in seq]
+
+    def __getitem__(self, i):
+        return self._v[i]
+
+    def __setitem__(self, i, value):
+        self._v[i] = float(value)
+
+    def __len__(self):
+        return len(self._v)
+
+    def __iter__(self):
+        return iter(self._v)
+
+    def __add__(self, other):
+        return Vector(a + b for a, b in zip(self._v, other))
+
+    def __sub__(self, other):
+        return Vector(a - b for a, b in zip(self._v, other))
+
+    def __mul__(self, scalar):
+        return Vector(a * scalar for a in self._v)
+
+    __rmul__ = __mul__
+
+    def __eq__(self, other):
+        return isinstance(other, Vector) and self._v == other._v
+
+    def __hash__(self):
+        return hash(tuple(self._v))
+
+    def __repr__(self):
+        return f"Vector({tuple(self._v)})"
+
+    x = property(lambda self: self._v[0], lambda self, value: self.__setitem__(0, value))
+    y = property(lambda self: self._v[1], lambda self, value: self.__setitem__(1, value))
+    z = property(lambda self: self._v[2], lambda self, value: self.__setitem__(2, value))
+
+    @property
+    def length(self):
+        return math.sqrt(sum(a * a for a in self._v))
+
+    def dot(self, other):
+        return sum(a * b for a, b in zip(self._v, other))
+
+    def copy(self):
+        return Vector(self._v)
+
+    def to_tuple(self):
+        return tuple(self._v)
+
+
+class Matrix:
+    """Minimal 4x4 stand-in for mathutils.Matrix."""
+
+    __slots__ = ("rows",)
+
+    def __init__(self, rows=None):
+        if rows is None:
+            rows = [[1.0 if i == j else 0.0 for j in range(4)] for i in range(4)]
+        self.rows = [list(map(float, row)) for row in rows]
+
+    @staticmethod
+    def Identity(size=4):
+        return Matrix()
+
+    @staticmethod
+    def Translation(vector):
+        mat = Matrix()
+        for i in range(3):
+            mat.rows[i][3] = float(vector[i])
+        return mat
+
+    @property
+    def translation(self):
+        return Vector(self.rows[i][3] for i in range(3))
+
+    def __matmul__(self, other):
+        if isinstance(other, Matrix):
+            return Matrix([[sum(self.rows[i][k] * other.rows[k][j] for k in range(4)) for j in range(4)] for i in range(4)])
+        r = self.rows
+        x, y, z = other[0], other[1], other[2]
+        return Vector((r[0][0] * x + r[0][1] * y + r[0][2] * z + r[0][3],
+                       r[1][0] * x + r[1][1] * y + r[1][2] * z + r[1][3],
+                       r[2][0] * x + r[2][1] * y + r[2][2] * z + r[2][3]))
+
+
+class _PropertyDeferred:
+    """Stand-in for the deferred property declarations returned by bpy.props."""
+
+    def __init__(self, function, keywords):
+        self.function = function
+        self.keywords = keywords
+
+    def default_value(self, owner):
+        kw = self.keywords
+        if "default" in kw and not callable(kw.get("items")):
+            default = kw["default"]
+            return set(default) if isinstance(default, (set, frozenset)) else default
+        name = self.function.__name__
+        if name == "StringProperty":
+            return ""
+        if name == "BoolProperty":
+            return False
+        if name in ("IntProperty", "FloatProperty"):
+            return 0
+        if name in ("IntVectorProperty", "FloatVectorProperty", "BoolVectorProperty"):
+            return [0] * kw.get("size", 3)
+        if name == "EnumProperty":
+            if "ENUM_FLAG" in kw.get("options", ()):
+                return set()
+            items = kw.get("items", ())
+            if callable(items):
+                try:
+                    items = items(owner, context)
+                except Exception:
+                    return ""
+            return items[kw.get("default", 0)][0] if items else ""
+        return None
+
+
+def _make_property(name):
+    def declare(**keywords):
+        return _PropertyDeferred(declare, keywords)
+    declare.__name__ = name
+    return declare
+
+
+def _init_properties(instance):
+    """Assign the declared defaults of all annotated properties of a stand-in class."""
+    seen = set()
+    for cls in reversed(type(instance).__mro__):
+        for name, decl in getattr(cls, "__annotations__", {}).items():
+            if name in seen or not isinstance(decl, _PropertyDeferred):
+                continue
+            seen.add(name)
+            if "get" in decl.keywords:
+                continue
+            object.__setattr__(instance, name, decl.default_value(instance))
+
+
+class PropertyGroup:
+    """Stand-in for bpy.types.PropertyGroup, supporting attribute and ID-property access."""
+
+    def __init__(self):
+        self._id_properties = {}
+        _init_properties(self)
+
+    def __getattribute__(self, name):
+        value = object.__getattribute__(self, name)
+        # Blender returns a new set for enum flag properties on every access
+        return set(value) if type(value) is set else value
+
+    def __getitem__(self, key):
+        return self._id_properties[key]
+
+    def __setitem__(self, key, value):
+        self._id_properties[key] = value
+
+    def get(self, key, default=None):
+        return self._id_properties.get(key, default)
+
+
+class Operator:
+    """Stand-in for bpy.types.Operator, collecting reports instead of showing them."""
+
+    def __init__(self):
+        self.reports = []
+        _init_properties(self)
+
+    def report(self, type, message):
+        self.reports.append((next(iter(type)), message))
+
+
+class Panel:
+    layout = None
+
+
+class Object:
+    """Stand-in for a Blender object linked to an IFC entity."""
+
+    __slots__ = ("name", "matrix_world", "bound_box", "BIMObjectProperties", "hidden", "selected", "type", "data")
+
+    def __init__(self, name, matrix_world, bound_box, ifc_definition_id=0, type="MESH", data=None):
+        self.name = name
+        self.matrix_world = matrix_world
+        self.bound_box = bound_box
+        self.BIMObjectProperties = types.SimpleNamespace(ifc_definition_id=ifc_definition_id)
+        self.hidden = False
+        self.selected = False
+        self.type = type
+        self.data = data
+
+    @property
+    def original(self):
+        return self
+
+    def visible_get(self):
+        return not self.hidden
+
+    def select_get(self):
+        return self.selected
+
+    def select_set(self, state):
+        self.selected = state
+
+    def hide_set(self, state):
+        self.hidden = state
+
+
+class Collection:
+    """Stand-in for a Blender collection, of which depsgraph updates signal added and deleted objects"""
+
+
+class SceneObjects(list):
+    """Stand-in for the scene object collection, which can also be looked up by name"""
+
+    def get(self, name, default=None):
+        return next((obj for obj in self if obj.name == name), default)
+
+
+class Scene:
+    def __init__(self, objects=()):
+        self.objects = SceneObjects(objects)
+
+
+class Context:
+    def __init__(self, scene=None):
+        self.scene = scene if scene is not None else Scene()
+        self.view_layer = types.SimpleNamespace(objects=types.SimpleNamespace(active=None))
+        self.active_object = None
+        self.window_manager = types.SimpleNamespace(fileselect_add=lambda operator: None)
+
+    @property
+    def selected_objects(self):
+        return [obj for obj in self.scene.objects if obj.selected]
+
+
+class _OperatorNamespace:
+    """Stand-in for bpy.ops.<category>, recording every operator call."""
+
+    def __init__(self, category, calls):
+        self._category = category
+        self._calls = calls
+
+    def __getattr__(self, name):
+        def call(*args, **kwargs):
+            self._calls.append((f"{self._category}.{name}", args, kwargs))
+            return {'FINISHED'}
+        return call
+
+
+class _Ops:
+    def __init__(self):
+        self.calls = []
+
+    def __getattr__(self, category):
+        return _OperatorNamespace(category, self.calls)
+
+
+class IfcStore:
+    """Stand-in for bonsai.bim.ifc.IfcStore, recording transactions for undo/redo."""
+
+    file = None
+    path = ""
+    history = []
+    current_transaction = None
+
+    @staticmethod
+    def get_file():
+        return IfcStore.file
+
+    @staticmethod
+    def begin_transaction(operator):
+        IfcStore.current_transaction = operator
+
+    @staticmethod
+    def add_transaction_operation(operator, rollback=None, commit=None):
+        IfcStore.history.append(operator)
+
+    @staticmethod
+    def end_transaction(operator):
+        IfcStore.current_transaction = None
+
+
+class Ifc:
+    """Stand-in for bonsai.tool.Ifc."""
+
+    objects_by_id = {}
+
+    @staticmethod
+    def get():
+        return IfcStore.file
+
+    @staticmethod
+    def get_entity(obj):
+        ifc_definition_id = obj.BIMObjectProperties.ifc_definition_id
+        if not ifc_definition_id or IfcStore.file is None:
+            return None
+        try:
+            return IfcStore.file.by_id(ifc_definition_id)
+        except RuntimeError:
+            return None
+
+    @staticmethod
+    def get_object(element):
+        return Ifc.objects_by_id.get(element.id())
+
+
+context = Context()
+ops = _Ops()
+
+
+def _kdtree_module():
+    module = types.ModuleType("mathutils.kdtree")
+
+    class KDTree:
+        """Brute-force stand-in for mathutils.kdtree.KDTree."""
+
+        def __init__(self, size):
+            self._points = []
+
+        def insert(self, co, index):
+            self._points.append((Vector(co), index))
+
+        def balance(self):
+            pass
+
+        def find(self, co, filter=None):
+            best = (None, None, math.inf)
+            for point, index in self._points:
+                if filter is not None and not filter(index):
+                    continue
+                dist = (point - Vector(co)).length
+                if dist < best[2]:
+                    best = (point, index, dist)
+            return best
+
+        def find_n(self, co, n):
+            found = sorted(((point, index, (point - Vector(co)).length) for point, index in self._points), key=lambda t: t[2])
+            return found[:n]
+
+        def find_range(self, co, radius):
+            return [(point, index, dist) for point, index in self._points if (dist := (point - Vector(co)).length) <= radius]
+
+    module.KDTree = KDTree
+    return module
+
+
+def install():
+    """Register the stand-in modules in sys.modules and return the fake bpy module."""
+    bpy = types.ModuleType("bpy")
+    bpy.context = context
+    bpy.ops = ops
+
+    props = types.ModuleType("bpy.props")
+    for name in ("StringProperty", "BoolProperty", "IntProperty", "FloatProperty", "EnumProperty",
+                 "IntVectorProperty", "FloatVectorProperty", "BoolVectorProperty",
+                 "PointerProperty", "CollectionProperty"):
+        setattr(props, name, _make_property(name))
+    bpy.props = props
+
+    bpy_types = types.ModuleType("bpy.types")
+    bpy_types.PropertyGroup = PropertyGroup
+    bpy_types.Operator = Operator
+    bpy_types.Panel = Panel
+    bpy_types.Scene = Scene
+    bpy_types.Object = Object
+    bpy_types.Collection = Collection
+    bpy.types = bpy_types
+
+    bpy.utils = types.SimpleNamespace(register_class=lambda cls: None, unregister_class=lambda cls: None)
+
+    handlers = types.SimpleNamespace(load_pre=[], load_post=[], undo_post=[], redo_post=[],
+                                     save_pre=[], depsgraph_update_post=[], persistent=lambda f: f)
+    bpy.app = types.SimpleNamespace(handlers=handlers, version=(4, 2, 0), background=True)
+    bpy.data = types.SimpleNamespace(objects=[], filepath="")
+
+    mathutils = types.ModuleType("mathutils")
+    mathutils.Vector = Vector
+    mathutils.Matrix = Matrix
+    mathutils.kdtree = _kdtree_module()
+
+    bonsai = types.ModuleType("bonsai")
+    bonsai_tool = types.ModuleType("bonsai.tool")
+    bonsai_tool.Ifc = Ifc
+    bonsai_bim = types.ModuleType("bonsai.bim")
+    bonsai_bim_ifc = types.ModuleType("bonsai.bim.ifc")
+    bonsai_bim_ifc.IfcStore = IfcStore
+    bonsai.tool = bonsai_tool
+    bonsai.bim = bonsai_bim
+    bonsai_bim.ifc = bonsai_bim_ifc
+
+    sys.modules.update({
+        "bpy": bpy,
+        "bpy.props": props,
+        "bpy.types": bpy_types,
+        "mathutils": mathutils,
+        "mathutils.kdtree": mathutils.kdtree,
+        "bonsai": bonsai,
+        "bonsai.tool": bonsai_tool,
+        "bonsai.bim": bonsai_bim,
+        "bonsai.bim.ifc": bonsai_bim_ifc,
+    })
+    return bpy
+
+
+def load_file(ifc_file, objects):
+    """Make ifc_file the active IFC file with the given objects in the scene, firing the load handlers."""
+    IfcStore.file = ifc_file
+    IfcStore.history = []
+    Ifc.objects_by_id = {obj.BIMObjectProperties.ifc_definition_id: obj for obj in objects}
+    context.scene = Scene(objects)
+    bpy = sys.modules.get("bpy")
+    if bpy is not None:
+        for handler in list(bpy.app.handlers.load_post):
+            handler(None)
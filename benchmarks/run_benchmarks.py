@@ -0,0 +1,300 @@
+"""Benchmark the numbering tool on synthetic IFC models outside of Blender.
+
+Example:
+    python benchmarks/run_benchmarks.py --elements 1000 10000 100000 --storeys 10 --types 8
+    python benchmarks/run_benchmarks.py --elements 10000 --compare benchmarks/results/<commit>.json
+
+Each stage is timed with time.perf_counter and, unless --no-memory is given, its peak
+Python memory is traced with tracemalloc. Results are written as JSON so runs of
+different commits can be compared with --compare.
+"""
+
+import argparse
+import datetime
+import importlib
+import json
+import math
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+import types
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCHMARK_DIR)
+sys.path.insert(0, BENCHMARK_DIR)
+sys.path.insert(0, REPO_DIR)
+
+import blender_stub  # noqa: E402
+
+bpy = blender_stub.install()
+
+import ifcopenshell  # noqa: E402
+from synthetic_model import GRID_SPACING, generate_model  # noqa: E402
+
+MODULE_NAME = "numbering_tool"
+
+BATCH_PROFILES = [
+    ("Tags", {"save_type": "Attribute", "attribute_name": "Tag", "format": "E{E}"}),
+    ("Pset number", {"save_type": "Pset", "pset_name": "Custom Pset", "format": "[T]{T}"}),
+    ("Storey codes", {"save_type": "Attribute", "attribute_name": "Description", "format": "S{S}-{E}"}),
+]
+
+
+class StageRecorder:
+    """Time stages and record their peak traced memory."""
+
+    def __init__(self, trace_memory=True):
+        self.trace_memory = trace_memory
+        self.stages = {}
+
+    def run(self, name, function, *args, **kwargs):
+        if self.trace_memory:
+            tracemalloc.start()
+        start = time.perf_counter()
+        result = function(*args, **kwargs)
+        seconds = time.perf_counter() - start
+        stage = {"seconds": round(seconds, 6)}
+        if self.trace_memory:
+            stage["peak_memory_bytes"] = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+        stage["max_rss_kb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        self.stages[name] = stage
+        print(f"  {name:<28} {seconds:10.4f} s" + (f" {stage['peak_memory_bytes'] / 2**20:10.1f} MiB" if self.trace_memory else ""))
+        return result
+
+
+def import_numbering_tool():
+    """Import a fresh copy of the add-on module, so no state leaks between model sizes."""
+    sys.modules.pop(MODULE_NAME, None)
+    return importlib.import_module(MODULE_NAME)
+
+
+def call_enum_items(settings_class, name, props, context):
+    """Call the dynamic items callback of an enum property, as the panel does on redraw."""
+    items = settings_class.__annotations__[name].keywords["items"]
+    return items(props, context) if callable(items) else items
+
+
+def save_batch_profiles(module, props):
+    """Save the batch profiles as named settings in the IFC file, leaving the current settings unchanged."""
+    current = module.Settings.get_dict(props)
+    log = module.MessageLog()
+    for name, changes in BATCH_PROFILES:
+        for key, value in changes.items():
+            setattr(props, key, value)
+        props.settings_name = name
+        module.Settings.save_settings(log, props)
+    for key, value in current.items():
+        setattr(props, key, set(value) if key == "selected_types" else value)
+
+
+def path_object(elements, vertices=1000):
+    """Create a stand-in mesh object with a meandering polyline over the synthetic grid, to number along"""
+    length = GRID_SPACING * math.sqrt(elements)
+    points = [(length * i / (vertices - 1), 0.25 * length * (1 + math.sin(8 * math.pi * i / (vertices - 1))), 0.0) for i in range(vertices)]
+    data = types.SimpleNamespace(vertices=[types.SimpleNamespace(co=point) for point in points],
+                                 edges=[types.SimpleNamespace(vertices=(i, i + 1)) for i in range(vertices - 1)])
+    return blender_stub.Object("Path", blender_stub.Matrix.Identity(), [], type="MESH", data=data)
+
+
+def read_ids(get_id, elements):
+    """Read the ID of each element, as the numbering stages do for every changed number."""
+    return [get_id(element) for element in elements]
+
+
+def run_operator(operator_class, context):
+    operator = operator_class()
+    result = operator.execute(context)
+    return operator, result
+
+
+def benchmark_model(args, elements):
+    print(f"{elements} elements, {args.storeys} storeys, {args.types} types, {args.save_type} storage")
+    recorder = StageRecorder(trace_memory=not args.no_memory)
+    ifc_file, objects = recorder.run("generate_model", generate_model, elements, args.storeys, args.types, args.schema, args.seed)
+
+    blender_stub.load_file(ifc_file, objects)
+    context = bpy.context
+    module = recorder.run("import_module", import_numbering_tool)
+    settings_class = module.IFC_NumberingSettings
+    props = settings_class()
+    context.scene.ifc_numbering_settings = props
+    props.save_type = args.save_type
+    if args.save_type == "Pset":
+        props.pset_name = "Custom Pset"
+    props.instrumentation = args.instrumentation
+    breakdown = {}
+
+    recorder.run("panel_possible_types", module.LoadSelection.get_possible_types, props, context)
+    props.selected_types = {"All"}
+    recorder.run("panel_redraw_possible_types", module.LoadSelection.get_possible_types, props, context)
+    recorder.run("panel_format_preview", module.NumberFormatting.update_format_preview, props, context)
+    recorder.run("panel_pset_names", module.SaveNumber.update_pset_names, props, context)
+    recorder.run("panel_saved_settings", call_enum_items, settings_class, "saved_settings", props, context)
+    recorder.run("panel_custom_storeys", call_enum_items, settings_class, "custom_storey", props, context)
+    recorder.run("get_storeys", module.Storeys.get_storeys, props)
+
+    assign_operator, _ = recorder.run("assign_numbers", run_operator, module.IFC_AssignNumbers, context)
+    if args.instrumentation != "OFF":
+        breakdown["assign_numbers"] = module.Instrumentation.to_dict()
+    recorder.run("undo_assign", assign_operator.rollback, assign_operator.transaction_data)
+    recorder.run("redo_assign", assign_operator.commit, assign_operator.transaction_data)
+    recorder.run("assign_numbers_unchanged", run_operator, module.IFC_AssignNumbers, context)
+    remove_operator, _ = recorder.run("remove_numbers", run_operator, module.IFC_RemoveNumbers, context)
+    if args.instrumentation != "OFF":
+        breakdown["remove_numbers"] = module.Instrumentation.to_dict()
+    recorder.run("undo_remove", remove_operator.rollback, remove_operator.transaction_data)
+
+    if hasattr(module, "Schedule"):
+        schedule_path = os.path.join(args.tmpdir, "schedule.csv")
+        recorder.run("export_schedule_csv", module.Schedule.export, module.MessageLog(), props, schedule_path)
+    if hasattr(module, "IFC_ImportNumbers"):
+        import_operator = module.IFC_ImportNumbers()
+        recorder.run("import_numbers_csv", module.Schedule.execute_with_undo, import_operator, props, schedule_path)
+
+    if hasattr(module, "number_elements"):
+        columns = ifc_file.by_type("IfcColumn")
+        api_result = recorder.run("number_elements_api", module.number_elements, ifc_file, columns, {"format": "C{E}"})
+        recorder.run("undo_number_elements_api", api_result.rollback)
+
+    if hasattr(module, "get_id"):
+        # Reading the GlobalId by name is the reference for the attribute slot read by get_id
+        ifc_elements = ifc_file.by_type("IfcElement")
+        recorder.run("get_id", read_ids, module.get_id, ifc_elements)
+        recorder.run("get_id_by_name", read_ids, lambda element: element.GlobalId, ifc_elements)
+
+    if hasattr(module, "Validation"):
+        validation_path = os.path.join(args.tmpdir, "validation.csv")
+        recorder.run("validate_numbers", module.Validation.validate, module.MessageLog(), props, validation_path)
+
+    if hasattr(module, "ElementFilter"):
+        props.filter_expression = "IfcWall, IfcColumn"
+        recorder.run("filter_elements", module.LoadSelection.load_selected_objects, props)
+        recorder.run("filter_elements_cached", module.LoadSelection.load_selected_objects, props)
+        recorder.run("assign_numbers_filter", run_operator, module.IFC_AssignNumbers, context)
+        props.filter_expression = ""
+
+    if hasattr(module, "Regions"):
+        props.region_mode, props.region_min, props.region_max = "BOX", (-1.0, -1.0, -1.0), (4 * GRID_SPACING, 4 * GRID_SPACING, 1.0)
+        recorder.run("region_index", module.Regions.get_region_objects, props)
+        recorder.run("region_query", module.Regions.get_region_objects, props)
+        recorder.run("assign_numbers_region", run_operator, module.IFC_AssignNumbers, context)
+        props.region_mode = "NONE"
+
+    if hasattr(module, "PathOrder"):
+        context.scene.objects.append(path_object(elements))
+        props.order_mode, props.path = "PATH", "OBJECT/Path"
+        path_operator, _ = recorder.run("assign_numbers_path", run_operator, module.IFC_AssignNumbers, context)
+        recorder.run("undo_assign_path", path_operator.rollback, path_operator.transaction_data)
+        props.order_mode = "AXES"
+        context.scene.objects.pop()
+
+    if hasattr(module, "TypeNumbering"):
+        type_operator = module.IFC_AssignTypeNumbers()
+        recorder.run("assign_type_numbers", module.TypeNumbering.execute_with_undo, type_operator, props)
+        recorder.run("undo_type_numbers", type_operator.rollback, type_operator.transaction_data)
+
+    if hasattr(module, "BatchNumbering"):
+        save_batch_profiles(module, props)
+        batch_operator = module.IFC_BatchAssignNumbers()
+        recorder.run("batch_assign_3_profiles", module.BatchNumbering.execute_with_undo, batch_operator, props,
+                     [name for name, _ in BATCH_PROFILES])
+        recorder.run("undo_batch", batch_operator.rollback, batch_operator.transaction_data)
+
+    return {
+        "elements": elements,
+        "storeys": args.storeys,
+        "types": args.types,
+        "save_type": args.save_type,
+        "schema": args.schema,
+        "stages": recorder.stages,
+        "instrumentation": breakdown,
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_key(run):
+    return (run["elements"], run["storeys"], run["types"], run["save_type"], run.get("schema"))
+
+
+def compare(results, baseline_path, threshold):
+    """Print the timing ratio of each stage against a baseline result file and return the regressions."""
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    baseline_runs = {run_key(run): run for run in baseline["runs"]}
+    regressions = []
+    print(f"\nComparison against {baseline_path} (commit {baseline['meta'].get('commit')})")
+    for run in results["runs"]:
+        base_run = baseline_runs.get(run_key(run))
+        if base_run is None:
+            print(f"  no baseline for {run['elements']} elements")
+            continue
+        print(f"  {run['elements']} elements")
+        for name, stage in run["stages"].items():
+            if name not in base_run["stages"]:
+                continue
+            base_seconds = base_run["stages"][name]["seconds"]
+            ratio = stage["seconds"] / base_seconds if base_seconds else float("inf")
+            flag = " REGRESSION" if ratio > threshold and stage["seconds"] > 0.01 else ""
+            print(f"    {name:<28} {base_seconds:10.4f} -> {stage['seconds']:10.4f} s  x{ratio:6.2f}{flag}")
+            if flag:
+                regressions.append((run["elements"], name, ratio))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--elements", type=int, nargs="+", default=[1000, 10000], help="Element counts to benchmark")
+    parser.add_argument("--storeys", type=int, default=10, help="Number of storeys in each model")
+    parser.add_argument("--types", type=int, default=8, help="Number of type objects in each model")
+    parser.add_argument("--schema", default="IFC4", help="IFC schema of the generated models")
+    parser.add_argument("--save-type", choices=["Attribute", "Pset"], default="Attribute", help="Number storage to benchmark")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed for the generated models")
+    parser.add_argument("--no-memory", action="store_true", help="Do not trace peak memory (tracemalloc slows down the stages)")
+    parser.add_argument("--instrumentation", choices=["OFF", "TIMERS"], default="OFF",
+                        help="Also record the per-stage breakdown of the add-on's own instrumentation")
+    parser.add_argument("--tmpdir", default=tempfile.gettempdir(), help="Directory for files written by the stages")
+    parser.add_argument("--output", help="Output JSON path, defaults to benchmarks/results/<commit>.json")
+    parser.add_argument("--compare", help="Baseline JSON file to compare the timings against")
+    parser.add_argument("--threshold", type=float, default=1.2, help="Slowdown ratio reported as a regression by --compare")
+    args = parser.parse_args(argv)
+
+    commit = git_commit()
+    results = {
+        "meta": {
+            "commit": commit,
+            "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "ifcopenshell": ifcopenshell.version,
+            "trace_memory": not args.no_memory,
+        },
+        "runs": [benchmark_model(args, elements) for elements in args.elements],
+    }
+
+    output = args.output or os.path.join(BENCHMARK_DIR, "results", f"{commit or 'local'}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"\nWrote {output}")
+
+    if args.compare:
+        regressions = compare(results, args.compare, args.threshold)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
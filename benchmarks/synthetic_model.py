@@ -0,0 +1,118 @@
+"""Generate synthetic IFC models and matching stand-in Blender objects for benchmarking."""
+
+import math
+import random
+
+import ifcopenshell
+import ifcopenshell.guid
+
+from blender_stub import Matrix, Object
+
+ELEMENT_CLASSES = [
+    ("IfcWall", "IfcWallType", (4.0, 0.2, 3.0)),
+    ("IfcColumn", "IfcColumnType", (0.4, 0.4, 3.0)),
+    ("IfcBeam", "IfcBeamType", (6.0, 0.3, 0.5)),
+    ("IfcSlab", "IfcSlabType", (6.0, 6.0, 0.25)),
+    ("IfcDoor", "IfcDoorType", (0.9, 0.1, 2.1)),
+    ("IfcWindow", "IfcWindowType", (1.2, 0.1, 1.4)),
+    ("IfcMember", "IfcMemberType", (2.0, 0.1, 0.1)),
+    ("IfcPlate", "IfcPlateType", (1.0, 1.0, 0.02)),
+    ("IfcFooting", "IfcFootingType", (1.5, 1.5, 0.6)),
+    ("IfcPile", "IfcPileType", (0.5, 0.5, 12.0)),
+    ("IfcRailing", "IfcRailingType", (3.0, 0.05, 1.0)),
+    ("IfcStairFlight", "IfcStairFlightType", (3.0, 1.2, 3.0)),
+]
+
+STOREY_HEIGHT = 3.0
+GRID_SPACING = 5.0
+
+
+def box_corners(dimensions):
+    """Return the 8 local bounding box corners of a box with the given dimensions, in Blender order."""
+    dx, dy, dz = dimensions
+    return ((0, 0, 0), (0, 0, dz), (0, dy, dz), (0, dy, 0),
+            (dx, 0, 0), (dx, 0, dz), (dx, dy, dz), (dx, dy, 0))
+
+
+def create_placement(ifc_file, location, relative_to=None):
+    point = ifc_file.createIfcCartesianPoint(tuple(float(c) for c in location))
+    axis_placement = ifc_file.createIfcAxis2Placement3D(point, None, None)
+    return ifc_file.createIfcLocalPlacement(relative_to, axis_placement)
+
+
+def generate_model(elements=1000, storeys=4, types=4, schema="IFC4", seed=0):
+    """Create an IFC file with the given number of storeys, type objects and elements.
+
+    Elements are spread on a jittered grid over the storeys, contained in their storey
+    and typed by one of the type objects. Returns the IFC file and the list of stand-in
+    Blender objects for all spatial elements and elements.
+    """
+    rng = random.Random(seed)
+    ifc_file = ifcopenshell.file(schema=schema)
+    objects = []
+
+    def add_object(element, location, dimensions):
+        obj = Object(f"{element.is_a()}/{element.Name}", Matrix.Translation(location), box_corners(dimensions), element.id())
+        objects.append(obj)
+        return obj
+
+    project = ifc_file.createIfcProject(ifcopenshell.guid.new(), None, "Benchmark project")
+    length_unit = ifc_file.createIfcSIUnit(None, "LENGTHUNIT", None, "METRE")
+    project.UnitsInContext = ifc_file.createIfcUnitAssignment((length_unit,))
+
+    site_placement = create_placement(ifc_file, (0.0, 0.0, 0.0))
+    site = ifc_file.createIfcSite(ifcopenshell.guid.new(), None, "Site", ObjectPlacement=site_placement)
+    building_placement = create_placement(ifc_file, (0.0, 0.0, 0.0), site_placement)
+    building = ifc_file.createIfcBuilding(ifcopenshell.guid.new(), None, "Building", ObjectPlacement=building_placement)
+    ifc_file.createIfcRelAggregates(ifcopenshell.guid.new(), None, None, None, project, (site,))
+    ifc_file.createIfcRelAggregates(ifcopenshell.guid.new(), None, None, None, site, (building,))
+
+    storey_elements = []
+    storey_placements = []
+    for i in range(storeys):
+        elevation = i * STOREY_HEIGHT
+        placement = create_placement(ifc_file, (0.0, 0.0, elevation), building_placement)
+        storey = ifc_file.createIfcBuildingStorey(ifcopenshell.guid.new(), None, f"Storey {i:02d}",
+                                                  ObjectPlacement=placement, Elevation=elevation)
+        storey_elements.append(storey)
+        storey_placements.append(placement)
+        add_object(storey, (0.0, 0.0, elevation), (1.0, 1.0, 0.0))
+    if storey_elements:
+        ifc_file.createIfcRelAggregates(ifcopenshell.guid.new(), None, None, None, building, tuple(storey_elements))
+
+    type_objects = []
+    for i in range(types):
+        _, type_class, _ = ELEMENT_CLASSES[i % len(ELEMENT_CLASSES)]
+        type_objects.append(ifc_file.create_entity(type_class, GlobalId=ifcopenshell.guid.new(), Name=f"{type_class[3:-4]} type {i:02d}"))
+
+    per_storey = math.ceil(elements / max(storeys, 1))
+    grid_size = max(1, math.ceil(math.sqrt(per_storey)))
+    contained = [[] for _ in storey_elements]
+    typed = [[] for _ in type_objects]
+
+    for i in range(elements):
+        storey_index = min(i // per_storey, storeys - 1) if storeys else None
+        local_index = i - storey_index * per_storey if storeys else i
+        type_index = rng.randrange(len(type_objects)) if type_objects else None
+        element_class, _, dimensions = ELEMENT_CLASSES[(type_index if type_index is not None else i) % len(ELEMENT_CLASSES)]
+        # Jitter well below the default 1 mm sorting precision to exercise the precision comparison
+        x = (local_index % grid_size) * GRID_SPACING + rng.uniform(-0.0004, 0.0004)
+        y = (local_index // grid_size) * GRID_SPACING + rng.uniform(-0.0004, 0.0004)
+        z = storey_index * STOREY_HEIGHT if storeys else 0.0
+        relative_to = storey_placements[storey_index] if storeys else None
+        element = ifc_file.create_entity(element_class, GlobalId=ifcopenshell.guid.new(), Name=f"{element_class[3:]} {i}",
+                                         ObjectPlacement=create_placement(ifc_file, (x, y, 0.0), relative_to))
+        add_object(element, (x, y, z), dimensions)
+        if storeys:
+            contained[storey_index].append(element)
+        if type_index is not None:
+            typed[type_index].append(element)
+
+    for storey, related in zip(storey_elements, contained):
+        if related:
+            ifc_file.createIfcRelContainedInSpatialStructure(ifcopenshell.guid.new(), None, None, None, tuple(related), storey)
+    for type_object, related in zip(type_objects, typed):
+        if related:
+            ifc_file.createIfcRelDefinesByType(ifcopenshell.guid.new(), None, None, None, tuple(related), type_object)
+
+    return ifc_file, objects
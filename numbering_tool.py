@@ -1,31 +1,136 @@
 
 import bpy
 import bonsai.tool as tool
-from mathutils import Vector
-import functools as ft
+from mathutils import Matrix, Vector
+from mathutils.kdtree import KDTree
 from bonsai.bim.ifc import IfcStore
 import string
+import bisect
+import ifcopenshell
 import ifcopenshell.api as ifc_api
-from ifcopenshell.util.element import get_pset
+from ifcopenshell.util.element import get_pset, get_type
 from ifcopenshell.util.pset import PsetQto
 import json
+import os
+import re
+import types
+import csv
+import gzip
+import itertools
+import math
+import time
+import cProfile
+import contextlib
+import getpass
+import urllib.request
+import numpy as np
 
 def get_id(element):
-    return getattr(element, "GlobalId", element.id())
+    """Get the GlobalId of an element, or the entity ID of entities without one, such as grid axes.
+    The GlobalId is read by its position in the class, about 1.5 times faster than by name (get_id stages of the
+    benchmarks), and entities without one fall back without raising an AttributeError."""
+    index = AttributeSlots.get_index(element, "GlobalId")
+    return element[index] if index is not None else element.id()
+
+def get_element(element_id):
+    """Get the element from an ID returned by get_id, or None if it is not in the file"""
+    ifc_file = get_ifc_file()
+    try:
+        return ifc_file.by_guid(element_id) if isinstance(element_id, str) else ifc_file.by_id(element_id)
+    except RuntimeError:
+        return None
+
+def get_user():
+    """Get the login name of the user, or an empty string if it cannot be determined, e.g. without a user in the environment"""
+    try:
+        return getpass.getuser()
+    except (OSError, KeyError, ImportError):
+        return ""
+
+class NumberingContext:
+    """State of the numbering tool for one IFC file, created on first use and dropped when another file is loaded"""
+
+    current = None
+
+    def __init__(self, file):
+        self.file = file
+        self._pset_qto = None
+        self.spatial_index = None
+        self.filter_results = None
+        self.filter_objects = None
+        self.number_changes = None
+        self.history = None
+        self.history_written = 0
+
+    @property
+    def pset_qto(self):
+        """Pset templates of the schema of the file, only loaded when first needed"""
+        if self._pset_qto is None and self.file is not None:
+            self._pset_qto = PsetQto(self.file.schema)
+        return self._pset_qto
 
-ifc_file = IfcStore.get_file()
+    @staticmethod
+    def get():
+        """Get the context of the current IFC file, rebuilding it when the file has changed"""
+        file = IfcStore.get_file()
+        if NumberingContext.current is None or NumberingContext.current.file is not file:
+            NumberingContext.reset()
+            NumberingContext.current = NumberingContext(file)
+        return NumberingContext.current
+
+    @staticmethod
+    def reset():
+        """Drop the context and the caches of the previous file"""
+        NumberingContext.current = None
+        SaveNumber.pset_names = []
+        SaveNumber.pset_common_names = {}
+        LoadSelection.all_objects = []
+        LoadSelection.selected_objects = []
+        LoadSelection.possible_types = []
+        Settings.settings_names = None
+        NumberRegistry.entries = None
+        NumberAllocation.entries = None
 
-def update_ifc_file():
-    global ifc_file
-    if (ifc_file_new := IfcStore.get_file()) != ifc_file:
-        ifc_file = ifc_file_new
-        SaveNumber.pset_qto = PsetQto(ifc_file.schema)
+    @staticmethod
+    def poll(context):
+        """Whether an IFC file is loaded, used by the operators that need one"""
+        return IfcStore.get_file() is not None
+
+def get_ifc_file():
+    return NumberingContext.get().file
+
+@bpy.app.handlers.persistent
+def reset_numbering_context(*args):
+    NumberingContext.reset()
+
+@bpy.app.handlers.persistent
+def reset_scene_caches(*args):
+    """Drop the spatial index and the filtered elements after undo and redo, which replace the Blender objects and
+    may restore other values in the IFC file"""
+    if NumberingContext.current is not None:
+        NumberingContext.current.spatial_index = None
+        NumberingContext.current.filter_results = None
+        NumberingContext.current.filter_objects = None
+
+@bpy.app.handlers.persistent
+def update_spatial_index(scene, depsgraph):
+    """Mark moved and reshaped objects to be updated in the spatial index on its next query, and the index to be synced
+    with the scene when objects are added or deleted, which updates the collections they are linked to"""
+    if NumberingContext.current is None or (spatial_index := NumberingContext.current.spatial_index) is None:
+        return
+    for update in depsgraph.updates:
+        if isinstance(update.id, bpy.types.Collection):
+            spatial_index.stale = True
+        elif isinstance(update.id, bpy.types.Object):
+            if update.id.original not in spatial_index.keys:
+                spatial_index.stale = True
+            elif update.is_updated_transform or update.is_updated_geometry:
+                spatial_index.dirty.add(update.id.original)
 
 class SaveNumber:
     
     pset_names = []
     pset_common_names = {}
-    pset_qto = PsetQto(ifc_file.schema)
 
     @staticmethod
     def get_number(element, props, numbers_cache=None):
@@ -36,7 +141,8 @@ class SaveNumber:
         if get_id(element) in numbers_cache:
             return numbers_cache[get_id(element)]
         if props.save_type == "Attribute":
-            return getattr(element, SaveNumber.get_attribute_name(props), None)
+            index = AttributeSlots.get_index(element, SaveNumber.get_attribute_name(props))
+            return element[index] if index is not None else None
         if props.save_type == "Pset":
             pset_name = SaveNumber.get_pset_name(element, props)
             if (pset := get_pset(element, pset_name)):
@@ -53,17 +159,19 @@ class SaveNumber:
             return 0
         if props.save_type == "Attribute":
             attribute_name = SaveNumber.get_attribute_name(props)
-            if not hasattr(element, attribute_name):
+            index = AttributeSlots.get_index(element, attribute_name)
+            if index is None:
                 return None
             if attribute_name == "Name" and number is None:
                 number = element.is_a().strip("Ifc") #Reset Name to name of type
-            setattr(element, attribute_name, number)
+            element[index] = number
             numbers_cache[get_id(element)] = number
             return 1
         if props.save_type == "Pset":
             pset_name = SaveNumber.get_pset_name(element, props)
             if not pset_name:
                 return None
+            ifc_file = get_ifc_file()
             if pset := get_pset(element, pset_name):
                 pset = ifc_file.by_id(pset["id"])  
             else:
@@ -74,6 +182,47 @@ class SaveNumber:
             numbers_cache[get_id(element)] = number
             return 1
 
+    @staticmethod
+    def save_numbers(element_numbers, props):
+        """Save the numbers of (element, number) pairs in one pass.
+        Returns the written and unchanged counts, the IDs that failed and the old and new numbers of the changed elements for undo."""
+        old_numbers = {}
+        numbers_cache = {}
+        write_count, skip_count, failed = 0, 0, []
+        for element, number in element_numbers:
+            element_id = get_id(element)
+            if element_id not in numbers_cache:
+                old_numbers[element_id] = numbers_cache[element_id] = SaveNumber.get_number(element, props)
+            count = SaveNumber.save_number(element, number, props, numbers_cache)
+            if count is None:
+                failed.append(element_id)
+            else:
+                write_count += count
+                skip_count += count == 0
+            if numbers_cache[element_id] == old_numbers[element_id]: # Only keep changed numbers for undo
+                del old_numbers[element_id], numbers_cache[element_id]
+        return write_count, skip_count, failed, old_numbers, numbers_cache
+
+    @staticmethod
+    def get_storage_props(props):
+        """Read the storage settings once, so they are not read again from the properties for every element"""
+        return types.SimpleNamespace(
+            save_type=props.save_type,
+            attribute_name=SaveNumber.get_attribute_name(props),
+            attribute_name_other=props.attribute_name_other,
+            pset_name=props.pset_name,
+            custom_pset_name=props.custom_pset_name,
+            property_name=props.property_name
+        )
+
+    @staticmethod
+    def get_storage_key(props):
+        """Return a key identifying where numbers are stored with the given settings"""
+        if props.save_type == "Attribute":
+            return ("Attribute", SaveNumber.get_attribute_name(props))
+        custom_pset_name = props.custom_pset_name if props.pset_name == "Custom Pset" else None
+        return ("Pset", props.pset_name, custom_pset_name, props.property_name)
+
     @staticmethod
     def remove_number(element, props, numbers_cache=None):
         count = SaveNumber.save_number(element, None, props, numbers_cache)
@@ -97,7 +246,8 @@ class SaveNumber:
     @staticmethod
     def update_pset_names(prop, context):
         props = context.scene.ifc_numbering_settings
-        pset_names_sets = [set(SaveNumber.pset_qto.get_applicable_names(ifc_type)) for ifc_type in LoadSelection.get_selected_types(props)]
+        pset_qto = NumberingContext.get().pset_qto
+        pset_names_sets = [set(pset_qto.get_applicable_names(ifc_type)) for ifc_type in LoadSelection.get_selected_types(props)] if pset_qto else []
         intersection = set.intersection(*pset_names_sets) if pset_names_sets else set()
         SaveNumber.pset_names = [('Custom Pset', 'Custom Pset', 'Store in custom Pset with selected name'),
                                  ('Common', 'Pset_Common', 'Store in Pset common of the type, e.g. Pset_WallCommon')] + \
@@ -106,7 +256,7 @@ class SaveNumber:
 
     def get_pset_common_names(elements):
         SaveNumber.pset_common_names = {}
-        pset_qto = PsetQto(ifc_file.schema)
+        pset_qto = NumberingContext.get().pset_qto
         for element in elements:
             ifc_type = element.is_a()
             if ifc_type in SaveNumber.pset_common_names:
@@ -122,6 +272,45 @@ class SaveNumber:
                 pset_common_name = None
             SaveNumber.pset_common_names[ifc_type] = pset_common_name
 
+class AttributeSlots:
+    """Positional index of the number attribute per IFC class, resolved once from the schema declaration"""
+
+    indices = {}
+
+    @staticmethod
+    def get_index(element, attribute_name):
+        """Get the index of the attribute in the element, or None if its class has no such attribute"""
+        key = (element.is_a(True), attribute_name)
+        if key not in AttributeSlots.indices:
+            AttributeSlots.indices[key] = AttributeSlots.get_class_index(*key[0].split("."), attribute_name)
+        return AttributeSlots.indices[key]
+
+    @staticmethod
+    def get_class_index(schema_name, ifc_class, attribute_name):
+        """Get the index of an explicit attribute of an IFC class in the schema, or None if it has no such attribute"""
+        try:
+            declaration = ifcopenshell.ifcopenshell_wrapper.schema_by_name(schema_name).declaration_by_name(ifc_class)
+            index = declaration.attribute_index(attribute_name)
+        except (RuntimeError, AttributeError):
+            return None
+        if index < 0 or declaration.derived()[index]:
+            return None
+        return index
+
+    @staticmethod
+    def get_missing_types(elements, attribute_name):
+        """Get the IFC classes of the elements that do not have the attribute, checking each class once"""
+        missing_types = set()
+        checked_types = set()
+        for element in elements:
+            ifc_type = element.is_a(True)
+            if ifc_type in checked_types:
+                continue
+            checked_types.add(ifc_type)
+            if AttributeSlots.get_index(element, attribute_name) is None:
+                missing_types.add(element.is_a())
+        return missing_types
+
 class LoadSelection:
 
     all_objects = []
@@ -137,18 +326,28 @@ class LoadSelection:
 
     @staticmethod
     def load_selected_objects(props):
-        """Load the selected objects based on the current context."""
-        objects = bpy.context.selected_objects if props.selected_toggle else bpy.context.scene.objects
+        """Load the selected objects based on the current context. If a region is set, only the objects in the region are
+        visited, so selecting in a small region of a large scene is fast."""
+        if (region := Regions.get_region_objects(props)) is not None:
+            objects = [obj for obj in region if obj.select_get()] if props.selected_toggle else region
+            if (elements := ElementFilter.get_elements(props)) is not None:
+                objects = [obj for obj in objects if tool.Ifc.get_entity(obj) in elements]
+        else:
+            objects = bpy.context.selected_objects if props.selected_toggle else bpy.context.scene.objects
+            if (filtered := ElementFilter.get_objects(props)) is not None:
+                objects = [obj for obj in filtered if obj.select_get()] if props.selected_toggle else filtered
         if props.visible_toggle:
             objects = [obj for obj in objects if obj.visible_get()]
         return objects
 
     @staticmethod
-    def get_selected_types(props):
+    def get_selected_types(props, possible_types=None):
         """Get the selected IFC types from the properties, processing if All types are selected"""
         selected_types = list(props.selected_types)
         if "All" in selected_types:
-            selected_types = [type_tuple[0] for type_tuple in LoadSelection.possible_types[1:]]
+            if possible_types is None:
+                possible_types = [type_tuple[0] for type_tuple in LoadSelection.possible_types]
+            selected_types = possible_types[1:]
         return selected_types
     
     @staticmethod
@@ -186,7 +385,6 @@ class LoadSelection:
         LoadSelection.possible_types = [(id, name + f": {number_counts[id]}", "") for (id, name, _) in ifc_types]
         NumberFormatting.update_format_preview(prop, context)
         SaveNumber.update_pset_names(prop, context)
-        update_ifc_file()
 
     @staticmethod
     def get_possible_types(prop, context):
@@ -207,8 +405,10 @@ class Storeys:
     property_name = "CustomStoreyNumber"
 
     @staticmethod
-    def get_storeys(props):
+    def get_storeys(props, scene_data=None):
         """Get all storeys from the current scene."""
+        if scene_data is not None:
+            return scene_data.get_storeys(props)
         storeys = []
         storey_locations = {}
         for obj in bpy.context.scene.objects:
@@ -216,7 +416,7 @@ class Storeys:
             if element is not None and element.is_a("IfcBuildingStorey"):
                 storeys.append(element)
                 storey_locations[element] = ObjectGeometry.get_object_location(obj, props)
-        storeys.sort(key=ft.cmp_to_key(lambda a, b: ObjectGeometry.cmp_within_precision(storey_locations[a], storey_locations[b], props, use_dir=False)))
+        storeys = [storeys[i] for i in ObjectGeometry.get_sort_order([storey_locations[storey] for storey in storeys], props, use_dir=False)]
         return storeys
 
     @staticmethod
@@ -245,15 +445,59 @@ class Storeys:
 
     @staticmethod
     def get_storey_number(element, storeys, props):
-        storey_number = None
         if structure := getattr(element, "ContainedInStructure", None):
-            storey = getattr(structure[0], "RelatingStructure", None)
-            if storey and props.storey_numbering == "custom":
-                storey_number = SaveNumber.get_number(storey, Storeys)
-                if storey_number is not None:
-                    storey_number = int(storey_number)
-            if storey_number is None:
-                storey_number = storeys.index(storey) if storey in storeys else None
+            return Storeys.get_structure_number(getattr(structure[0], "RelatingStructure", None), storeys, props)
+        return None
+
+    @staticmethod
+    def get_inferred_storey(element, storey_set, parents):
+        """Get the storey of an element through its containing structure or the structure of its decomposition parents,
+        following spaces and other structures up to the storey they belong to, or None if there is none"""
+        seen = set()
+        while element is not None and element.id() not in seen:
+            if element in storey_set:
+                return element
+            seen.add(element.id())
+            structure = getattr(element, "ContainedInStructure", None)
+            element = structure[0].RelatingStructure if structure else parents.get(element.id())
+        return None
+
+    @staticmethod
+    def get_elevations(storeys, scene_data):
+        """Get the elevations of the storeys in ascending order and the storeys in that order, from the bottom of their
+        objects, or from their Elevation attribute if they have no object"""
+        elevations = []
+        for storey in storeys:
+            obj = (scene_data.storey_objects or {}).get(storey) or tool.Ifc.get_object(storey)
+            elevations.append((scene_data.get_bbox(obj)[0][2] if obj is not None else storey.Elevation or 0.0, storey))
+        elevations.sort(key=lambda elevation: elevation[0])
+        return [elevation for elevation, _ in elevations], [storey for _, storey in elevations]
+
+    @staticmethod
+    def get_elevation_storey(height, elevations, elevation_storeys, props):
+        """Get the highest storey at or below the height within the Z precision, or the lowest storey for lower heights"""
+        index = bisect.bisect_right(elevations, height + props.precision[2] / 1000) - 1
+        return elevation_storeys[max(index, 0)] if elevation_storeys else None
+
+    @staticmethod
+    def infer_storey_number(element, storeys, props, parents, elevations, scene_data):
+        """Get the storey number of an element that is not contained in a storey, from the structure of its parents or
+        else from its elevation, or None if it cannot be inferred"""
+        storey = Storeys.get_inferred_storey(element, set(storeys), parents)
+        if storey is None and (obj := tool.Ifc.get_object(element)) is not None:
+            storey = Storeys.get_elevation_storey(scene_data.get_bbox(obj)[0][2], *elevations, props)
+        return Storeys.get_structure_number(storey, storeys, props) if storey is not None else None
+
+    @staticmethod
+    def get_structure_number(storey, storeys, props):
+        """Get the number of the spatial structure containing an element, or None if it is not one of the storeys"""
+        storey_number = None
+        if storey and props.storey_numbering == "custom":
+            storey_number = SaveNumber.get_number(storey, Storeys)
+            if storey_number is not None:
+                storey_number = int(storey_number)
+        if storey_number is None:
+            storey_number = storeys.index(storey) if storey in storeys else None
         return storey_number
 
 class NumberFormatting:
@@ -261,9 +505,12 @@ class NumberFormatting:
     format_preview = ""
 
     @staticmethod
-    def format_number(props, number_values = (0, 0, None), max_number_values=(100, 100, 1), type_name=""):
-        """Return the formatted number for the given element, type and storey number"""
-        format = props.format
+    def format_number(props, number_values = (0, 0, None), max_number_values=(100, 100, 1), type_name="", parent_number=None):
+        """Return the formatted number for the given element, type and storey number.
+        Parts of an assembly are formatted with the part format, with the number of their parent for {P}."""
+        format = props.format if parent_number is None else props.part_format
+        if "{P}" in format:
+            format = format.replace("{P}", parent_number or "")
         if "{E}" in format:
             format = format.replace("{E}", NumberingSystems.to_numbering_string(props.initial_element_number + number_values[0], props.element_numbering, max_number_values[0]))
         if "{T}" in format:
@@ -387,6 +634,392 @@ class NumberingSystems:
         numbers = [NumberingSystems.to_numbering_string(i, numbering_system, 10) for i in range(initial, initial + 3)]
         return "{0}, {1}, {2}, ...".format(*numbers)
 
+class ElementFilter:
+    """Filter the elements to number with an ifcopenshell.util.selector expression, evaluated in bulk on the IFC file"""
+
+    queries = {}
+    error = ""
+
+    @staticmethod
+    def compile(expression):
+        """Parse the expression once, keeping the parse trees of the recent expressions. The selector module builds its
+        grammar when imported, so it is only imported once a filter is used."""
+        import ifcopenshell.util.selector as selector
+        if expression not in ElementFilter.queries:
+            if len(ElementFilter.queries) >= 32:
+                ElementFilter.queries.pop(next(iter(ElementFilter.queries)))
+            ElementFilter.queries[expression] = selector.filter_elements_grammar.parse(expression)
+        return ElementFilter.queries[expression]
+
+    @staticmethod
+    def get_elements(props):
+        """Get the set of elements matching the filter expression, or None if there is no expression.
+        The result is cached until the expression or the IFC file changes."""
+        expression = props.filter_expression.strip()
+        if not expression:
+            return None
+        numbering_context = NumberingContext.get()
+        ifc_file = numbering_context.file
+        key = (expression, ifc_file.get_max_id(), getattr(IfcStore, "last_transaction", None))
+        if numbering_context.filter_results is None or numbering_context.filter_results[0] != key:
+            with Instrumentation.stage("filter"):
+                import ifcopenshell.util.selector as selector
+                try:
+                    transformer = selector.FacetTransformer(ifc_file)
+                    transformer.transform(ElementFilter.compile(expression))
+                    elements = transformer.get_results()
+                    ElementFilter.error = ""
+                except Exception as e:
+                    elements = set()
+                    ElementFilter.error = f"Invalid filter expression: {e}".splitlines()[0]
+            numbering_context.filter_results = (key, elements)
+        return numbering_context.filter_results[1]
+
+    @staticmethod
+    def get_objects(props):
+        """Get the Blender objects of the elements matching the filter expression, in the order of their IDs, or None if
+        there is no expression"""
+        if (elements := ElementFilter.get_elements(props)) is None:
+            return None
+        numbering_context = NumberingContext.current
+        if numbering_context.filter_objects is None or numbering_context.filter_objects[0] is not elements:
+            objects = [obj for element in sorted(elements, key=lambda element: element.id()) if (obj := tool.Ifc.get_object(element)) is not None]
+            numbering_context.filter_objects = (elements, objects)
+        return numbering_context.filter_objects[1]
+
+class SpatialIndex:
+    """Uniform grid of the bounding box centres of the scene objects, kept up to date from the depsgraph updates.
+    An object is in a region if the centre of its bounding box is, so an object straddling the border of a region is
+    only in the region holding its centre."""
+
+    def __init__(self, objects):
+        self.cells = {}
+        self.keys = {}
+        self.centres = {}
+        self.ordinals = {} # Order in which the objects were added, to return the objects of a query in scene order
+        self.ordinal = 0
+        self.dirty = set()
+        self.stale = False
+        self.key_min = [math.inf] * 3
+        self.key_max = [-math.inf] * 3
+        centres = {obj: SpatialIndex.get_centre(obj) for obj in objects}
+        self.cell_size = SpatialIndex.get_cell_size(list(centres.values()))
+        for obj, centre in centres.items():
+            self.insert(obj, centre)
+
+    @staticmethod
+    def get_centre(obj):
+        min_corner, max_corner = ObjectGeometry.get_object_bbox(obj)
+        return tuple(0.5 * (min_corner[i] + max_corner[i]) for i in range(3))
+
+    @staticmethod
+    def get_cell_size(centres):
+        """Get a cell size for about eight objects per occupied cell, over the axes along which the objects are spread"""
+        if not centres:
+            return 1.0
+        extents = [extent for extent in np.ptp(np.asarray(centres, dtype=float), axis=0) if extent > 1e-6]
+        if not extents:
+            return 1.0
+        return max((math.prod(extents) * 8 / len(centres)) ** (1 / len(extents)), 1e-3)
+
+    def get_key(self, point):
+        return tuple(math.floor(c / self.cell_size) for c in point)
+
+    def insert(self, obj, centre=None):
+        centre = centre or SpatialIndex.get_centre(obj)
+        key = self.get_key(centre)
+        self.cells.setdefault(key, set()).add(obj)
+        self.key_min = [min(a, b) for a, b in zip(self.key_min, key)]
+        self.key_max = [max(a, b) for a, b in zip(self.key_max, key)]
+        self.keys[obj] = key
+        self.centres[obj] = centre
+        if obj not in self.ordinals:
+            self.ordinals[obj] = self.ordinal
+            self.ordinal += 1
+
+    def remove(self, obj):
+        """Remove the object from its cell, keeping its ordinal for when it is inserted again after a move"""
+        if (key := self.keys.pop(obj, None)) is not None:
+            self.centres.pop(obj)
+            cell = self.cells[key]
+            cell.discard(obj)
+            if not cell:
+                del self.cells[key]
+
+    def delete(self, obj):
+        self.remove(obj)
+        self.ordinals.pop(obj, None)
+
+    def refresh(self):
+        """Move the objects updated since the last query to their new cell, dropping those deleted since"""
+        for obj in self.dirty:
+            self.remove(obj)
+            try:
+                self.insert(obj)
+            except ReferenceError: # Deleted after it was moved
+                self.delete(obj)
+        self.dirty.clear()
+
+    def sync(self, objects):
+        """Insert the objects added to the scene and delete the objects removed from it since objects were last added or
+        deleted, keeping the cells and centres of the other objects"""
+        objects = set(objects)
+        for obj in [obj for obj in self.keys if obj not in objects]:
+            self.delete(obj)
+        for obj in objects:
+            if obj not in self.keys:
+                self.insert(obj)
+        self.stale = False
+
+    def query(self, box_min, box_max):
+        """Get the objects with their bounding box centre inside the box in the order they were added, visiting only the
+        cells overlapping the box"""
+        self.refresh()
+        # The key range only grows when objects move, which keeps it a valid bound of the occupied cells
+        key_min = [max(math.floor(c / self.cell_size), low) if math.isfinite(c) else low for c, low in zip(box_min, self.key_min)]
+        key_max = [min(math.floor(c / self.cell_size), high) if math.isfinite(c) else high for c, high in zip(box_max, self.key_max)]
+        if any(low > high for low, high in zip(key_min, key_max)):
+            return []
+        cell_count = math.prod(high - low + 1 for low, high in zip(key_min, key_max))
+        if cell_count > len(self.cells):
+            cells = (cell for key, cell in self.cells.items() if all(low <= k <= high for k, low, high in zip(key, key_min, key_max)))
+        else:
+            cells = (self.cells[key] for key in itertools.product(*(range(low, high + 1) for low, high in zip(key_min, key_max)))
+                     if key in self.cells)
+        centres = self.centres
+        objects = [obj for cell in cells for obj in cell if all(low <= c <= high for c, low, high in zip(centres[obj], box_min, box_max))]
+        return sorted(objects, key=self.ordinals.__getitem__)
+
+class Regions:
+    """Select the elements in a box, in the bounding box of a mesh or in a storey or space, using the spatial index"""
+
+    structure_items = []
+
+    @staticmethod
+    def get_structure_items(prop, context):
+        """Get the storeys and spaces of the IFC file to select the elements in"""
+        items = []
+        if (ifc_file := IfcStore.get_file()) is not None:
+            for ifc_class in ("IfcBuildingStorey", "IfcSpace"):
+                items += [(structure.GlobalId, structure.Name or structure.GlobalId, f"{ifc_class}\nID: {structure.GlobalId}")
+                          for structure in ifc_file.by_type(ifc_class)]
+        Regions.structure_items = items or [("NONE", "No storeys or spaces", "")]
+        return Regions.structure_items
+
+    @staticmethod
+    def get_index():
+        """Get the spatial index of the scene objects, built on first use and synced with the scene when objects are added
+        or deleted"""
+        numbering_context = NumberingContext.get()
+        objects = bpy.context.scene.objects
+        spatial_index = numbering_context.spatial_index
+        if spatial_index is None:
+            spatial_index = numbering_context.spatial_index = SpatialIndex(objects)
+        elif spatial_index.stale:
+            spatial_index.sync(objects)
+        return spatial_index
+
+    @staticmethod
+    def get_box(props):
+        """Get the minimum and maximum corner of the region, unbounded along the axes it does not limit, or None if the
+        region is not found"""
+        if props.region_mode == "BOX":
+            return tuple(props.region_min), tuple(props.region_max)
+        if props.region_mode == "MESH":
+            obj = bpy.context.scene.objects.get(props.region_object)
+            return tuple(tuple(corner) for corner in ObjectGeometry.get_object_bbox(obj)) if obj is not None else None
+        structure = get_element(props.region_structure) if props.region_structure != "NONE" else None
+        if structure is None or (obj := tool.Ifc.get_object(structure)) is None:
+            return None
+        if structure.is_a("IfcSpace"):
+            return tuple(tuple(corner) for corner in ObjectGeometry.get_object_bbox(obj))
+        # A storey extends from its elevation up to the next storey above it
+        bottom = obj.matrix_world.translation.z
+        tops = [storey_obj.matrix_world.translation.z for storey in get_ifc_file().by_type("IfcBuildingStorey")
+                if (storey_obj := tool.Ifc.get_object(storey)) is not None]
+        top = min((z for z in tops if z > bottom), default=math.inf)
+        return (-math.inf, -math.inf, bottom), (math.inf, math.inf, np.nextafter(top, -math.inf))
+
+    @staticmethod
+    def get_region_objects(props):
+        """Get the objects in the region in scene order, or None if no region is set"""
+        if props.region_mode == "NONE":
+            return None
+        if (box := Regions.get_box(props)) is None:
+            return []
+        with Instrumentation.stage("region"):
+            return Regions.get_index().query(*box)
+
+class PathOrder:
+    """Order elements by their distance along a path, given by a Blender curve or an IfcAlignment"""
+
+    path_items = []
+    branching = 4
+    chunk_size = 4096
+
+    @staticmethod
+    def get_path_items(prop, context):
+        """Get the curves in the scene and the alignments in the IFC file to number along"""
+        items = [(f"OBJECT/{obj.name}", obj.name, "Blender curve") for obj in context.scene.objects if obj.type == "CURVE"]
+        if (ifc_file := IfcStore.get_file()) is not None:
+            try:
+                alignments = ifc_file.by_type("IfcAlignment")
+            except RuntimeError: # Not in the schema of the file
+                alignments = []
+            items += [(f"IFC/{alignment.GlobalId}", alignment.Name or alignment.GlobalId, f"IfcAlignment\nID: {alignment.GlobalId}")
+                      for alignment in alignments]
+        PathOrder.path_items = items or [("NONE", "No curves or alignments", "")]
+        return PathOrder.path_items
+
+    @staticmethod
+    def get_object_points(obj):
+        """Get the world space points of a curve object along its first spline, or of a mesh along its chain of edges"""
+        mat = obj.matrix_world
+        if obj.type == "CURVE":
+            from mathutils.geometry import interpolate_bezier
+            spline = obj.data.splines[0]
+            if spline.type == "BEZIER":
+                bezier_points = list(spline.bezier_points) + ([spline.bezier_points[0]] if spline.use_cyclic_u else [])
+                points = [bezier_points[0].co]
+                for a, b in zip(bezier_points, bezier_points[1:]):
+                    points += interpolate_bezier(a.co, a.handle_right, b.handle_left, b.co, spline.resolution_u + 1)[1:]
+            else:
+                points = [point.co.xyz for point in spline.points]
+        else:
+            vertices = obj.data.vertices
+            neighbours = {}
+            for edge in obj.data.edges:
+                a, b = edge.vertices
+                neighbours.setdefault(a, []).append(b)
+                neighbours.setdefault(b, []).append(a)
+            start = next((index for index, linked in neighbours.items() if len(linked) == 1), next(iter(neighbours), None))
+            order, previous = [], None
+            while start is not None and (not order or start != order[0]):
+                order.append(start)
+                start, previous = next((index for index in neighbours[start] if index != previous), None), start
+            points = [vertices[index].co for index in order]
+        return np.array([tuple(mat @ Vector(point)) for point in points], dtype=float).reshape(-1, 3)
+
+    @staticmethod
+    def get_alignment_points(alignment, resolution=1.0):
+        """Get the points of the axis curve of an alignment in metres, sampled every resolution metres"""
+        import ifcopenshell.geom
+        import ifcopenshell.util.placement
+        import ifcopenshell.util.unit
+        ifc_file = alignment.file
+        unit_scale = ifcopenshell.util.unit.calculate_unit_scale(ifc_file)
+        try:
+            import ifcopenshell.api.alignment
+            curve = ifcopenshell.api.alignment.get_curve(alignment)
+        except ImportError: # Older ifcopenshell versions without the alignment API
+            curve = None
+        curve = curve or getattr(alignment, "Axis", None)
+        if curve is None:
+            return np.zeros((0, 3))
+        if curve.is_a("IfcPolyline"):
+            points = np.array([point.Coordinates for point in curve.Points], dtype=float) * unit_scale
+        elif curve.is_a("IfcIndexedPolyCurve"):
+            points = np.array(curve.Points.CoordList, dtype=float) * unit_scale
+        else:
+            settings = ifcopenshell.geom.settings()
+            function_item = ifcopenshell.ifcopenshell_wrapper.map_shape(settings, curve)
+            evaluator = ifcopenshell.ifcopenshell_wrapper.function_item_evaluator(settings, function_item)
+            samples = np.linspace(function_item.start(), function_item.end(), max(2, int(function_item.length() / resolution) + 1))
+            samples = np.union1d(samples, evaluator.evaluation_points())
+            points = np.array([np.array(evaluator.evaluate(float(sample)))[:3, 3] for sample in samples])
+        if points.shape[1] == 2:
+            points = np.hstack([points, np.zeros((len(points), 1))])
+        if alignment.ObjectPlacement is not None:
+            matrix = ifcopenshell.util.placement.get_local_placement(alignment.ObjectPlacement)
+            points = points @ matrix[:3, :3].T + matrix[:3, 3] * unit_scale
+        return points
+
+    @staticmethod
+    def get_path_points(props):
+        """Get the points of the selected path, or None if it is not found"""
+        kind, _, name = props.path.partition("/")
+        if kind == "OBJECT":
+            obj = next((obj for obj in bpy.context.scene.objects if obj.name == name), None)
+            return PathOrder.get_object_points(obj) if obj is not None else None
+        if kind == "IFC" and (alignment := get_element(name)) is not None:
+            return PathOrder.get_alignment_points(alignment)
+        return None
+
+    @staticmethod
+    def project_on_segments(points, starts, vectors, lengths_squared):
+        """Project points on segments, broadcast over the leading dimensions, returning the segment parameters and squared distances"""
+        t = np.clip(np.einsum("...k,...k->...", points - starts, vectors) / lengths_squared, 0.0, 1.0)
+        offsets = starts + t[..., None] * vectors - points
+        return t, np.einsum("...k,...k->...", offsets, offsets)
+
+    @staticmethod
+    def get_segment_index(path):
+        """Build a tree of chords over the path segments, from the top level down to the segments themselves.
+        Each level has the chords from the first to the last point of groups of consecutive segments, branching times
+        larger than the groups of the level below, and the largest distance of each group to its chord."""
+        segment_count = len(path) - 1
+        levels = []
+        size = 1
+        while True:
+            group_starts = np.arange(0, segment_count, size)
+            chord_starts = path[group_starts]
+            chord_vectors = path[np.minimum(group_starts + size, segment_count)] - chord_starts
+            chord_lengths_squared = np.maximum(np.einsum("ij,ij->i", chord_vectors, chord_vectors), 1e-18)
+            vertex_groups = np.minimum(np.arange(len(path)) // size, len(group_starts) - 1)
+            _, deviations = PathOrder.project_on_segments(path, chord_starts[vertex_groups], chord_vectors[vertex_groups],
+                                                          chord_lengths_squared[vertex_groups])
+            deviations = np.sqrt(np.maximum.reduceat(deviations, group_starts)) if size > 1 else np.zeros(len(group_starts))
+            levels.append((chord_starts, chord_vectors, chord_lengths_squared, deviations))
+            if len(group_starts) <= PathOrder.branching:
+                break
+            size *= PathOrder.branching
+        return levels[::-1]
+
+    @staticmethod
+    def project(points, path):
+        """Project points on a polyline path, returning the distance along the path and the distance to the path of each point.
+        The distance of a point to a chord bounds its distance to the segments of the chord's group, so going down the segment
+        index each point is only compared with the children of the groups that can contain its closest segment."""
+        points = np.asarray(points, dtype=float).reshape(-1, 3)
+        path = np.asarray(path, dtype=float).reshape(-1, 3)
+        if len(path) < 2 or len(points) == 0:
+            return np.zeros(len(points)), np.linalg.norm(points - path[0], axis=1) if len(path) else np.full(len(points), np.inf)
+        lengths = np.linalg.norm(np.diff(path, axis=0), axis=1)
+        distances_along = np.r_[0.0, np.cumsum(lengths)]
+        levels = PathOrder.get_segment_index(path)
+        branches = np.arange(PathOrder.branching)
+
+        distances = np.empty(len(points))
+        offsets = np.empty(len(points))
+        for i in range(0, len(points), PathOrder.chunk_size):
+            chunk = points[i:i + PathOrder.chunk_size]
+            top_count = len(levels[0][0])
+            pair_points = np.repeat(np.arange(len(chunk)), top_count)
+            pair_groups = np.tile(np.arange(top_count), len(chunk))
+            for depth, (chord_starts, chord_vectors, chord_lengths_squared, deviations) in enumerate(levels):
+                if depth > 0: # Replace each group by its children
+                    pair_points = np.repeat(pair_points, PathOrder.branching)
+                    pair_groups = (pair_groups[:, None] * PathOrder.branching + branches).ravel()
+                    valid = pair_groups < len(chord_starts)
+                    pair_points, pair_groups = pair_points[valid], pair_groups[valid]
+                t, squared = PathOrder.project_on_segments(chunk[pair_points], chord_starts[pair_groups],
+                                                           chord_vectors[pair_groups], chord_lengths_squared[pair_groups])
+                if depth == len(levels) - 1:
+                    break
+                # Keep the groups that can be closer than the farthest point of the closest group of each point
+                chord_distances = np.sqrt(squared)
+                runs = np.flatnonzero(np.r_[True, np.diff(pair_points) != 0])
+                bounds = np.minimum.reduceat(chord_distances + deviations[pair_groups], runs)
+                keep = chord_distances - deviations[pair_groups] <= np.repeat(bounds, np.diff(np.r_[runs, len(pair_points)])) + 1e-9
+                pair_points, pair_groups = pair_points[keep], pair_groups[keep]
+
+            order = np.lexsort((squared, pair_points))
+            order = order[np.r_[True, np.diff(pair_points[order]) != 0]]
+            segments = pair_groups[order]
+            distances[i:i + PathOrder.chunk_size] = distances_along[segments] + t[order] * lengths[segments]
+            offsets[i:i + PathOrder.chunk_size] = np.sqrt(squared[order])
+        return distances, offsets
+
 class IFC_NumberingSettings(bpy.types.PropertyGroup):
     settings_name : bpy.props.StringProperty(
         name="Settings name",
@@ -398,7 +1031,7 @@ class IFC_NumberingSettings(bpy.types.PropertyGroup):
         settings_names = Settings.get_settings_names()
         if not settings_names:
             return [("NONE", "No saved settings", "")]
-        return [(name, name, "") for name in settings_names]
+        return [(name, name, "") for name in sorted(settings_names)]
 
     saved_settings : bpy.props.EnumProperty(
         name="Load settings",
@@ -406,6 +1039,13 @@ class IFC_NumberingSettings(bpy.types.PropertyGroup):
         items=get_saved_settings_items
     ) # pyright: ignore[reportInvalidTypeForm]
 
+    batch_settings : bpy.props.EnumProperty(
+        name="Batch settings",
+        description="Select which saved settings to assign numbers with, one after the other",
+        items=get_saved_settings_items,
+        options={'ENUM_FLAG'}
+    ) # pyright: ignore[reportInvalidTypeForm]
+
     selected_toggle: bpy.props.BoolProperty(
         name="Selected only",
         description="Only number selected objects",
@@ -420,6 +1060,59 @@ class IFC_NumberingSettings(bpy.types.PropertyGroup):
         update=NumberFormatting.update_format_preview
     ) # pyright: ignore[reportInvalidTypeForm]
     
+    region_mode: bpy.props.EnumProperty(
+        name="Region",
+        description="Only number objects with their bounding box center in a region",
+        items=[
+            ("NONE", "Anywhere", "Number objects anywhere in the scene"),
+            ("BOX", "Box", "Number objects in a box given by its minimum and maximum corner"),
+            ("MESH", "Mesh", "Number objects in the bounding box of a mesh object"),
+            ("STRUCTURE", "Storey/Space", "Number objects in a storey, up to the next storey, or in the bounding box of a space")
+        ],
+        default="NONE",
+        update=NumberFormatting.update_format_preview
+    ) # pyright: ignore[reportInvalidTypeForm]
+
+    region_min: bpy.props.FloatVectorProperty(
+        name="Minimum",
+        description="Minimum corner of the region box",
+        subtype="XYZ",
+        unit="LENGTH",
+        default=(0.0, 0.0, 0.0),
+        update=NumberFormatting.update_format_preview
+    ) # pyright: ignore[reportInvalidTypeForm]
+
+    region_max: bpy.props.FloatVectorProperty(
+        name="Maximum",
+        description="Maximum corner of the region box",
+        subtype="XYZ",
+        unit="LENGTH",
+        default=(10.0, 10.0, 10.0),
+        update=NumberFormatting.update_format_preview
+    ) # pyright: ignore[reportInvalidTypeForm]
+
+    region_object: bpy.props.StringProperty(
+        name="Region object",
+        description="Mesh object bounding the objects to number",
+        default="",
+        update=NumberFormatting.update_format_preview
+    ) # pyright: ignore[reportInvalidTypeForm]
+
+    region_structure: bpy.props.EnumProperty(
+        name="Storey or space",
+        description="Storey or space containing the objects to number",
+        items=Regions.get_structure_items,
+        update=NumberFormatting.update_format_preview
+    ) # pyright: ignore[reportInvalidTypeForm]
+
+    filter_expression: bpy.props.StringProperty(
+        name="Filter",
+        description="Only number elements matching an IfcOpenShell selector expression, e.g. IfcWall, LoadBearing=TRUE or " \
+            "IfcBeam, material=Concrete",
+        default="",
+        update=NumberFormatting.update_format_preview
+    ) # pyright: ignore[reportInvalidTypeForm]
+
     parent_type: bpy.props.EnumProperty(
         name="Parent Type",
         description="Select the parent type for numbering",
@@ -496,6 +1189,31 @@ class IFC_NumberingSettings(bpy.types.PropertyGroup):
         default="ZYX"
     ) # pyright: ignore[reportInvalidTypeForm]
 
+    order_mode: bpy.props.EnumProperty(
+        name="Order",
+        description="Order elements along the axes, along a path, in serpentine rows or in a nearest neighbour tour",
+        items=[
+            ("AXES", "Axes", "Number elements in the axis order and directions"),
+            ("PATH", "Path", "Number elements by the distance along a curve or IfcAlignment, using the axis order for elements at the same distance"),
+            ("SERPENTINE", "Serpentine", "Number elements in rows along the last axis of the axis order, reversing every other row. " \
+             "Levels and rows are the first two axes, grouped within the precision"),
+            ("NEAREST", "Nearest", "Number elements in a tour to the nearest unnumbered element, starting from the first element in the axis order")
+        ],
+        default="AXES"
+    ) # pyright: ignore[reportInvalidTypeForm]
+
+    path: bpy.props.EnumProperty(
+        name="Path",
+        description="Curve or IfcAlignment to number along",
+        items=PathOrder.get_path_items
+    ) # pyright: ignore[reportInvalidTypeForm]
+
+    path_reverse: bpy.props.BoolProperty(
+        name="Reverse",
+        description="Number from the end of the path to its start",
+        default=False
+    ) # pyright: ignore[reportInvalidTypeForm]
+
     location_type: bpy.props.EnumProperty(
         name="Reference location",
         description="Location to use for sorting elements",
@@ -569,6 +1287,44 @@ class IFC_NumberingSettings(bpy.types.PropertyGroup):
         update=update_storey_numbering
     )    # pyright: ignore[reportInvalidTypeForm]
 
+    grid_toggle: bpy.props.BoolProperty(
+        name="Number from grid structure",
+        description="Number the U, V and W axes of each IfcGrid in the order of their axis curves, read from the IFC file without " \
+            "the grid geometry, instead of with the numbering format. Numbers are always stored in the AxisTag attribute",
+        default=False
+    ) # pyright: ignore[reportInvalidTypeForm]
+
+    grid_u_numbering: bpy.props.EnumProperty(
+        name="U axes",
+        description="Select numbering system for the U axes of grids",
+        items=lambda self, context: self.numberings_enum(self.initial_element_number),
+    ) # pyright: ignore[reportInvalidTypeForm]
+
+    grid_v_numbering: bpy.props.EnumProperty(
+        name="V axes",
+        description="Select numbering system for the V axes of grids",
+        items=lambda self, context: self.numberings_enum(self.initial_element_number),
+        default=3 # Upper case letters
+    ) # pyright: ignore[reportInvalidTypeForm]
+
+    grid_w_numbering: bpy.props.EnumProperty(
+        name="W axes",
+        description="Select numbering system for the W axes of triangular grids",
+        items=lambda self, context: self.numberings_enum(self.initial_element_number),
+        default=2 # Lower case letters
+    ) # pyright: ignore[reportInvalidTypeForm]
+
+    storey_mode: bpy.props.EnumProperty(
+        name="Storey of elements",
+        description="How to find the storey of an element for {S} and for restarting numbers per storey",
+        items=[
+            ("CONTAINMENT", "Contained", "Use the storey containing the element, elements outside a storey get x for {S}"),
+            ("INFERRED", "Inferred", "Use the storey containing the element, else the storey of the structure containing its parent " \
+             "assembly or space, else the storey at the elevation of the bottom of the element")
+        ],
+        default="CONTAINMENT"
+    ) # pyright: ignore[reportInvalidTypeForm]
+
     custom_storey: bpy.props.EnumProperty(
         name = "Storey",
         description = "Select storey to number",
@@ -596,6 +1352,48 @@ class IFC_NumberingSettings(bpy.types.PropertyGroup):
         update=NumberFormatting.update_format_preview
     ) # pyright: ignore[reportInvalidTypeForm]
 
+    scope: bpy.props.EnumProperty(
+        name="Restart numbers",
+        description="Restart the element and type numbers {E} and {T} for each group of elements",
+        items=[
+            ("NONE", "Never", "Number all elements in one sequence"),
+            ("STOREY", "Per storey", "Restart the numbers on each storey"),
+            ("CONTAINER", "Per container", "Restart the numbers in each spatial container, e.g. storey or space"),
+            ("PROPERTY", "Per property value", "Restart the numbers for each value of a property")
+        ],
+        default="NONE"
+    ) # pyright: ignore[reportInvalidTypeForm]
+
+    scope_property: bpy.props.StringProperty(
+        name="Scope property",
+        description="Property whose values group the elements, as Pset name.Property name",
+        default="Pset_Numbering.Zone"
+    ) # pyright: ignore[reportInvalidTypeForm]
+
+    hierarchy_toggle: bpy.props.BoolProperty(
+        name="Number parts",
+        description="Number the parts of assemblies and nested elements within their parent with the part format, " \
+            "when the parent is numbered as well",
+        default=False
+    ) # pyright: ignore[reportInvalidTypeForm]
+
+    part_format: bpy.props.StringProperty(
+        name="Part format",
+        description="Format string for the parts of a numbered assembly or nesting element.\n" \
+        "{P}: number of the parent\n" \
+        "{E}: part number within the parent\n" \
+        "{T}: part number within the type and parent\n" \
+        "Other placeholders as in the format",
+        default="{P}-{E}"
+    ) # pyright: ignore[reportInvalidTypeForm]
+
+    validation_pattern: bpy.props.StringProperty(
+        name="Validation pattern",
+        description="Regular expression the stored numbers must match in full when validating, with the storey number as group S, " \
+            "e.g. W-(?P<S>\\d+)-\\d{3}. Leave empty to validate against the format",
+        default=""
+    ) # pyright: ignore[reportInvalidTypeForm]
+
     save_type : bpy.props.EnumProperty(
         name="Type of number storage",
         items = [("Attribute", "Attribute", "Store number in an attribute of the IFC element"),
@@ -646,16 +1444,69 @@ class IFC_NumberingSettings(bpy.types.PropertyGroup):
 
     remove_toggle: bpy.props.BoolProperty(
         name="Remove numbers from unselected objects",
-        description="Remove numbers from unselected objects in the scene",
+        description="Remove numbers from unselected objects in the scene, or in the region if one is set",
+        default=True
+    ) # pyright: ignore[reportInvalidTypeForm]
+
+    propagate_toggle: bpy.props.BoolProperty(
+        name="Propagate to occurrences",
+        description="When assigning type numbers, also store the number of each type object in all its occurrences. " \
+            "With Pset storage, occurrences inherit the number of their type and are only written if they override it",
         default=True
     ) # pyright: ignore[reportInvalidTypeForm]
 
+    registry_toggle: bpy.props.BoolProperty(
+        name="Use number registry",
+        description="Keep numbers unique over numbering passes, replacing used or reserved numbers by the next free number of their prefix. " \
+        "Used numbers are registered in Pset_NumberingRegistry of the IFC Project element",
+        default=False
+    ) # pyright: ignore[reportInvalidTypeForm]
+
+    allocation_toggle: bpy.props.BoolProperty(
+        name="Use allocation service",
+        description="Take the trailing integer of each number from numbers reserved for this model by an allocation service, " \
+        "so split files of a project numbered at the same time do not collide. Parts keep their number within the parent. " \
+        "Reserved numbers are kept in Pset_NumberingSettings of the IFC Project element",
+        default=False
+    ) # pyright: ignore[reportInvalidTypeForm]
+
+    allocation_url: bpy.props.StringProperty(
+        name="Service URL",
+        description="URL of the allocation service started with allocation_service.py",
+        default="http://localhost:8765"
+    ) # pyright: ignore[reportInvalidTypeForm]
+
+    allocation_batch: bpy.props.IntProperty(
+        name="Batch",
+        description="Minimum count of numbers to reserve for a prefix at once, so later numbering runs need no request",
+        default=100,
+        min=1
+    ) # pyright: ignore[reportInvalidTypeForm]
+
     check_duplicates_toggle: bpy.props.BoolProperty(
         name="Check for duplicate numbers",
         description="Check for duplicate numbers in all objects in the scene",
         default=True
     ) # pyright: ignore[reportInvalidTypeForm]
 
+    history_toggle: bpy.props.BoolProperty(
+        name="Keep numbering history",
+        description="Append every change of numbers to a history file next to the IFC file, to revert to an earlier numbering run " \
+            "after the file was closed. The history file grows with every run, undo and redo",
+        default=False
+    ) # pyright: ignore[reportInvalidTypeForm]
+
+    instrumentation: bpy.props.EnumProperty(
+        name="Instrumentation",
+        description="Record timings and counters of each numbering stage, shown in the info area",
+        items=[
+            ("OFF", "Off", "Do not record timings"),
+            ("TIMERS", "Timers", "Record timings and counters of each stage"),
+            ("PROFILE", "Profile", "Record timings and counters of each stage and cProfile statistics")
+        ],
+        default="OFF"
+    ) # pyright: ignore[reportInvalidTypeForm]
+
     # Draw method (UI layout)
     def draw(self, layout):
         
@@ -672,6 +1523,10 @@ class IFC_NumberingSettings(bpy.types.PropertyGroup):
         grid.operator("ifc.load_settings", icon="FILE_REFRESH", text="Load")
         grid.operator("ifc.delete_settings", icon="TRASH", text="Delete")
         grid.operator("ifc.import_settings", icon="IMPORT", text="Import")
+
+        row = box.row(align=True)
+        row.prop(self, "batch_settings", expand=True)
+        row.operator("ifc.batch_assign_numbers", icon="TAG", text="Batch assign")
         
         # Selection box
         box = layout.box()
@@ -685,6 +1540,29 @@ class IFC_NumberingSettings(bpy.types.PropertyGroup):
         else:
             grid.label(text="")
 
+        if self.parent_type == "IfcGridAxis":
+            row = box.row(align=True)
+            row.prop(self, "grid_toggle")
+            if self.grid_toggle:
+                row.prop(self, "grid_u_numbering", text="U")
+                row.prop(self, "grid_v_numbering", text="V")
+                row.prop(self, "grid_w_numbering", text="W")
+
+        row = box.row(align=True)
+        row.prop(self, "filter_expression", text="", icon="FILTER")
+        if ElementFilter.error and self.filter_expression.strip():
+            box.label(text=ElementFilter.error, icon="ERROR")
+
+        row = box.row(align=True)
+        row.prop(self, "region_mode", text="")
+        if self.region_mode == "BOX":
+            row.prop(self, "region_min", text="")
+            row.prop(self, "region_max", text="")
+        elif self.region_mode == "MESH":
+            row.prop_search(self, "region_object", bpy.context.scene, "objects", text="")
+        elif self.region_mode == "STRUCTURE":
+            row.prop(self, "region_structure", text="")
+
         grid = box.grid_flow(row_major=True, align=True, columns=4, even_columns=True)
         grid.prop(self, "selected_types", expand=True)
 
@@ -709,6 +1587,12 @@ class IFC_NumberingSettings(bpy.types.PropertyGroup):
         grid.label(text="Reference point:")
         grid.prop(self, "location_type", text="")
 
+        row = box.row(align=True)
+        row.prop(self, "order_mode", expand=True)
+        if self.order_mode == "PATH":
+            row.prop(self, "path", text="")
+            row.prop(self, "path_reverse")
+
         # Numbering systems box
         box = layout.box()
         box.label(text="Numbering of elements {E}, within type {T} and storeys {S}")
@@ -722,6 +1606,13 @@ class IFC_NumberingSettings(bpy.types.PropertyGroup):
         grid.prop(self, "type_numbering", text="{T}")
         grid.prop(self, "storey_numbering", text="{S}")
 
+        row = box.row(align=True)
+        row.prop(self, "storey_mode")
+        row = box.row(align=True)
+        row.prop(self, "scope")
+        if self.scope == "PROPERTY":
+            row.prop(self, "scope_property", text="")
+
         # Custom storey number
         if self.storey_numbering == "custom":
             box = box.box()
@@ -739,6 +1630,10 @@ class IFC_NumberingSettings(bpy.types.PropertyGroup):
         grid.label(text="Preview:")
         preview_box = grid.box()
         preview_box.label(text=NumberFormatting.format_preview)
+        row = box.row(align=True)
+        row.prop(self, "hierarchy_toggle")
+        if self.hierarchy_toggle:
+            row.prop(self, "part_format", text="")
 
         # Storage options
         box = layout.box()
@@ -758,186 +1653,967 @@ class IFC_NumberingSettings(bpy.types.PropertyGroup):
 
         box.prop(self, "remove_toggle")
         box.prop(self, "check_duplicates_toggle")
+        row = box.row(align=True)
+        row.prop(self, "registry_toggle")
+        row.operator("ifc.rebuild_number_registry", icon="FILE_REFRESH", text="Rebuild")
+        row.operator("ifc.reserve_numbers", icon="LOCKED", text="Reserve")
+        row = box.row(align=True)
+        row.prop(self, "allocation_toggle")
+        if self.allocation_toggle:
+            row.prop(self, "allocation_url", text="")
+            row.prop(self, "allocation_batch")
 
         # Actions
         layout.separator()
         row = layout.row(align=True)
         row.operator("ifc.assign_numbers", icon="TAG", text="Assign numbers")
         row = layout.row(align=True)
+        row.operator("ifc.assign_type_numbers", icon="OUTLINER_OB_GROUP_INSTANCE", text="Assign type numbers")
+        row.prop(self, "propagate_toggle")
+        row = layout.row(align=True)
         row.operator("ifc.remove_numbers", icon="X", text="Remove numbers")
+        row = layout.row(align=True)
+        row.operator("ifc.export_schedule", icon="EXPORT", text="Export schedule")
+        row.operator("ifc.import_numbers", icon="IMPORT", text="Import numbers")
+        row = layout.row(align=True)
+        row.prop(self, "validation_pattern", text="", icon="CHECKMARK")
+        row.operator("ifc.validate_numbers", icon="CHECKMARK", text="Validate numbers")
+        row = layout.row(align=True)
+        row.operator("ifc.export_number_patch", icon="EXPORT", text="Export patch")
+        row.operator("ifc.apply_number_patch", icon="IMPORT", text="Apply patch")
+        row = layout.row(align=True)
+        row.prop(self, "history_toggle")
+        row.operator("ifc.revert_number_history", icon="RECOVER_LAST", text="Revert to history")
+        row = layout.row(align=True)
+        row.prop(self, "instrumentation", text="Instrumentation")
+        row.operator("ifc.export_instrumentation", icon="EXPORT", text="Export stats")
 
 class ObjectGeometry:
     @staticmethod
-    def get_object_location(obj, props):
-        """Get the location of a Blender object."""
+    def get_object_bbox(obj):
+        """Get the minimum and maximum corner of the bounding box of a Blender object in world space."""
         mat = obj.matrix_world
-        bbox_vectors = [mat @ Vector(b) for b in obj.bound_box]
+        coords = [mat @ Vector(corner) for corner in obj.bound_box]
+        min_corner = Vector((min(v[i] for v in coords) for i in range(3)))
+        max_corner = Vector((max(v[i] for v in coords) for i in range(3)))
+        return min_corner, max_corner
 
+    @staticmethod
+    def get_bbox_location(bbox, props):
+        """Get the reference location from a bounding box, based on the location type and directions."""
+        min_corner, max_corner = bbox
         if props.location_type == "CENTER":
-            return 0.125 * sum(bbox_vectors, Vector())
+            return 0.5 * (min_corner + max_corner)
 
         elif props.location_type == "BOUNDING_BOX":
-            bbox_vector = Vector((0, 0, 0))
             # Determine the coordinates based on the direction and axis order
             direction = (int(props.x_direction), int(props.y_direction), int(props.z_direction))
-            for i in range(3):
-                if direction[i] == 1:
-                    bbox_vector[i] = min(v[i] for v in bbox_vectors)
-                else:
-                    bbox_vector[i] = max(v[i] for v in bbox_vectors)
-            return bbox_vector
+            return Vector((min_corner[i] if direction[i] == 1 else max_corner[i] for i in range(3)))
+
+    @staticmethod
+    def get_bbox_locations(bboxes, props):
+        """Get the reference locations of an array of bounding boxes with the minimum and maximum corner of each box"""
+        if props.location_type == "CENTER":
+            return 0.5 * (bboxes[:, 0] + bboxes[:, 1])
+        direction = np.array((int(props.x_direction), int(props.y_direction), int(props.z_direction)))
+        return np.where(direction == 1, bboxes[:, 0], bboxes[:, 1])
+
+    @staticmethod
+    def get_object_location(obj, props):
+        """Get the location of a Blender object."""
+        return ObjectGeometry.get_bbox_location(ObjectGeometry.get_object_bbox(obj), props)
 
     @staticmethod
     def get_object_dimensions(obj):
         """Get the dimensions of a Blender object."""
-        # Get the object's bounding box corners in world space
-        mat = obj.matrix_world
-        coords = [mat @ Vector(corner) for corner in obj.bound_box]
+        min_corner, max_corner = ObjectGeometry.get_object_bbox(obj)
+        # Dimensions in global space
+        return max_corner - min_corner
 
-        # Compute min and max coordinates
-        min_corner = Vector((min(v[i] for v in coords) for i in range(3)))
-        max_corner = Vector((max(v[i] for v in coords) for i in range(3)))
+    @staticmethod
+    def get_clusters(values, precision):
+        """Group coordinates in one sort and sweep, starting a new cluster where consecutive sorted values differ by more
+        than the precision in mm. Returns the integer cluster ID of each value, increasing with the values."""
+        values = np.asarray(values, dtype=float)
+        order = np.argsort(values, kind="stable")
+        clusters = np.empty(len(values), dtype=np.int64)
+        clusters[order] = np.r_[0, np.cumsum(np.diff(values[order]) * 1000 > precision)] if len(values) else []
+        return clusters
 
-        # Dimensions in global space
-        dimensions = max_corner - min_corner
-        return dimensions
+    @staticmethod
+    def get_nearest_neighbour_order(locations, start=0):
+        """Get a greedy nearest neighbour tour through the locations from the start index.
+        The KD-tree search skips the visited locations, and the tree is rebuilt with the unvisited locations when a quarter
+        of its locations are visited, so the visited locations a search has to pass stay few."""
+        visited = [False] * len(locations)
+        is_unvisited = lambda index: not visited[index]
+        order = []
+        current = start
+        tree_size = 0
+        for remaining in range(len(locations) - 1, -1, -1):
+            visited[current] = True
+            order.append(current)
+            if not remaining:
+                break
+            if remaining <= tree_size * 3 // 4 or tree_size == 0:
+                unvisited = [index for index, done in enumerate(visited) if not done]
+                tree, tree_size = KDTree(len(unvisited)), len(unvisited)
+                for index in unvisited:
+                    tree.insert(locations[index], index)
+                tree.balance()
+            current = tree.find(locations[current], filter=is_unvisited)[1]
+        return order
 
     @staticmethod
-    def cmp_within_precision(a, b, props, use_dir=True):
-        """Compare two vectors within a given precision."""
+    def get_cluster_keys(vectors, props, use_dir=True):
+        """Get the cluster IDs of the vectors along each axis, from the first to the last axis of the axis order.
+        Coordinates within the precision of each other are in the same cluster, chained over the sorted coordinates."""
+        vectors = np.asarray(vectors, dtype=float).reshape(-1, 3)
         direction = (int(props.x_direction), int(props.y_direction), int(props.z_direction)) if use_dir else (1, 1, 1)
-        for axis in props.axis_order:
-            idx = "XYZ".index(axis)
-            diff = (a[idx] - b[idx]) * direction[idx]
-            if 1000 * abs(diff) > props.precision[idx]:
-                return 1 if diff > 0 else -1
-        return 0
+        return [ObjectGeometry.get_clusters(vectors[:, idx] * direction[idx], props.precision[idx])
+                for idx in ("XYZ".index(axis) for axis in props.axis_order)]
 
-class UndoOperator:
     @staticmethod
-    def execute_with_undo(operator, context, method):
-        """Execute a method with undo support."""
-        IfcStore.begin_transaction(operator)
-        props = context.scene.ifc_numbering_settings
+    def get_sort_order(vectors, props, use_dir=True, tie_vectors=None):
+        """Get the indices that sort the vectors by their clusters in the axis order, then by the clusters of the tie vectors
+        and finally by the exact coordinates, so the result does not depend on the original order."""
+        if not len(vectors):
+            return np.zeros(0, dtype=np.int64)
+        vectors = np.asarray(vectors, dtype=float).reshape(-1, 3)
+        keys = ObjectGeometry.get_cluster_keys(vectors, props, use_dir)
+        if tie_vectors is not None:
+            keys += ObjectGeometry.get_cluster_keys(tie_vectors, props, use_dir=False)
+        direction = (int(props.x_direction), int(props.y_direction), int(props.z_direction)) if use_dir else (1, 1, 1)
+        keys += [vectors[:, idx] * direction[idx] for idx in ("XYZ".index(axis) for axis in props.axis_order)]
+        return np.lexsort(keys[::-1])
 
-        parent_type = LoadSelection.get_parent_type(props)
-        try: 
-            elements = ifc_file.by_type(parent_type)
-        except RuntimeError:
-            operator.report({'ERROR'}, f"Parent type {parent_type} not found in {ifc_file.schema} schema.")
-            return {'CANCELLED'}
-        
-        if props.pset_name == "Common":
-            SaveNumber.get_pset_common_names(elements)
+class PlacementObject:
+    """Stand-in for the Blender object of an element without one, e.g. in an IFC file loaded without its geometry,
+    located by the origin of its IFC placement. The bounding box is reduced to that point, so all location types give
+    the placement origin."""
 
-        old_numbers = {get_id(element): SaveNumber.get_number(element, props) for element in elements}
-        new_numbers = old_numbers.copy()
+    __slots__ = ("element", "name", "matrix_world", "bound_box")
 
-        result = method(props, new_numbers)
-        
-        operator.transaction_data = {"old_value": old_numbers, "new_value": new_numbers}
-        IfcStore.add_transaction_operation(operator)
-        IfcStore.end_transaction(operator)
+    def __init__(self, element, unit_scale=1.0):
+        self.element = element
+        self.name = f"{element.is_a()}/{getattr(element, 'Name', None) or get_id(element)}"
+        self.matrix_world = Matrix.Translation(PlacementObject.get_location(element, unit_scale))
+        self.bound_box = [(0.0, 0.0, 0.0)] * 8
 
-        bpy.context.view_layer.objects.active = bpy.context.active_object
+    @staticmethod
+    def get_location(element, unit_scale=1.0):
+        """Get the origin of the placement of an element in metres, or the project origin if it has no placement"""
+        import ifcopenshell.util.placement
+        if getattr(element, "ObjectPlacement", None) is None:
+            return (0.0, 0.0, 0.0)
+        matrix = ifcopenshell.util.placement.get_local_placement(element.ObjectPlacement)
+        return tuple(float(c) * unit_scale for c in matrix[:3, 3])
 
-        return result
-    
     @staticmethod
-    def rollback(operator, data):
-        """Support undo of number assignment"""
-        rollback_count = 0
-        props = bpy.context.scene.ifc_numbering_settings
-        for element in ifc_file.by_type(LoadSelection.get_parent_type(props)):
-            old_number = data["old_value"].get(get_id(element), None)
-            rollback_count += int(SaveNumber.save_number(element, old_number, props, data["new_value"]) or 0)
-        bpy.ops.ifc.show_message('EXEC_DEFAULT', message=f"Rollback {rollback_count} numbers.")
-    
+    def get_objects(elements):
+        """Get the Blender object of each element, or a placement object for the elements without one"""
+        import ifcopenshell.util.unit
+        unit_scale = None
+        objects = []
+        for element in elements:
+            if (obj := tool.Ifc.get_object(element)) is None:
+                if unit_scale is None:
+                    unit_scale = ifcopenshell.util.unit.calculate_unit_scale(element.file)
+                obj = PlacementObject(element, unit_scale)
+            objects.append(obj)
+        return objects
+
+    def visible_get(self):
+        return True
+
+    def select_get(self):
+        return True
+
+class SceneData:
+    """Objects, IFC entities, bounding boxes and storeys of the scene, computed once and shared between numbering runs"""
+
+    def __init__(self, objects=None):
+        """Use the objects of the scene, or only the given objects, which then count as selected and may be placement
+        objects of elements without a Blender object"""
+        self.scene = objects is None
+        self.objects = list(bpy.context.scene.objects) if self.scene else list(objects)
+        self.selected_objects = list(bpy.context.selected_objects) if self.scene else self.objects
+        self.selected_set = set(self.selected_objects)
+        self.visible = {}
+        self.entities = {obj: obj.element for obj in self.objects if isinstance(obj, PlacementObject)}
+        self.bboxes = {}
+        self.storey_objects = None
+        self.regions = {}
+        self.filters = {}
+
+    def get_entity(self, obj):
+        """Get the IFC entity of an object, resolving it only once"""
+        if obj in self.entities:
+            return self.entities[obj]
+        element = self.entities[obj] = tool.Ifc.get_entity(obj)
+        return element
+
+    def is_visible(self, obj):
+        if obj not in self.visible:
+            self.visible[obj] = obj.visible_get()
+        return self.visible[obj]
+
+    def is_unselected(self, obj, props):
+        """Whether the object is excluded from numbering by the selected or visible toggle or the filter expression.
+        The region is not checked, as only the objects in the region are visited to remove their numbers."""
+        return (props.selected_toggle and obj not in self.selected_set) or \
+            (props.visible_toggle and not self.is_visible(obj)) or \
+            not self.matches_filter(obj, props)
+
+    def matches_filter(self, obj, props):
+        """Whether the object matches the filter expression, by its Blender object in the scene, else by its element as
+        the given objects may be placement objects"""
+        if self.scene:
+            return (filtered := self.get_filtered_objects(props)) is None or obj in filtered[1]
+        return (elements := ElementFilter.get_elements(props)) is None or self.get_entity(obj) in elements
+
+    def get_filtered_objects(self, props):
+        """Get the list and set of objects matching the filter expression, or None if there is no expression"""
+        expression = props.filter_expression.strip()
+        if expression not in self.filters:
+            objects = ElementFilter.get_objects(props)
+            self.filters[expression] = (objects, set(objects)) if objects is not None else None
+        return self.filters[expression]
+
+    def get_region_objects(self, props):
+        """Get the list and set of objects in the region of the settings, querying the spatial index once per region, or
+        None if no region is set"""
+        key = (props.region_mode, tuple(props.region_min), tuple(props.region_max), props.region_object, props.region_structure)
+        if key not in self.regions:
+            objects = Regions.get_region_objects(props)
+            if objects is not None and not self.scene and (box := Regions.get_box(props)) is not None:
+                # Placement objects are not in the spatial index of the scene, so their centre is checked against the box
+                objects = objects + [obj for obj in self.objects if isinstance(obj, PlacementObject) and
+                                     all(low <= c <= high for c, low, high in zip(SpatialIndex.get_centre(obj), *box))]
+            self.regions[key] = (objects, set(objects)) if objects is not None else None
+        return self.regions[key]
+
+    def get_reachable_objects(self, props):
+        """Get the objects whose numbers can change with the settings: the objects in the region if one is set, else all"""
+        if (region := self.get_region_objects(props)) is None:
+            return self.objects
+        return region[0] if self.scene else [obj for obj in self.objects if obj in region[1]]
+
+    def load_selected_objects(self, props):
+        """Load the selected objects, as in LoadSelection.load_selected_objects. In the scene, only the objects in the
+        region are visited if a region is set."""
+        region = self.get_region_objects(props)
+        if region is not None and self.scene:
+            objects = [obj for obj in region[0] if obj in self.selected_set] if props.selected_toggle else region[0]
+            if (elements := ElementFilter.get_elements(props)) is not None:
+                objects = [obj for obj in objects if self.get_entity(obj) in elements]
+        else:
+            objects = self.selected_objects if props.selected_toggle else self.objects
+            if not self.scene:
+                objects = [obj for obj in objects if self.matches_filter(obj, props)]
+            elif (filtered := self.get_filtered_objects(props)) is not None:
+                objects = [obj for obj in filtered[0] if obj in self.selected_set] if props.selected_toggle else filtered[0]
+            if region is not None:
+                objects = [obj for obj in objects if obj in region[1]]
+        if props.visible_toggle:
+            objects = [obj for obj in objects if self.is_visible(obj)]
+        return objects
+
+    def get_possible_types(self, props):
+        """Get the IFC types of the parent type present in the selected objects, starting with 'All'"""
+        parent_type = LoadSelection.get_parent_type(props)
+        ifc_types = set()
+        for obj in self.load_selected_objects(props):
+            element = self.get_entity(obj)
+            if element is not None and element.is_a(parent_type):
+                ifc_types.add(element.is_a())
+        return ["All"] + sorted(ifc_types)
+
+    def get_bbox(self, obj):
+        if obj not in self.bboxes:
+            self.bboxes[obj] = ObjectGeometry.get_object_bbox(obj)
+        return self.bboxes[obj]
+
+    def get_location(self, obj, props):
+        return ObjectGeometry.get_bbox_location(self.get_bbox(obj), props)
+
+    def get_dimensions(self, obj):
+        min_corner, max_corner = self.get_bbox(obj)
+        return max_corner - min_corner
+
+    def get_storeys(self, props):
+        """Get all storeys, sorted with the given settings"""
+        if self.storey_objects is None:
+            self.storey_objects = {}
+            if not self.scene: # The given objects need not include the storeys, which may also have no object
+                storeys = get_ifc_file().by_type("IfcBuildingStorey")
+                self.storey_objects = dict(zip(storeys, PlacementObject.get_objects(storeys)))
+            for obj in self.objects if self.scene else ():
+                element = self.get_entity(obj)
+                if element is not None and element.is_a("IfcBuildingStorey"):
+                    self.storey_objects[element] = obj
+        storey_locations = {storey: self.get_location(obj, props) for storey, obj in self.storey_objects.items()}
+        storeys = list(self.storey_objects)
+        storeys = [storeys[i] for i in ObjectGeometry.get_sort_order([storey_locations[storey] for storey in storeys], props, use_dir=False)]
+        return storeys
+
+class Decomposition:
+    """Parents of the parts of assemblies and nested elements, from IfcRelAggregates and IfcRelNests"""
+
     @staticmethod
-    def commit(operator, data):
-        """Support redo of number assignment"""
-        commit_count = 0
-        props = bpy.context.scene.ifc_numbering_settings
-        for obj in bpy.context.scene.objects:
-            element = tool.Ifc.get_entity(obj)
-            if element is not None and element.is_a(LoadSelection.get_parent_type(props)):
-                new_number = data["new_value"].get(obj.name, None)
-                commit_count += int(SaveNumber.save_number(element, new_number, props, data["old_value"]) or 0)
-        bpy.ops.ifc.show_message('EXEC_DEFAULT', message=f"Commit {commit_count} numbers.")
-    
-class IFC_AssignNumbers(bpy.types.Operator):
-    bl_idname = "ifc.assign_numbers"
-    bl_label = "Assign numbers"
-    bl_description = "Assign numbers to selected objects"
-    bl_options = {"REGISTER", "UNDO"}
+    def get_parents(ifc_file):
+        """Get the decomposing parent of each element by entity ID, in one pass over the relationships"""
+        parents = {}
+        for rel_class in ("IfcRelAggregates", "IfcRelNests"):
+            for rel in ifc_file.by_type(rel_class):
+                parent = rel.RelatingObject
+                for child in rel.RelatedObjects:
+                    parents[child.id()] = parent
+        return parents
+
+class ElementRecord:
+    """Compact record of an element in the numbering pipeline, with the row of its geometry in the arrays of the records"""
+
+    __slots__ = ("element", "obj", "type_code", "storey", "row", "number", "parent")
+
+    def __init__(self, element, obj, type_code):
+        self.element = element
+        self.obj = obj
+        self.type_code = type_code
+        self.storey = None
+        self.row = None
+        self.number = None
+        self.parent = None
+
+class ElementRecords:
+    """Records of the elements to number, shared by the stages of the numbering pipeline and indexed by entity ID.
+    Types are stored as codes into the list of selected types, locations and dimensions as rows of two float arrays."""
+
+    def __init__(self, ifc_types):
+        self.types = list(ifc_types)
+        self.type_codes = {ifc_type: code for code, ifc_type in enumerate(self.types)}
+        self.records = []
+        self.by_id = {}
+        self.locations = np.zeros((0, 3))
+        self.dimensions = np.zeros((0, 3))
+
+    def __len__(self):
+        return len(self.records)
+
+    def __iter__(self):
+        return iter(self.records)
+
+    def add(self, element, obj):
+        record = ElementRecord(element, obj, self.type_codes[element.is_a()])
+        self.records.append(record)
+        self.by_id[element.id()] = record
+        return record
+
+    def get(self, element_id):
+        return self.by_id.get(element_id)
+
+    def remove_types(self, ifc_types):
+        """Drop the records of the given IFC classes"""
+        codes = {self.type_codes[ifc_type] for ifc_type in ifc_types if ifc_type in self.type_codes}
+        self.records = [record for record in self.records if record.type_code not in codes]
+        self.by_id = {record.element.id(): record for record in self.records}
+
+    def get_type_name(self, record):
+        return self.types[record.type_code][3:]
+
+    def get_type_counts(self, records=None):
+        """Get the number of records of each type code"""
+        counts = [0] * len(self.types)
+        for record in self.records if records is None else records:
+            counts[record.type_code] += 1
+        return counts
+
+    def load_parents(self, parents):
+        """Link each record to the record of its nearest decomposing ancestor that is numbered as well"""
+        ancestors = {} # Nearest numbered ancestor of each element on the way up, resolved once
+        for record in self.records:
+            path = []
+            element = parents.get(record.element.id())
+            while element is not None and element.id() not in ancestors and element.id() not in self.by_id and len(path) < len(parents):
+                path.append(element.id())
+                element = parents.get(element.id())
+            parent = None if element is None else self.by_id.get(element.id(), ancestors.get(element.id()))
+            for element_id in path:
+                ancestors[element_id] = parent
+            record.parent = parent
+
+    def get_groups(self):
+        """Group the records by their parent record, keeping the sort order within each group.
+        Yields the parent and group breadth first, so each parent is numbered before its parts."""
+        groups = {}
+        for record in self.records:
+            groups.setdefault(record.parent, []).append(record)
+        parents = [None]
+        for parent in parents:
+            if (group := groups.get(parent)) is not None:
+                yield parent, group
+                parents.extend(group)
+
+    def load_geometry(self, scene_data, props):
+        """Store the reference location and dimensions of the records in the arrays, in the current order of the records"""
+        bboxes = np.array([tuple(corner) for record in self.records for corner in scene_data.get_bbox(record.obj)], dtype=float)
+        bboxes = bboxes.reshape(-1, 2, 3)
+        for row, record in enumerate(self.records):
+            record.row = row
+        self.locations = ObjectGeometry.get_bbox_locations(bboxes, props)
+        self.dimensions = bboxes[:, 1] - bboxes[:, 0]
+
+    def get_rows(self):
+        """Get the rows of the records in their current order"""
+        return np.fromiter((record.row for record in self.records), dtype=np.intp, count=len(self.records))
+
+    def sort(self, props, path=None):
+        """Sort the records by location and then by dimensions, clustered within the precision of the settings.
+        If path points are given, sort by the distance along the path first, within the X precision."""
+        rows = self.get_rows()
+        order = ObjectGeometry.get_sort_order(self.locations[rows], props, tie_vectors=self.dimensions[rows])
+        self.records = [self.records[i] for i in order]
+        if path is not None:
+            distances, _ = PathOrder.project(self.locations[self.get_rows()], path)
+            steps = np.floor(distances * 1000 / props.precision[0]).astype(np.int64) * (-1 if props.path_reverse else 1)
+            self.records = [self.records[i] for i in np.argsort(steps, kind="stable")]
+        elif props.order_mode == "SERPENTINE":
+            self.sort_serpentine(props)
+        elif props.order_mode == "NEAREST":
+            locations = self.locations[self.get_rows()].tolist()
+            self.records = [self.records[i] for i in ObjectGeometry.get_nearest_neighbour_order(locations)]
+
+    def sort_serpentine(self, props):
+        """Sort the records in levels and rows along the first two axes of the axis order, clustered within the precision,
+        numbering along the last axis with every other row of a level reversed"""
+        locations = self.locations[self.get_rows()]
+        direction = (int(props.x_direction), int(props.y_direction), int(props.z_direction))
+        level_axis, row_axis, position_axis = ("XYZ".index(axis) for axis in props.axis_order)
+        levels = ObjectGeometry.get_clusters(locations[:, level_axis] * direction[level_axis], props.precision[level_axis])
+        rows = ObjectGeometry.get_clusters(locations[:, row_axis] * direction[row_axis], props.precision[row_axis])
+        level_rows = levels * (rows.max() + 1) + rows
+        unique_rows, row_index = np.unique(level_rows, return_inverse=True)
+        unique_levels = unique_rows // (rows.max() + 1)
+        # Rank of each row within its level, from the index of the first row of the level
+        row_ranks = np.arange(len(unique_rows)) - np.searchsorted(unique_levels, unique_levels)
+        reverse = np.where(row_ranks[row_index] % 2, -1, 1)
+        positions = locations[:, position_axis] * direction[position_axis] * reverse
+        self.records = [self.records[i] for i in np.lexsort((positions, rows, levels))]
+
+    def load_storeys(self, storeys, props, scene_data=None):
+        """Store the storey number of each record, resolving each containing structure once.
+        If storeys are inferred, records without a storey get the storey of the structure of their decomposition parents,
+        or else the storey at the bottom of their bounding box. Returns the number of storeys inferred in both ways."""
+        structure_numbers = {}
+        for record in self.records:
+            if structure := getattr(record.element, "ContainedInStructure", None):
+                storey = getattr(structure[0], "RelatingStructure", None)
+                key = storey.id() if storey is not None else None
+                if key not in structure_numbers:
+                    structure_numbers[key] = Storeys.get_structure_number(storey, storeys, props)
+                record.storey = structure_numbers[key]
+        if props.storey_mode != "INFERRED" or not storeys or not (missing := [record for record in self.records if record.storey is None]):
+            return 0, 0
+
+        parents = Decomposition.get_parents(get_ifc_file())
+        storey_set = set(storeys)
+        unresolved = []
+        for record in missing:
+            if (storey := Storeys.get_inferred_storey(record.element, storey_set, parents)) is not None:
+                record.storey = Storeys.get_structure_number(storey, storeys, props)
+            else:
+                unresolved.append(record)
+        if unresolved:
+            if scene_data is None:
+                scene_data = SceneData()
+            elevations, elevation_storeys = Storeys.get_elevations(storeys, scene_data)
+            # Bucket the bottom of all records at once against the sorted storey elevations
+            heights = np.array([scene_data.get_bbox(record.obj)[0][2] for record in unresolved]) + props.precision[2] / 1000
+            indices = np.maximum(np.searchsorted(elevations, heights, side="right") - 1, 0)
+            storey_numbers = [Storeys.get_structure_number(storey, storeys, props) for storey in elevation_storeys]
+            for record, index in zip(unresolved, indices.tolist()):
+                record.storey = storey_numbers[index]
+        return len(missing) - len(unresolved), len(unresolved)
 
-    def assign_numbers(self, props, numbers_cache):
-        """Assign numbers to selected objects based on their IFC type and location."""
-        number_count = 0
-        remove_count = 0
+    @staticmethod
+    def get_scope_key(element, storey, props):
+        """Get the key of the group in which the numbers of the element with the storey number restart"""
+        if props.scope == "STOREY":
+            return storey
+        if props.scope == "CONTAINER":
+            structure = getattr(element, "ContainedInStructure", None)
+            return structure[0].RelatingStructure.id() if structure else None
+        pset_name, _, property_name = props.scope_property.partition(".")
+        return get_pset(element, pset_name, property_name)
+
+    def split_scopes(self, records, props):
+        """Split the sorted records into the groups in which the numbers restart, in one pass keeping the sort order"""
+        if props.scope == "NONE":
+            return [records]
+        scopes = {}
+        for record in records:
+            key = ElementRecords.get_scope_key(record.element, record.storey, props)
+            scopes.setdefault(key if isinstance(key, (str, int, float, bool, type(None))) else str(key), []).append(record)
+        return list(scopes.values())
+
+class CountingCache(dict):
+    """Numbers cache that counts lookup hits and misses, used when instrumentation is enabled"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.hits = 0
+        self.misses = 0
+
+    def __contains__(self, key):
+        if super().__contains__(key):
+            self.hits += 1
+            return True
+        self.misses += 1
+        return False
+
+class Instrumentation:
+    """Optional timings and counters of the numbering stages, without overhead when disabled"""
+
+    enabled = False
+    mode = "OFF"
+    operation = ""
+    stages = {}
+    counters = {}
+    profile = None
+    caches = []
+    null_stage = contextlib.nullcontext()
 
-        if props.remove_toggle:
-            for obj in bpy.context.scene.objects:
-                if (props.selected_toggle and obj not in bpy.context.selected_objects) or \
-                (props.visible_toggle and not obj.visible_get()):
-                    element = tool.Ifc.get_entity(obj)
-                    if element is not None and element.is_a(LoadSelection.get_parent_type(props)):
-                        count_diff = SaveNumber.remove_number(element, props, numbers_cache)
-                        remove_count += count_diff
+    @staticmethod
+    def start(props, operation):
+        """Start recording a new run of the given operation, based on the instrumentation setting"""
+        Instrumentation.mode = getattr(props, "instrumentation", "OFF")
+        Instrumentation.enabled = Instrumentation.mode != "OFF"
+        if not Instrumentation.enabled:
+            return
+        Instrumentation.operation = operation
+        Instrumentation.stages = {}
+        Instrumentation.counters = {}
+        Instrumentation.caches = []
+        Instrumentation.profile = None
+        if Instrumentation.mode == "PROFILE":
+            Instrumentation.profile = cProfile.Profile()
+            Instrumentation.profile.enable()
 
-        objects = LoadSelection.load_selected_objects(props)
+    @staticmethod
+    def stop():
+        """Stop recording and collect the cache counters"""
+        if not Instrumentation.enabled:
+            return
+        if Instrumentation.profile is not None:
+            Instrumentation.profile.disable()
+        for cache in Instrumentation.caches:
+            Instrumentation.count("cache_hits", cache.hits)
+            Instrumentation.count("cache_misses", cache.misses)
+        Instrumentation.caches = []
+        Instrumentation.enabled = False
 
-        if not objects:
-            self.report({'WARNING'}, f"No objects selected or available for numbering, removed {remove_count} existing numbers.")
-            return {'CANCELLED'}
-        
-        selected_types = LoadSelection.get_selected_types(props)
-        possible_types = [tupl[0] for tupl in LoadSelection.possible_types]
-        
-        selected_elements = []
-        elements_locations = {}
-        elements_geometries = {}
-        for obj in objects: 
-            element = tool.Ifc.get_entity(obj)
-            if element is None:
-                continue
-            if element.is_a() in selected_types:
-                selected_elements.append(element)
-                elements_locations[element] = ObjectGeometry.get_object_location(obj, props)
-                elements_geometries[element] = ObjectGeometry.get_object_dimensions(obj)
-            elif props.remove_toggle and element.is_a() in possible_types:
-                remove_count += SaveNumber.remove_number(element, props, numbers_cache)
-
-        if not selected_elements:
-            self.report({'WARNING'}, f"No elements selected or available for numbering, removed {remove_count} existing numbers.")
+    @staticmethod
+    def stage(name):
+        """Return a context manager timing the given stage, or a shared no-op context when disabled"""
+        if not Instrumentation.enabled:
+            return Instrumentation.null_stage
+        return Instrumentation.timed_stage(name)
+
+    @staticmethod
+    @contextlib.contextmanager
+    def timed_stage(name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            stage = Instrumentation.stages.setdefault(name, {"seconds": 0.0, "calls": 0})
+            stage["seconds"] += time.perf_counter() - start
+            stage["calls"] += 1
+
+    @staticmethod
+    def count(name, value=1):
+        """Add value to the counter with the given name"""
+        if Instrumentation.enabled:
+            Instrumentation.counters[name] = Instrumentation.counters.get(name, 0) + value
+
+    @staticmethod
+    def cache(numbers_cache):
+        """Return a numbers cache counting its hits when enabled, or the cache itself otherwise"""
+        if not Instrumentation.enabled:
+            return numbers_cache
+        numbers_cache = CountingCache(numbers_cache)
+        Instrumentation.caches.append(numbers_cache)
+        return numbers_cache
+
+    @staticmethod
+    def has_data():
+        return bool(Instrumentation.stages or Instrumentation.counters)
+
+    @staticmethod
+    def to_dict():
+        return {
+            "operation": Instrumentation.operation,
+            "mode": Instrumentation.mode,
+            "stages": Instrumentation.stages,
+            "counters": Instrumentation.counters
+        }
+
+    @staticmethod
+    def summary():
+        """Return a one line summary of the recorded stages and counters"""
+        stages = ", ".join(f"{name} {stage['seconds']:.3f}s" for name, stage in Instrumentation.stages.items())
+        counters = dict(Instrumentation.counters)
+        lookups = counters.get("cache_hits", 0) + counters.get("cache_misses", 0)
+        if lookups:
+            counters["cache_hit_rate"] = f"{100 * counters.get('cache_hits', 0) / lookups:.1f}%"
+        counters = ", ".join(f"{name} {value}" for name, value in counters.items())
+        return f"{Instrumentation.operation}: {stages} | {counters}"
+
+    @staticmethod
+    def report(operator):
+        """Show the summary of the last run in the info area"""
+        if Instrumentation.mode != "OFF" and Instrumentation.has_data():
+            operator.report({'INFO'}, Instrumentation.summary())
+
+    @staticmethod
+    def export(operator, filepath):
+        """Export the last run to a JSON file, or the cProfile statistics to a .prof or .pstats file"""
+        if not Instrumentation.has_data():
+            operator.report({'WARNING'}, "No instrumentation data recorded, enable instrumentation and run the numbering first.")
             return {'CANCELLED'}
+        if filepath.endswith((".prof", ".pstats")):
+            if Instrumentation.profile is None:
+                operator.report({'WARNING'}, "No cProfile statistics recorded, set instrumentation to Profile.")
+                return {'CANCELLED'}
+            Instrumentation.profile.dump_stats(filepath)
+        else:
+            with open(filepath, 'w') as f:
+                json.dump(Instrumentation.to_dict(), f, indent=2)
+        operator.report({'INFO'}, f"Exported instrumentation data to {filepath}")
+        return {'FINISHED'}
+
+class UndoOperator:
+    @staticmethod
+    def run_transaction(operator, props, operation, method):
+        """Run a method that changes numbers in a single undo step, instrumented as the operation. The method returns
+        the transaction data with the old and new numbers, or None if it changed nothing, in which case no undo step is added.
+        Returns the transaction data."""
+        IfcStore.begin_transaction(operator)
+        Instrumentation.start(props, operation)
+        data = method()
+        if data is not None:
+            operator.transaction_data = data
+            IfcStore.add_transaction_operation(operator)
+            NumberPatch.record(data)
+            NumberHistory.record(data)
+        IfcStore.end_transaction(operator)
+        Instrumentation.stop()
+        Instrumentation.report(operator)
+        return data
 
-        selected_elements.sort(key=ft.cmp_to_key(lambda a, b: ObjectGeometry.cmp_within_precision(elements_geometries[a], elements_geometries[b], props, use_dir=False)))
-        selected_elements.sort(key=ft.cmp_to_key(lambda a, b: ObjectGeometry.cmp_within_precision(elements_locations[a], elements_locations[b], props)))
+    @staticmethod
+    def get_transaction_data(result, settings):
+        """Get the transaction data of a partial write, which only holds the elements with changed numbers"""
+        if result is None:
+            return None
+        return {"old_value": result["old_value"], "new_value": result["new_value"], "settings": settings, "partial": True}
 
-        storeys = Storeys.get_storeys(props)
+    @staticmethod
+    def execute_with_undo(operator, context, method):
+        """Execute a method with undo support."""
+        props = context.scene.ifc_numbering_settings
+        result = {'CANCELLED'}
 
-        elements_by_type = [[element for element in selected_elements if element.is_a() == ifc_type] for ifc_type in selected_types]
+        def run():
+            nonlocal result
+            old_numbers = UndoOperator.read_numbers(operator, props)
+            if old_numbers is None:
+                return None
+            new_numbers = Instrumentation.cache(old_numbers.copy())
+            result = method(props, new_numbers)
+            return {"old_value": old_numbers, "new_value": dict(new_numbers) if Instrumentation.enabled else new_numbers,
+                    "settings": Settings.get_dict(props)}
 
-        failed_types = set()
-        for (element_number, element) in enumerate(selected_elements):
+        UndoOperator.run_transaction(operator, props, method.__name__, run)
+        bpy.context.view_layer.objects.active = bpy.context.active_object
+        return result
+    
+    @staticmethod
+    def read_numbers(operator, props):
+        """Read the current numbers of all elements of the parent type, keyed by their ID"""
+        ifc_file = get_ifc_file()
+        parent_type = LoadSelection.get_parent_type(props)
+        try: 
+            elements = ifc_file.by_type(parent_type)
+        except RuntimeError:
+            operator.report({'ERROR'}, f"Parent type {parent_type} not found in {ifc_file.schema} schema.")
+            return None
+        
+        if props.pset_name == "Common":
+            SaveNumber.get_pset_common_names(elements)
 
-            type_index = selected_types.index(element.is_a())
-            type_elements = elements_by_type[type_index]
-            type_number = type_elements.index(element)
-            type_name = selected_types[type_index][3:]
+        storage = SaveNumber.get_storage_props(props)
+        with Instrumentation.stage("read_numbers"):
+            numbers = {get_id(element): SaveNumber.get_number(element, storage) for element in elements}
+        Instrumentation.count("parent_type_elements", len(elements))
+        return numbers
 
-            storey_number = Storeys.get_storey_number(element, storeys, props)
-            if storey_number is None and "{S}" in props.format:
-                self.report({'WARNING'}, f"Element {getattr(element, 'Name', '')} of type {element.is_a()} with ID {get_id(element)} is not contained in any storey.")
+    @staticmethod
+    def get_props(data):
+        """Get the settings used for the transaction, or the current settings for older transactions"""
+        ifc_file = get_ifc_file()
+        props = bpy.context.scene.ifc_numbering_settings
+        if "settings" not in data:
+            return props
+        props = Settings.to_props(data["settings"], props)
+        if props.save_type == "Pset" and props.pset_name == "Common":
+            SaveNumber.get_pset_common_names(UndoOperator.get_elements(data, props) if data.get("partial") \
+                                             else ifc_file.by_type(LoadSelection.get_parent_type(props)))
+        return props
 
-            number = NumberFormatting.format_number(props, (element_number, type_number, storey_number), (len(objects), len(type_elements), len(storeys)), type_name)
-            count = SaveNumber.save_number(element, number, props, numbers_cache)
-            if count is None:
-                self.report({'WARNING'}, f"Failed to save number for element {getattr(element, 'Name', '')} of type {element.is_a()} with ID {get_id(element)}.")
-                failed_types.add(element.is_a())
+    @staticmethod
+    def get_elements(data, props):
+        """Get the elements of the transaction, only those with changed numbers for partial transactions"""
+        ifc_file = get_ifc_file()
+        if data.get("partial"):
+            return [element for element_id in data["old_value"] if (element := get_element(element_id)) is not None]
+        return ifc_file.by_type(LoadSelection.get_parent_type(props))
+
+    @staticmethod
+    def rollback(operator, data, history=True):
+        """Support undo of number assignment"""
+        if history:
+            NumberHistory.record(data, reverse=True)
+        if "profiles" in data:
+            return sum(UndoOperator.rollback(operator, profile_data, history=False) for profile_data in reversed(data["profiles"]))
+        NumberPatch.record(data, reverse=True)
+        rollback_count = 0
+        skip_count = 0
+        props = UndoOperator.get_props(data)
+        Instrumentation.start(props, "rollback")
+        numbers_cache = Instrumentation.cache(data["new_value"].copy())
+        storage = SaveNumber.get_storage_props(props)
+        with Instrumentation.stage("rollback"):
+            for element in UndoOperator.get_elements(data, props):
+                old_number = data["old_value"].get(get_id(element), None)
+                count = SaveNumber.save_number(element, old_number, storage, numbers_cache)
+                skip_count += count == 0
+                rollback_count += int(count or 0)
+        NumberRegistry.update(props, data["new_value"], data["old_value"])
+        Instrumentation.count("written", rollback_count)
+        Instrumentation.count("writes_skipped", skip_count)
+        Instrumentation.stop()
+        message = f"Rollback {rollback_count} numbers."
+        if Instrumentation.mode != "OFF":
+            message += " " + Instrumentation.summary()
+        UndoOperator.show_message(operator, message)
+        return rollback_count
+    
+    @staticmethod
+    def commit(operator, data, history=True):
+        """Support redo of number assignment"""
+        if history:
+            NumberHistory.record(data)
+        if "profiles" in data:
+            return sum(UndoOperator.commit(operator, profile_data, history=False) for profile_data in data["profiles"])
+        NumberPatch.record(data)
+        commit_count = 0
+        skip_count = 0
+        props = UndoOperator.get_props(data)
+        Instrumentation.start(props, "commit")
+        numbers_cache = Instrumentation.cache(data["old_value"].copy())
+        storage = SaveNumber.get_storage_props(props)
+        with Instrumentation.stage("commit"):
+            if data.get("partial"):
+                elements = UndoOperator.get_elements(data, props)
             else:
-                number_count += count
+                elements = (element for obj in bpy.context.scene.objects if (element := tool.Ifc.get_entity(obj)) is not None
+                            and element.is_a(LoadSelection.get_parent_type(props)))
+            for element in elements:
+                new_number = data["new_value"].get(get_id(element), None)
+                count = SaveNumber.save_number(element, new_number, storage, numbers_cache)
+                skip_count += count == 0
+                commit_count += int(count or 0)
+        NumberRegistry.update(props, data["old_value"], data["new_value"])
+        Instrumentation.count("written", commit_count)
+        Instrumentation.count("writes_skipped", skip_count)
+        Instrumentation.stop()
+        message = f"Commit {commit_count} numbers."
+        if Instrumentation.mode != "OFF":
+            message += " " + Instrumentation.summary()
+        UndoOperator.show_message(operator, message)
+        return commit_count
+
+    @staticmethod
+    def show_message(operator, message):
+        """Show the message in the info area, as reports of operators are not shown on undo and redo.
+        A MessageLog collects the message instead, e.g. for NumberingResult.rollback."""
+        if isinstance(operator, MessageLog):
+            operator.report({'INFO'}, message)
+        else:
+            bpy.ops.ifc.show_message('EXEC_DEFAULT', message=message)
+    
+class IFC_AssignNumbers(bpy.types.Operator):
+    bl_idname = "ifc.assign_numbers"
+    bl_label = "Assign numbers"
+    bl_description = "Assign numbers to selected objects"
+    bl_options = {"REGISTER", "UNDO"}
+
+    @classmethod
+    def poll(cls, context):
+        return NumberingContext.poll(context)
+
+    def assign_numbers(self, props, numbers_cache, scene_data=None):
+        """Assign numbers to selected objects based on their IFC type and location.
+        The scene data can be shared between runs with different settings."""
+        number_count = 0
+        remove_count = 0
+        skip_count = 0
+        if scene_data is None:
+            scene_data = SceneData()
+        storage = SaveNumber.get_storage_props(props)
+        registry_scope = NumberRegistry.get_scope(props) if props.registry_toggle else None
+
+        if props.remove_toggle:
+            with Instrumentation.stage("remove_unselected"):
+                for obj in scene_data.get_reachable_objects(props):
+                    if scene_data.is_unselected(obj, props):
+                        element = scene_data.get_entity(obj)
+                        if element is not None and element.is_a(LoadSelection.get_parent_type(props)):
+                            if props.registry_toggle:
+                                NumberRegistry.release(registry_scope, SaveNumber.get_number(element, storage, numbers_cache))
+                            count_diff = SaveNumber.remove_number(element, storage, numbers_cache)
+                            remove_count += count_diff
+
+        with Instrumentation.stage("load_objects"):
+            objects = scene_data.load_selected_objects(props)
+        Instrumentation.count("objects", len(objects))
+
+        if not objects and ElementFilter.error and props.filter_expression.strip():
+            self.report({'ERROR'}, ElementFilter.error)
+            return {'CANCELLED'}
+        if not objects:
+            self.report({'WARNING'}, f"No objects selected or available for numbering, removed {remove_count} existing numbers.")
+            return {'CANCELLED'}
+        
+        possible_types = scene_data.get_possible_types(props)
+        selected_types = LoadSelection.get_selected_types(props, possible_types)
+        
+        records = ElementRecords(selected_types)
+        unselected_elements = []
+        with Instrumentation.stage("get_entity"):
+            for obj in objects: 
+                element = scene_data.get_entity(obj)
+                if element is None:
+                    continue
+                if element.is_a() in records.type_codes:
+                    records.add(element, obj)
+                elif props.remove_toggle and element.is_a() in possible_types:
+                    unselected_elements.append(element)
+        Instrumentation.count("elements", len(records))
+
+        if unselected_elements:
+            with Instrumentation.stage("remove_unselected_types"):
+                for element in unselected_elements:
+                    if props.registry_toggle:
+                        NumberRegistry.release(registry_scope, SaveNumber.get_number(element, storage, numbers_cache))
+                    remove_count += SaveNumber.remove_number(element, storage, numbers_cache)
+
+        if storage.save_type == "Attribute" and records:
+            # Reject types without the attribute up front, instead of failing for each element
+            if missing_types := AttributeSlots.get_missing_types((record.element for record in records), storage.attribute_name):
+                self.report({'WARNING'}, f"Failed to renumber the following types without attribute {storage.attribute_name}: {missing_types}")
+                records.remove_types(missing_types)
+
+        if not records:
+            self.report({'WARNING'}, f"No elements selected or available for numbering, removed {remove_count} existing numbers.")
+            return {'CANCELLED'}
+
+        with Instrumentation.stage("geometry"):
+            records.load_geometry(scene_data, props)
+
+        path = None
+        if props.order_mode == "PATH":
+            with Instrumentation.stage("path"):
+                path = PathOrder.get_path_points(props)
+            if path is None or len(path) < 2:
+                self.report({'ERROR'}, f"Path {props.path} not found or without segments to number along.")
+                return {'CANCELLED'}
+
+        with Instrumentation.stage("sort"):
+            records.sort(props, path)
+
+        with Instrumentation.stage("storeys"):
+            storeys = Storeys.get_storeys(props, scene_data)
+            parent_storeys, elevation_storeys = records.load_storeys(storeys, props, scene_data)
+        if parent_storeys or elevation_storeys:
+            self.report({'INFO'}, f"Inferred the storey of {parent_storeys} elements from their parent structure " \
+                        f"and of {elevation_storeys} elements from their elevation.")
+
+        if props.hierarchy_toggle:
+            with Instrumentation.stage("hierarchy"):
+                records.load_parents(Decomposition.get_parents(get_ifc_file()))
+
+        if props.registry_toggle:
+            with Instrumentation.stage("registry"):
+                # Free the current numbers of the elements first, so renumbering them does not collide with themselves
+                for record in records:
+                    NumberRegistry.release(registry_scope, SaveNumber.get_number(record.element, storage, numbers_cache))
+                owner = getattr(props, "settings_name", "").strip() or None
+
+        without_storey = []
+        with Instrumentation.stage("format"):
+            for parent, group in records.get_groups():
+                number_format = props.format if parent is None else props.part_format
+                # Parts count within their parent, other elements within their scope, padded to the size of the group
+                for scope in records.split_scopes(group, props) if parent is None else [group]:
+                    type_counts = records.get_type_counts(scope)
+                    type_numbers = [0] * len(type_counts)
+                    element_count = len(objects) if parent is None and props.scope == "NONE" else len(scope)
+                    for (element_number, record) in enumerate(scope):
+                        type_number = type_numbers[record.type_code]
+                        type_numbers[record.type_code] += 1
+                        if record.storey is None and parent is not None:
+                            record.storey = parent.storey
+
+                        if record.storey is None and "{S}" in number_format:
+                            without_storey.append(record.element)
+
+                        record.number = NumberFormatting.format_number(props, (element_number, type_number, record.storey),
+                            (element_count, type_counts[record.type_code], len(storeys)),
+                            records.get_type_name(record), None if parent is None else parent.number)
+                        if props.registry_toggle and not (props.allocation_toggle and parent is None):
+                            # Claim each number before its parts are formatted, so they get the number of the parent as registered
+                            record.number = NumberRegistry.claim(registry_scope, record.number, owner)
+                if props.allocation_toggle and parent is None:
+                    # Allocate the numbers of the whole group at once, so the service is asked only once
+                    if not NumberAllocation.allocate(self, props, group, storage, numbers_cache):
+                        return {'CANCELLED'}
+                    for record in group if props.registry_toggle else ():
+                        record.number = NumberRegistry.claim(registry_scope, record.number, owner)
+
+        if without_storey:
+            self.report({'WARNING'}, f"{len(without_storey)} elements are not contained in any storey and are numbered with x for {{S}}, " \
+                        f"e.g. {', '.join(f'{element.is_a()} {get_id(element)}' for element in without_storey[:5])}.")
+
+        failed_types = set()
+        with Instrumentation.stage("save"):
+            for record in records:
+                element = record.element
+                count = SaveNumber.save_number(element, record.number, storage, numbers_cache)
+                if count is None:
+                    self.report({'WARNING'}, f"Failed to save number for element {getattr(element, 'Name', '')} of type {element.is_a()} with ID {get_id(element)}.")
+                    failed_types.add(element.is_a())
+                else:
+                    number_count += count
+                    skip_count += count == 0
+        if props.registry_toggle:
+            NumberRegistry.save()
+        if props.allocation_toggle:
+            NumberAllocation.save()
+        Instrumentation.count("numbered", number_count)
+        Instrumentation.count("writes_skipped", skip_count)
+        Instrumentation.count("removed", remove_count)
         
         if props.remove_toggle: 
             self.report({'INFO'}, f"Renumbered {number_count} objects, removed number from {remove_count} objects.")
@@ -949,20 +2625,24 @@ class IFC_AssignNumbers(bpy.types.Operator):
 
         if props.check_duplicates_toggle:
             #Check for duplicate numbers
-            numbers = []
-            for obj in bpy.context.scene.objects:
-                element = tool.Ifc.get_entity(obj)
-                if element is None or not element.is_a(LoadSelection.get_parent_type(props)):
-                    continue
-                number = SaveNumber.get_number(element, props, numbers_cache)
-                if number in numbers:
-                    self.report({'WARNING'}, f"The model contains duplicate numbers")
-                    break
-                if number is not None:
-                    numbers.append(number)
+            with Instrumentation.stage("check_duplicates"):
+                numbers = set()
+                for obj in scene_data.objects:
+                    element = scene_data.get_entity(obj)
+                    if element is None or not element.is_a(LoadSelection.get_parent_type(props)):
+                        continue
+                    number = SaveNumber.get_number(element, storage, numbers_cache)
+                    if number in numbers:
+                        self.report({'WARNING'}, f"The model contains duplicate numbers")
+                        break
+                    if number is not None:
+                        numbers.add(number)
         return {'FINISHED'}
 
     def execute(self, context):
+        props = context.scene.ifc_numbering_settings
+        if props.grid_toggle and LoadSelection.get_parent_type(props) == "IfcGridAxis":
+            return GridNumbering.execute_with_undo(self, props)
         return UndoOperator.execute_with_undo(self, context, self.assign_numbers)
 
     def rollback(self, data):
@@ -977,23 +2657,38 @@ class IFC_RemoveNumbers(bpy.types.Operator):
     bl_description = "Remove numbers from selected objects, from the selected attribute or Pset"
     bl_options = {"REGISTER", "UNDO"}
 
+    @classmethod
+    def poll(cls, context):
+        return NumberingContext.poll(context)
+
     def remove_numbers(self, props, numbers_cache):
         """Remove numbers from selected objects"""
         remove_count = 0
 
-        objects = bpy.context.selected_objects if props.selected_toggle else bpy.context.scene.objects
-        if props.visible_toggle:
-            objects = [obj for obj in objects if obj.visible_get()]
+        with Instrumentation.stage("load_objects"):
+            objects = LoadSelection.load_selected_objects(props)
+        Instrumentation.count("objects", len(objects))
 
         if not objects:
             self.report({'WARNING'}, f"No objects selected or available for removal.")
             return {'CANCELLED'}
-            
-        for obj in objects:
-            element = tool.Ifc.get_entity(obj)
-            if element is not None and element.is_a(LoadSelection.get_parent_type(props)):
-                remove_count += SaveNumber.remove_number(element, props, numbers_cache)
+
+        with Instrumentation.stage("get_entity"):
+            elements = [element for obj in objects if (element := tool.Ifc.get_entity(obj)) is not None and element.is_a(LoadSelection.get_parent_type(props))]
+        Instrumentation.count("elements", len(elements))
+
+        storage = SaveNumber.get_storage_props(props)
+        registry_scope = NumberRegistry.get_scope(props) if props.registry_toggle else None
+        with Instrumentation.stage("save"):
+            for element in elements:
+                if props.registry_toggle:
+                    NumberRegistry.release(registry_scope, SaveNumber.get_number(element, storage, numbers_cache))
+                remove_count += SaveNumber.remove_number(element, storage, numbers_cache)
                 numbers_cache[get_id(element)] = None
+        if props.registry_toggle:
+            NumberRegistry.save()
+        Instrumentation.count("removed", remove_count)
+        Instrumentation.count("writes_skipped", len(elements) - remove_count)
 
         if remove_count == 0:
             self.report({'WARNING'}, f"No elements selected or available for removal.")
@@ -1011,6 +2706,1116 @@ class IFC_RemoveNumbers(bpy.types.Operator):
     def commit(self, data):
         UndoOperator.commit(self, data)
 
+class MessageLog:
+    """Collects reports when numbering without an operator, e.g. from a script"""
+
+    def __init__(self):
+        self.messages = []
+
+    def report(self, type, message):
+        self.messages.append((next(iter(type)), message))
+
+class NumberingResult:
+    """Result of number_elements, with the changed numbers keyed by element ID and the reported messages.
+    Can be passed to Bonsai as the operation of a transaction, as it has the rollback and commit methods of an operator."""
+
+    def __init__(self, settings, messages):
+        self.settings = settings
+        self.messages = messages
+        self.status = None
+        self.old_numbers = {}
+        self.new_numbers = {}
+
+    @property
+    def transaction_data(self):
+        return {"old_value": self.old_numbers, "new_value": self.new_numbers, "settings": self.settings, "partial": True}
+
+    @property
+    def numbered(self):
+        """Number of elements that got a new number"""
+        return sum(1 for number in self.new_numbers.values() if number is not None)
+
+    @property
+    def removed(self):
+        """Number of elements of which the number was removed"""
+        return sum(1 for number in self.new_numbers.values() if number is None)
+
+    @property
+    def warnings(self):
+        return [message for level, message in self.messages if level in ("WARNING", "ERROR")]
+
+    def rollback(self, data=None):
+        """Restore the numbers from before numbering, returning the number of restored numbers"""
+        log = MessageLog()
+        count = UndoOperator.rollback(log, data or self.transaction_data)
+        self.messages += log.messages
+        return count
+
+    def commit(self, data=None):
+        """Write the numbers of the numbering again after a rollback"""
+        log = MessageLog()
+        count = UndoOperator.commit(log, data or self.transaction_data)
+        self.messages += log.messages
+        return count
+
+def number_elements(ifc_file, elements, settings=None, undo=False):
+    """Number the given elements of the IFC file loaded in Bonsai with a settings dictionary, as returned by Settings.get_dict
+    or exported from the panel. Missing settings take their default value and all IFC types are numbered unless
+    selected_types is given. Other elements are not read or changed, except for storeys to number by.
+
+    The elements are sorted and numbered as by Assign numbers, without the operator, scene properties or selection.
+    Elements without a Blender object, e.g. of a file loaded without its geometry, are located by the origin of their
+    IFC placement instead of their bounding box. The file must be the one loaded in Bonsai, as the numbers are stored
+    through it, else a ValueError is raised. With undo, the numbering is added to the Bonsai undo history as one step.
+
+    Example:
+        result = number_elements(tool.Ifc.get(), ifc_file.by_type("IfcColumn"), {"format": "C{E}", "storey_numbering": "number"})
+        print(result.numbered, result.warnings)
+        result.rollback()
+    """
+    if ifc_file is not IfcStore.get_file():
+        raise ValueError("number_elements needs the IFC file that is loaded in Bonsai")
+    settings = {**Settings.get_defaults(), "selected_types": ["All"], **(settings or {})}
+    props = Settings.to_props(settings)
+    log = MessageLog()
+    elements = list(elements)
+    objects = PlacementObject.get_objects(elements)
+
+    storage = SaveNumber.get_storage_props(props)
+    if storage.save_type == "Pset" and storage.pset_name == "Common":
+        SaveNumber.get_pset_common_names(elements)
+    old_numbers = {get_id(element): SaveNumber.get_number(element, storage) for element in elements}
+    numbers_cache = old_numbers.copy()
+    result = NumberingResult(settings, log.messages)
+    if undo:
+        IfcStore.begin_transaction(result)
+    Instrumentation.start(props, "number_elements")
+    result.status = IFC_AssignNumbers.assign_numbers(log, props, numbers_cache, SceneData(objects))
+    Instrumentation.stop()
+    # Only keep the changed numbers, as for the other partial transactions
+    for element_id, number in numbers_cache.items():
+        if old_numbers.get(element_id) != number:
+            result.old_numbers[element_id] = old_numbers.get(element_id)
+            result.new_numbers[element_id] = number
+    NumberPatch.record(result.transaction_data)
+    NumberHistory.record(result.transaction_data)
+    if undo:
+        IfcStore.add_transaction_operation(result)
+        IfcStore.end_transaction(result)
+    return result
+
+def validate_numbers(ifc_file, settings=None, filepath=None):
+    """Validate the numbers in the IFC file loaded in Bonsai with a settings dictionary, as for number_elements,
+    without writing to the file. Returns the summary of Validation.validate with the reported messages.
+
+    Example:
+        summary = validate_numbers(tool.Ifc.get(), {"format": "C{E}", "validation_pattern": r"C\\d{3}"}, "violations.csv")
+        print(summary["format"], summary["duplicate"], summary["messages"])
+    """
+    if ifc_file is not IfcStore.get_file():
+        raise ValueError("validate_numbers needs the IFC file that is loaded in Bonsai")
+    settings = {**Settings.get_defaults(), "selected_types": ["All"], **(settings or {})}
+    props = Settings.to_props(settings)
+    log = MessageLog()
+    summary = Validation.validate(log, props, filepath, SceneData([])) or {}
+    summary["messages"] = log.messages
+    return summary
+
+class BatchNumbering:
+    """Assign numbers with several saved settings in turn, sharing the scene data between the runs"""
+
+    @staticmethod
+    def assign_numbers(operator, props, settings_names, scene_data=None):
+        """Assign numbers with each of the saved settings, returning the old and new numbers of each run.
+        The operator only needs a report method, so a MessageLog can be used from scripts."""
+        ifc_file = get_ifc_file()
+        if scene_data is None:
+            scene_data = SceneData()
+        profiles = []
+        numbers = {} # Numbers after the last run per storage and parent type, to avoid reading them again
+        for settings_name in settings_names:
+            settings = Settings.get_saved_settings(operator, settings_name)
+            if settings is None:
+                continue
+            profile_props = Settings.to_props(settings, props)
+            storage_key = (SaveNumber.get_storage_key(profile_props), LoadSelection.get_parent_type(profile_props))
+            if storage_key in numbers:
+                old_numbers = numbers[storage_key]
+                if profile_props.pset_name == "Common":
+                    SaveNumber.get_pset_common_names(ifc_file.by_type(storage_key[1]))
+            else:
+                old_numbers = UndoOperator.read_numbers(operator, profile_props)
+                if old_numbers is None:
+                    continue
+            new_numbers = Instrumentation.cache(old_numbers.copy())
+            result = IFC_AssignNumbers.assign_numbers(operator, profile_props, new_numbers, scene_data)
+            new_numbers = dict(new_numbers) if Instrumentation.enabled else new_numbers
+            numbers[storage_key] = new_numbers
+            profiles.append({"name": settings_name, "result": result, "settings": settings,
+                             "old_value": old_numbers, "new_value": new_numbers})
+        return profiles
+
+    @staticmethod
+    def execute_with_undo(operator, props, settings_names):
+        """Assign numbers with each of the saved settings in a single undo step"""
+        if not settings_names:
+            operator.report({'WARNING'}, "No saved settings selected for batch numbering.")
+            return {'CANCELLED'}
+
+        def run():
+            profiles = BatchNumbering.assign_numbers(operator, props, settings_names)
+            if not profiles:
+                return None
+            operator.report({'INFO'}, f"Assigned numbers with settings {', '.join(profile['name'] for profile in profiles)}.")
+            return {"profiles": [{key: profile[key] for key in ("settings", "old_value", "new_value")} for profile in profiles]}
+
+        return {'CANCELLED'} if UndoOperator.run_transaction(operator, props, "batch_assign_numbers", run) is None else {'FINISHED'}
+
+class IFC_BatchAssignNumbers(bpy.types.Operator):
+    bl_idname = "ifc.batch_assign_numbers"
+    bl_label = "Batch assign numbers"
+    bl_description = "Assign numbers with each of the selected saved settings in turn, sharing the selection and geometry between the runs"
+    bl_options = {"REGISTER", "UNDO"}
+
+    @classmethod
+    def poll(cls, context):
+        return NumberingContext.poll(context)
+
+    def execute(self, context):
+        props = context.scene.ifc_numbering_settings
+        settings_names = [name for name in sorted(Settings.get_settings_names()) if name in props.batch_settings]
+        return BatchNumbering.execute_with_undo(self, props, settings_names)
+
+    def rollback(self, data):
+        UndoOperator.rollback(self, data)
+    
+    def commit(self, data):
+        UndoOperator.commit(self, data)
+
+class TypeNumbering:
+    """Number the type objects of the selected elements and propagate the type numbers to their occurrences"""
+
+    @staticmethod
+    def get_type_name(type_object):
+        """Get the type name used in the format, e.g. Wall for IfcWallType"""
+        type_name = type_object.is_a()[3:]
+        return type_name[:-len("Type")] if type_name.endswith("Type") and len(type_name) > len("Type") else type_name
+
+    @staticmethod
+    def get_type_objects(props, rels, scene_data=None):
+        """Get the type objects of the selected elements of the selected types, sorted by IFC class and name"""
+        if scene_data is None:
+            scene_data = SceneData()
+        selected_types = set(LoadSelection.get_selected_types(props, scene_data.get_possible_types(props)))
+        selected_ids = set()
+        for obj in scene_data.load_selected_objects(props):
+            element = scene_data.get_entity(obj)
+            if element is not None and element.is_a() in selected_types:
+                selected_ids.add(element.id())
+        type_objects = {rel.RelatingType for rel in rels if any(element.id() in selected_ids for element in rel.RelatedObjects)}
+        return sorted(type_objects, key=lambda type_object: (type_object.is_a(), type_object.Name or "", type_object.id()))
+
+    @staticmethod
+    def assign_numbers(operator, props, type_objects=None, scene_data=None):
+        """Number the type objects with the format settings and, if enabled, write each type number to all occurrences of the type
+        in one pass over IfcRelDefinesByType. With Pset storage, occurrences read the number inherited from the pset of their type,
+        so only occurrences that override the property with another number are written.
+        Returns a summary including the old and new numbers of the changed elements, keyed by ID."""
+        ifc_file = get_ifc_file()
+        rels = ifc_file.by_type("IfcRelDefinesByType")
+        with Instrumentation.stage("load_types"):
+            if type_objects is None:
+                type_objects = TypeNumbering.get_type_objects(props, rels, scene_data)
+        Instrumentation.count("types", len(type_objects))
+        if not type_objects:
+            operator.report({'WARNING'}, "No type objects of the selected elements available for numbering.")
+            return None
+
+        type_counts = {}
+        for type_object in type_objects:
+            type_counts[type_object.is_a()] = type_counts.get(type_object.is_a(), 0) + 1
+        numbers = {}
+        type_numbers = {}
+        with Instrumentation.stage("format"):
+            for element_number, type_object in enumerate(type_objects):
+                ifc_class = type_object.is_a()
+                type_number = type_numbers[ifc_class] = type_numbers.get(ifc_class, -1) + 1
+                numbers[type_object] = NumberFormatting.format_number(props, (element_number, type_number, None),
+                    (len(type_objects), type_counts[ifc_class], 1), TypeNumbering.get_type_name(type_object))
+
+        element_numbers = list(numbers.items())
+        if props.propagate_toggle:
+            with Instrumentation.stage("propagate"):
+                for rel in rels:
+                    if (number := numbers.get(rel.RelatingType)) is not None:
+                        element_numbers.extend((element, number) for element in rel.RelatedObjects)
+        Instrumentation.count("occurrences", len(element_numbers) - len(type_objects))
+
+        if props.save_type == "Pset" and props.pset_name == "Common":
+            SaveNumber.get_pset_common_names(element for element, _ in element_numbers)
+        storage = SaveNumber.get_storage_props(props)
+        with Instrumentation.stage("save"):
+            write_count, skip_count, failed, old_numbers, new_numbers = SaveNumber.save_numbers(element_numbers, storage)
+            NumberRegistry.update(props, old_numbers, new_numbers)
+        Instrumentation.count("numbered", write_count)
+        Instrumentation.count("writes_skipped", skip_count)
+
+        if failed:
+            operator.report({'WARNING'}, f"Failed to save {len(failed)} numbers, e.g. for {', '.join(map(str, failed[:5]))}")
+        message = f"Numbered {len(type_objects)} types"
+        if props.propagate_toggle:
+            message += f" and {len(element_numbers) - len(type_objects)} occurrences"
+        operator.report({'INFO'}, f"{message}, {write_count} numbers changed.")
+        return {"types": len(type_objects), "written": write_count, "unchanged": skip_count, "failed": failed,
+                "old_value": old_numbers, "new_value": new_numbers}
+
+    @staticmethod
+    def execute_with_undo(operator, props, type_objects=None):
+        """Number the type objects and their occurrences in a single undo step"""
+        data = UndoOperator.run_transaction(operator, props, "assign_type_numbers", lambda: UndoOperator.get_transaction_data(
+            TypeNumbering.assign_numbers(operator, props, type_objects), Settings.get_dict(props)))
+        return {'CANCELLED'} if data is None else {'FINISHED'}
+
+class IFC_AssignTypeNumbers(bpy.types.Operator):
+    bl_idname = "ifc.assign_type_numbers"
+    bl_label = "Assign type numbers"
+    bl_description = "Number the type objects of the selected elements and write each type number to all occurrences of the type"
+    bl_options = {"REGISTER", "UNDO"}
+
+    @classmethod
+    def poll(cls, context):
+        return NumberingContext.poll(context)
+
+    def execute(self, context):
+        props = context.scene.ifc_numbering_settings
+        return TypeNumbering.execute_with_undo(self, props)
+
+    def rollback(self, data):
+        UndoOperator.rollback(self, data)
+    
+    def commit(self, data):
+        UndoOperator.commit(self, data)
+
+class GridNumbering:
+    """Number the axes of IfcGrid elements from the grid structure, ordered by the offset of their axis curves,
+    so no grid geometry needs to be loaded in Blender. Grid axes have no GlobalId, so their numbers are left out of the
+    number patch and history, and another copy of the model is renumbered from its own grid structure instead."""
+
+    families = ("UAxes", "VAxes", "WAxes")
+
+    @staticmethod
+    def get_axis_line(curve):
+        """Get a point and the direction of a straight axis curve in the grid plane, or the centre and radius of a
+        circular axis, or None for other curves"""
+        if curve is None:
+            return None
+        if curve.is_a("IfcTrimmedCurve"):
+            curve = curve.BasisCurve
+        if curve.is_a("IfcCircle"):
+            centre = curve.Position.Location.Coordinates
+            return ("circle", (centre[0], centre[1]), curve.Radius)
+        if curve.is_a("IfcPolyline"):
+            points = [point.Coordinates for point in curve.Points]
+        elif curve.is_a("IfcIndexedPolyCurve"):
+            points = curve.Points.CoordList
+        elif curve.is_a("IfcLine"):
+            start = curve.Pnt.Coordinates
+            points = [start, tuple(a + b for a, b in zip(start, curve.Dir.Orientation.DirectionRatios))]
+        else:
+            return None
+        if len(points) < 2:
+            return None
+        dx, dy = points[-1][0] - points[0][0], points[-1][1] - points[0][1]
+        length = math.hypot(dx, dy)
+        if length == 0:
+            return None
+        return ("line", (points[0][0], points[0][1]), (dx / length, dy / length))
+
+    @staticmethod
+    def get_axis_order(axes, props):
+        """Sort the axes of one family by their offset along the normal of the first straight axis, in the positive X or Y
+        direction of the settings, and circular axes by their radius. Returns the sorted axes and the axes that could not
+        be ordered."""
+        lines = [(axis, GridNumbering.get_axis_line(axis.AxisCurve)) for axis in axes]
+        unordered = [axis for axis, line in lines if line is None]
+        normal = next(((-line[2][1], line[2][0]) for _, line in lines if line is not None and line[0] == "line"), (1.0, 0.0))
+        # Point the normal along the X or Y axis it is closest to, in the direction of the settings
+        dominant = 0 if abs(normal[0]) >= abs(normal[1]) else 1
+        sign = math.copysign(1, normal[dominant]) * int(props.x_direction if dominant == 0 else props.y_direction)
+        normal = (normal[0] * sign, normal[1] * sign)
+        keys = {}
+        for axis, line in lines:
+            if line is None:
+                continue
+            if line[0] == "circle":
+                keys[axis] = (line[2], 0.0)
+            else:
+                # Axes through the same point, e.g. in a radial grid, are ordered by their angle
+                keys[axis] = (round(line[1][0] * normal[0] + line[1][1] * normal[1], 6), math.atan2(line[2][1], line[2][0]))
+        return sorted(keys, key=lambda axis: (keys[axis], axis.id())), unordered
+
+    @staticmethod
+    def get_grids(props, scene_data=None):
+        """Get the grids to number, all grids or the grids of the selected objects"""
+        grids = get_ifc_file().by_type("IfcGrid")
+        if props.selected_toggle:
+            if scene_data is None:
+                scene_data = SceneData()
+            grids = [grid for grid in grids if (obj := tool.Ifc.get_object(grid)) is not None and obj in scene_data.selected_set]
+        return grids
+
+    @staticmethod
+    def get_storage_props(props):
+        """Grid axes have no property sets, so their numbers are always stored in the AxisTag attribute"""
+        storage = SaveNumber.get_storage_props(props)
+        storage.save_type = "Attribute"
+        storage.attribute_name = "AxisTag"
+        return storage
+
+    @staticmethod
+    def get_settings(props):
+        """Get the settings dictionary of a grid numbering run, with the AxisTag storage the numbers are written to"""
+        return {**Settings.get_dict(props), "save_type": "Attribute", "attribute_name": "AxisTag"}
+
+    @staticmethod
+    def is_storage_overridden(props):
+        """Whether the storage of the settings is not the AxisTag attribute the grid numbers are written to"""
+        return props.save_type != "Attribute" or SaveNumber.get_attribute_name(props) != "AxisTag"
+
+    @staticmethod
+    def assign_numbers(operator, props, grids=None):
+        """Number the U axes, V axes and W axes of each grid with their numbering systems, in one pass over the grids.
+        Returns a summary including the old and new numbers of the changed axes, keyed by ID."""
+        with Instrumentation.stage("load_grids"):
+            if grids is None:
+                grids = GridNumbering.get_grids(props)
+        Instrumentation.count("grids", len(grids))
+        if not grids:
+            operator.report({'WARNING'}, "No grids selected or available for numbering.")
+            return None
+
+        systems = (props.grid_u_numbering, props.grid_v_numbering, props.grid_w_numbering)
+        axis_numbers = []
+        unordered = []
+        with Instrumentation.stage("format"):
+            for grid in grids:
+                for family, numbering_system in zip(GridNumbering.families, systems):
+                    axes, family_unordered = GridNumbering.get_axis_order(getattr(grid, family, None) or (), props)
+                    unordered += family_unordered
+                    axis_numbers += [(axis, NumberingSystems.to_numbering_string(props.initial_element_number + i, numbering_system, len(axes)))
+                                     for i, axis in enumerate(axes)]
+        Instrumentation.count("axes", len(axis_numbers))
+
+        if GridNumbering.is_storage_overridden(props):
+            operator.report({'WARNING'}, f"Numbers from the grid structure are stored in AxisTag instead of " \
+                            f"{' '.join(str(part) for part in SaveNumber.get_storage_key(props) if part)}.")
+        with Instrumentation.stage("save"):
+            write_count, skip_count, failed, old_numbers, new_numbers = SaveNumber.save_numbers(axis_numbers, GridNumbering.get_storage_props(props))
+            NumberRegistry.update(Settings.to_props(GridNumbering.get_settings(props)), old_numbers, new_numbers)
+        Instrumentation.count("numbered", write_count)
+        Instrumentation.count("writes_skipped", skip_count)
+
+        if unordered:
+            operator.report({'WARNING'}, f"Skipped {len(unordered)} axes with curves that are not lines or circles, " \
+                            f"e.g. {', '.join(str(axis.AxisTag) for axis in unordered[:5])}")
+        if failed:
+            operator.report({'WARNING'}, f"Failed to save {len(failed)} numbers, e.g. for {', '.join(map(str, failed[:5]))}")
+        operator.report({'INFO'}, f"Numbered {len(axis_numbers)} axes of {len(grids)} grids, {write_count} numbers changed.")
+        return {"axes": len(axis_numbers), "written": write_count, "unchanged": skip_count, "failed": failed,
+                "old_value": old_numbers, "new_value": new_numbers}
+
+    @staticmethod
+    def execute_with_undo(operator, props, grids=None):
+        """Number the grid axes in a single undo step"""
+        data = UndoOperator.run_transaction(operator, props, "assign_grid_numbers", lambda: UndoOperator.get_transaction_data(
+            GridNumbering.assign_numbers(operator, props, grids), GridNumbering.get_settings(props)))
+        return {'CANCELLED'} if data is None else {'FINISHED'}
+
+class Schedule:
+    """Streaming export of the numbering schedule of the selected elements"""
+
+    columns = ("GlobalId", "IfcClass", "TypeName", "Storey", "Number", "X", "Y", "Z")
+    file_formats = {"CSV": ".csv", "JSONL": ".jsonl", "PARQUET": ".parquet"}
+    parquet_batch_size = 65536
+
+    @staticmethod
+    def get_file_format(filepath):
+        """Get the file format from the file extension, defaulting to CSV"""
+        return next((name for name, ext in Schedule.file_formats.items() if filepath.lower().endswith(ext)), "CSV")
+
+    @staticmethod
+    def iter_records(props, objects=None):
+        """Yield a schedule row for each selected element of the selected types, one element at a time, without keeping
+        the elements or their locations. The given objects count as selected, as for number_elements."""
+        selected_objects = LoadSelection.load_selected_objects(props) if objects is None else SceneData(objects).load_selected_objects(props)
+        parent_type = LoadSelection.get_parent_type(props)
+        selected_types = None if "All" in props.selected_types else set(props.selected_types)
+        storage = SaveNumber.get_storage_props(props)
+        structure_names = {} # Name of each containing structure, resolved once
+        for obj in selected_objects:
+            element = tool.Ifc.get_entity(obj)
+            if element is None or not (element.is_a(parent_type) if selected_types is None else element.is_a() in selected_types):
+                continue
+            storey_name = None
+            if structure := getattr(element, "ContainedInStructure", None):
+                storey = structure[0].RelatingStructure
+                if storey.id() not in structure_names:
+                    structure_names[storey.id()] = getattr(storey, "Name", None)
+                storey_name = structure_names[storey.id()]
+            yield (get_id(element), element.is_a(), getattr(get_type(element), "Name", None), storey_name,
+                   SaveNumber.get_number(element, storage), *ObjectGeometry.get_object_location(obj, props))
+
+    @staticmethod
+    def write_csv(rows, filepath, columns=None):
+        count = 0
+        with open(filepath, 'w', newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(columns or Schedule.columns)
+            for row in rows:
+                writer.writerow(row)
+                count += 1
+        return count
+
+    @staticmethod
+    def write_jsonl(rows, filepath, columns=None):
+        count = 0
+        with open(filepath, 'w') as f:
+            for row in rows:
+                f.write(json.dumps(dict(zip(columns or Schedule.columns, row))) + "\n")
+                count += 1
+        return count
+
+    @staticmethod
+    def write_parquet(rows, filepath):
+        """Write the rows in batches to a Parquet file, requires pyarrow"""
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        schema = pa.schema([(column, pa.float64() if column in "XYZ" else pa.string()) for column in Schedule.columns])
+        count = 0
+        with pq.ParquetWriter(filepath, schema) as writer:
+            while batch := list(itertools.islice(rows, Schedule.parquet_batch_size)):
+                columns = [column if field.type == pa.float64() else [None if value is None else str(value) for value in column]
+                           for field, column in zip(schema, zip(*batch))]
+                writer.write_table(pa.Table.from_arrays([pa.array(column, type=field.type) for field, column in zip(schema, columns)], schema=schema))
+                count += len(batch)
+        return count
+
+    @staticmethod
+    def export(operator, props, filepath, file_format=None, objects=None):
+        """Export the schedule of the selected elements to a CSV, JSON Lines or Parquet file.
+        The file format is derived from the file extension if not given."""
+        ifc_file = get_ifc_file()
+        file_format = file_format or Schedule.get_file_format(filepath)
+        writers = {"CSV": Schedule.write_csv, "JSONL": Schedule.write_jsonl, "PARQUET": Schedule.write_parquet}
+        if props.save_type == "Pset" and props.pset_name == "Common":
+            SaveNumber.get_pset_common_names(ifc_file.by_type(LoadSelection.get_parent_type(props)))
+        start = time.perf_counter()
+        try:
+            count = writers[file_format](Schedule.iter_records(props, objects), filepath)
+        except ImportError:
+            operator.report({'ERROR'}, "Exporting to Parquet requires the pyarrow package.")
+            return {'CANCELLED'}
+        except OSError as e:
+            operator.report({'ERROR'}, f"Failed to write schedule to {filepath}: {e}")
+            return {'CANCELLED'}
+        operator.report({'INFO'}, f"Exported schedule of {count} elements to {filepath} in {time.perf_counter() - start:.2f} s")
+        return {'FINISHED'}
+
+    @staticmethod
+    def iter_rows(filepath, file_format=None):
+        """Yield the rows of a CSV or JSON Lines file as dictionaries, reading one line at a time"""
+        file_format = file_format or Schedule.get_file_format(filepath)
+        with open(filepath, newline="") as f:
+            if file_format == "JSONL":
+                for line in f:
+                    if line.strip():
+                        yield json.loads(line)
+            else:
+                yield from csv.DictReader(f)
+
+    @staticmethod
+    def read_numbers(operator, filepath, id_column="GlobalId", number_column="Number", file_format=None):
+        """Read a GlobalId to number table one row at a time, resolving the GlobalIds in the IFC file.
+        Returns the numbers keyed by element, the unmatched and the duplicate GlobalIds."""
+        ifc_file = get_ifc_file()
+        numbers = {}
+        unmatched, duplicate_ids = [], []
+        for row in Schedule.iter_rows(filepath, file_format):
+            if id_column not in row or number_column not in row:
+                operator.report({'ERROR'}, f"Columns {id_column} and {number_column} not found in {filepath}.")
+                return None
+            global_id, number = row[id_column], row[number_column]
+            try:
+                element = ifc_file.by_guid(global_id)
+            except (RuntimeError, TypeError):
+                unmatched.append(global_id)
+                continue
+            if element in numbers:
+                duplicate_ids.append(global_id)
+            numbers[element] = None if number in (None, "") else str(number)
+        return numbers, unmatched, duplicate_ids
+
+    @staticmethod
+    def import_numbers(operator, props, filepath, id_column="GlobalId", number_column="Number", file_format=None):
+        """Import numbers from a CSV or JSON Lines file and write them with the storage settings in one pass.
+        Returns a summary including the old and new numbers of the imported elements, keyed by ID, or None if reading failed."""
+        try:
+            result = Schedule.read_numbers(operator, filepath, id_column, number_column, file_format)
+        except (OSError, ValueError, csv.Error) as e:
+            operator.report({'ERROR'}, f"Failed to read numbers from {filepath}: {e}")
+            return None
+        if result is None:
+            return None
+        numbers, unmatched, duplicate_ids = result
+
+        if props.save_type == "Pset" and props.pset_name == "Common":
+            SaveNumber.get_pset_common_names(numbers)
+
+        storage = SaveNumber.get_storage_props(props)
+        write_count, skip_count, failed, old_numbers, numbers_cache = SaveNumber.save_numbers(numbers.items(), storage)
+        NumberRegistry.update(props, old_numbers, numbers_cache)
+
+        number_counts = {}
+        for number in numbers.values():
+            if number is not None:
+                number_counts[number] = number_counts.get(number, 0) + 1
+        duplicate_numbers = [number for number, count in number_counts.items() if count > 1]
+
+        if unmatched:
+            operator.report({'WARNING'}, f"{len(unmatched)} GlobalIds not found in the model, e.g. {', '.join(map(str, unmatched[:5]))}")
+        if duplicate_ids:
+            operator.report({'WARNING'}, f"{len(duplicate_ids)} GlobalIds appear more than once, the last number is used, e.g. {', '.join(duplicate_ids[:5])}")
+        if duplicate_numbers:
+            operator.report({'WARNING'}, f"{len(duplicate_numbers)} numbers are assigned to more than one element, e.g. {', '.join(duplicate_numbers[:5])}")
+        if failed:
+            operator.report({'WARNING'}, f"Failed to save {len(failed)} numbers, e.g. for {', '.join(map(str, failed[:5]))}")
+        operator.report({'INFO'}, f"Imported {len(numbers)} numbers, {write_count} changed and {skip_count} unchanged.")
+        return {"written": write_count, "unchanged": skip_count, "failed": failed, "unmatched": unmatched,
+                "duplicate_ids": duplicate_ids, "duplicate_numbers": duplicate_numbers,
+                "old_value": old_numbers, "new_value": numbers_cache}
+
+    @staticmethod
+    def execute_with_undo(operator, props, filepath, id_column="GlobalId", number_column="Number"):
+        """Import numbers in a single undo step"""
+        data = UndoOperator.run_transaction(operator, props, "import_numbers", lambda: UndoOperator.get_transaction_data(
+            Schedule.import_numbers(operator, props, filepath, id_column, number_column), Settings.get_dict(props)))
+        return {'CANCELLED'} if data is None else {'FINISHED'}
+
+class IFC_ExportSchedule(bpy.types.Operator):
+    bl_idname = "ifc.export_schedule"
+    bl_label = "Export Schedule"
+    bl_description = "Export GlobalId, IFC class, type name, storey, number and location of the selected elements"
+    filepath: bpy.props.StringProperty(subtype="FILE_PATH") # pyright: ignore[reportInvalidTypeForm]
+    file_format: bpy.props.EnumProperty(
+        name="Format",
+        items=[("CSV", "CSV", "Comma separated values"),
+               ("JSONL", "JSON Lines", "One JSON object per line"),
+               ("PARQUET", "Parquet", "Columnar Parquet file, requires pyarrow")
+        ],
+        default="CSV"
+    ) # pyright: ignore[reportInvalidTypeForm]
+
+    @classmethod
+    def poll(cls, context):
+        return NumberingContext.poll(context)
+
+    def execute(self, context):
+        props = context.scene.ifc_numbering_settings
+        return Schedule.export(self, props, self.filepath, self.file_format)
+
+    def invoke(self, context, event):
+        self.filepath = "numbering_schedule" + Schedule.file_formats[self.file_format]
+        context.window_manager.fileselect_add(self)
+        return {'RUNNING_MODAL'}
+
+class IFC_ImportNumbers(bpy.types.Operator):
+    bl_idname = "ifc.import_numbers"
+    bl_label = "Import Numbers"
+    bl_description = "Import numbers from a CSV or JSON Lines table of GlobalIds and numbers, stored with the current storage settings"
+    bl_options = {"REGISTER", "UNDO"}
+    filepath: bpy.props.StringProperty(subtype="FILE_PATH") # pyright: ignore[reportInvalidTypeForm]
+    id_column: bpy.props.StringProperty(name="GlobalId column", default="GlobalId") # pyright: ignore[reportInvalidTypeForm]
+    number_column: bpy.props.StringProperty(name="Number column", default="Number") # pyright: ignore[reportInvalidTypeForm]
+
+    @classmethod
+    def poll(cls, context):
+        return NumberingContext.poll(context)
+
+    def execute(self, context):
+        props = context.scene.ifc_numbering_settings
+        return Schedule.execute_with_undo(self, props, self.filepath, self.id_column, self.number_column)
+
+    def invoke(self, context, event):
+        context.window_manager.fileselect_add(self)
+        return {'RUNNING_MODAL'}
+
+    def rollback(self, data):
+        UndoOperator.rollback(self, data)
+    
+    def commit(self, data):
+        UndoOperator.commit(self, data)
+
+class Validation:
+    """Check the stored numbers against the numbering convention in one pass, reporting violations without writing
+    to the IFC file"""
+
+    columns = ("GlobalId", "IfcClass", "Number", "Violation", "Detail")
+    numbering_patterns = {
+        "number": r"\d+|\(\d+\)",
+        "number_ext": r"\d+|\(\d+\)",
+        "lower_letter": r"[a-z]+|0|\([a-z]+\)",
+        "upper_letter": r"[A-Z]+|0|\([A-Z]+\)",
+        "custom": r"-?\d+|\(\d+\)"
+    }
+    placeholder_pattern = re.compile(r"(\{[EPTS]\}|\[TT\]|\[TF\]|\[T\])")
+
+    @staticmethod
+    def get_format_pattern(number_format, props, type_name):
+        """Translate a format string to a regular expression for the numbers of one type, as formatted by
+        NumberFormatting.format_number. The storey number is captured as group S."""
+        parts = []
+        for token in Validation.placeholder_pattern.split(number_format):
+            if token == "{E}":
+                parts.append(f"(?:{Validation.numbering_patterns[props.element_numbering]})")
+            elif token == "{T}":
+                parts.append(f"(?:{Validation.numbering_patterns[props.type_numbering]})")
+            elif token == "{S}":
+                # Later {S} placeholders repeat the first one
+                storey_pattern = f"(?P<S>{Validation.numbering_patterns[props.storey_numbering]}|x)"
+                parts.append("(?P=S)" if "(?P<S>" in "".join(parts) else storey_pattern)
+            elif token == "{P}":
+                parts.append(".*")
+            elif token == "[T]" and len(type_name) > 0:
+                parts.append(re.escape(type_name[0]))
+            elif token == "[TT]" and len(type_name) > 1:
+                parts.append(re.escape("".join([c for c in type_name if c.isupper()])))
+            elif token == "[TF]":
+                parts.append(re.escape(type_name))
+            else:
+                parts.append(re.escape(token))
+        return "".join(parts)
+
+    @staticmethod
+    def get_patterns(props, ifc_class, patterns):
+        """Get the compiled patterns a number of the IFC class may match, compiled once per class.
+        Raises re.error for an invalid custom pattern."""
+        if ifc_class not in patterns:
+            if props.validation_pattern.strip():
+                patterns[ifc_class] = [re.compile(props.validation_pattern.strip())]
+            else:
+                formats = [props.format] + ([props.part_format] if props.hierarchy_toggle else [])
+                patterns[ifc_class] = [re.compile(Validation.get_format_pattern(number_format, props, ifc_class[3:]))
+                                       for number_format in formats]
+        return patterns[ifc_class]
+
+    @staticmethod
+    def get_storey_string(storey_number, storeys, props):
+        """Get the storey number as it is formatted for {S}, or x if the element is not in a storey"""
+        if storey_number is None:
+            return "x"
+        return NumberingSystems.to_numbering_string(props.initial_storey_number + storey_number, props.storey_numbering, len(storeys))
+
+    @staticmethod
+    def iter_violations(props, elements, storeys, summary, scene_data):
+        """Yield a report row for each violation, streaming over the elements once. Numbers must match the pattern,
+        be unique within the scope in which they restart and agree with the storey containing the element,
+        or the inferred storey if storeys are inferred."""
+        inference = None
+        if props.storey_mode == "INFERRED" and storeys:
+            inference = (Decomposition.get_parents(get_ifc_file()), Storeys.get_elevations(storeys, scene_data))
+
+        def get_storey_number(element):
+            storey_number = Storeys.get_storey_number(element, storeys, props)
+            if storey_number is None and inference is not None:
+                storey_number = Storeys.infer_storey_number(element, storeys, props, *inference, scene_data)
+            return storey_number
+
+        storage = SaveNumber.get_storage_props(props)
+        patterns = {}
+        first_ids = {} # Element ID of the first use of each number, keyed by scope and number
+        for element in elements:
+            number = SaveNumber.get_number(element, storage)
+            if number is None:
+                summary["unnumbered"] += 1
+                continue
+            summary["checked"] += 1
+            number = str(number)
+            element_id = get_id(element)
+            ifc_class = element.is_a()
+            match = next((match for pattern in Validation.get_patterns(props, ifc_class, patterns)
+                          if (match := pattern.fullmatch(number)) is not None), None)
+            if match is None:
+                summary["format"] += 1
+                yield (element_id, ifc_class, number, "format", "Does not match the numbering convention")
+            elif (storey := match.groupdict().get("S")) is not None and \
+                    storey != (expected := Validation.get_storey_string(get_storey_number(element), storeys, props)):
+                summary["storey"] += 1
+                yield (element_id, ifc_class, number, "storey", f"Storey number {storey}, but contained in storey number {expected}")
+
+            storey_number = get_storey_number(element) if props.scope == "STOREY" else None
+            scope_key = ElementRecords.get_scope_key(element, storey_number, props) if props.scope != "NONE" else None
+            key = (scope_key if isinstance(scope_key, (str, int, float, bool, type(None))) else str(scope_key), number)
+            if key in first_ids:
+                summary["duplicate"] += 1
+                yield (element_id, ifc_class, number, "duplicate", f"Also used by {first_ids[key]}")
+            else:
+                first_ids[key] = element_id
+
+    @staticmethod
+    def validate(operator, props, filepath=None, scene_data=None):
+        """Validate the numbers of all elements of the parent type and the selected types. The violations are written
+        to a CSV or JSON Lines report if a file path is given. Returns a summary with the counts of each violation
+        and, without a file path, the violation rows, or None if validation failed."""
+        ifc_file = get_ifc_file()
+        parent_type = LoadSelection.get_parent_type(props)
+        try:
+            elements = ifc_file.by_type(parent_type)
+        except RuntimeError:
+            operator.report({'ERROR'}, f"Parent type {parent_type} not found in {ifc_file.schema} schema.")
+            return None
+        if props.selected_types and "All" not in props.selected_types:
+            elements = [element for element in elements if element.is_a() in props.selected_types]
+        try:
+            Validation.get_patterns(props, parent_type, {})
+        except re.error as e:
+            operator.report({'ERROR'}, f"Invalid validation pattern: {e}")
+            return None
+        if props.save_type == "Pset" and props.pset_name == "Common":
+            SaveNumber.get_pset_common_names(elements)
+
+        start = time.perf_counter()
+        if scene_data is None:
+            scene_data = SceneData()
+        storeys = Storeys.get_storeys(props, scene_data)
+        summary = {"checked": 0, "unnumbered": 0, "format": 0, "duplicate": 0, "storey": 0}
+        violations = Validation.iter_violations(props, elements, storeys, summary, scene_data)
+        if filepath is None:
+            summary["violations"] = list(violations)
+        else:
+            writer = Schedule.write_jsonl if Schedule.get_file_format(filepath) == "JSONL" else Schedule.write_csv
+            try:
+                writer(violations, filepath, Validation.columns)
+            except OSError as e:
+                operator.report({'ERROR'}, f"Failed to write validation report to {filepath}: {e}")
+                return None
+
+        violation_count = summary["format"] + summary["duplicate"] + summary["storey"]
+        message = f"Checked {summary['checked']} numbers in {time.perf_counter() - start:.2f} s, {summary['unnumbered']} elements without number. " \
+            f"Found {violation_count} violations: {summary['format']} format, {summary['duplicate']} duplicate, {summary['storey']} storey."
+        if filepath is not None:
+            message += f" Wrote report to {filepath}"
+        operator.report({'WARNING'} if violation_count else {'INFO'}, message)
+        return summary
+
+class IFC_ValidateNumbers(bpy.types.Operator):
+    bl_idname = "ifc.validate_numbers"
+    bl_label = "Validate Numbers"
+    bl_description = "Check the stored numbers against the format or validation pattern, for uniqueness within the restart scope " \
+        "and for agreement with the storey, writing the violations to a CSV or JSON Lines report"
+    filepath: bpy.props.StringProperty(subtype="FILE_PATH") # pyright: ignore[reportInvalidTypeForm]
+
+    @classmethod
+    def poll(cls, context):
+        return NumberingContext.poll(context)
+
+    def execute(self, context):
+        props = context.scene.ifc_numbering_settings
+        summary = Validation.validate(self, props, self.filepath)
+        return {'CANCELLED'} if summary is None else {'FINISHED'}
+
+    def invoke(self, context, event):
+        self.filepath = "numbering_validation.csv"
+        context.window_manager.fileselect_add(self)
+        return {'RUNNING_MODAL'}
+
+class NumberPatch:
+    """Change set of the numbers since the file was loaded, exported as a patch keyed by GlobalId and applied to
+    another copy of the model. Entities without a GlobalId, such as grid axes, are left out, as their entity IDs need
+    not match between copies."""
+
+    format_name = "bonsai-numbering-patch"
+    version = 1
+    storage_keys = ("save_type", "attribute_name", "attribute_name_other", "pset_name", "custom_pset_name", "property_name",
+                    "parent_type", "parent_type_other", "registry_toggle")
+
+    @staticmethod
+    def get_changes():
+        """Get the changed numbers of the current file per storage, as {storage settings JSON: {ID: (old, new)}}"""
+        numbering_context = NumberingContext.get()
+        if numbering_context.number_changes is None:
+            numbering_context.number_changes = {}
+        return numbering_context.number_changes
+
+    @staticmethod
+    def record(data, reverse=False):
+        """Add the changed numbers of a transaction to the change set, in reverse for undo.
+        Numbers changed back to their original value drop out of the change set."""
+        if "profiles" in data:
+            for profile_data in (reversed(data["profiles"]) if reverse else data["profiles"]):
+                NumberPatch.record(profile_data, reverse)
+            return
+        old_value, new_value = (data["new_value"], data["old_value"]) if reverse else (data["old_value"], data["new_value"])
+        settings = data.get("settings") or Settings.get_dict(bpy.context.scene.ifc_numbering_settings)
+        key = json.dumps({key: settings.get(key) for key in NumberPatch.storage_keys}, sort_keys=True)
+        changes = NumberPatch.get_changes().setdefault(key, {})
+        for element_id, number in new_value.items():
+            if (old_number := old_value.get(element_id)) == number or not isinstance(element_id, str):
+                continue
+            original = changes[element_id][0] if element_id in changes else old_number
+            if original == number:
+                del changes[element_id]
+            else:
+                changes[element_id] = (original, number)
+
+    @staticmethod
+    def export(operator, filepath):
+        """Write the change set as a JSON patch, compressed when the path ends with .gz"""
+        changes = [{"settings": json.loads(key), "numbers": [[element_id, old, new] for element_id, (old, new) in numbers.items()]}
+                   for key, numbers in NumberPatch.get_changes().items() if numbers]
+        if not changes:
+            operator.report({'WARNING'}, "No numbers changed since the IFC file was loaded.")
+            return {'CANCELLED'}
+        patch = {"format": NumberPatch.format_name, "version": NumberPatch.version, "schema": get_ifc_file().schema, "changes": changes}
+        with (gzip.open(filepath, "wt", encoding="utf-8") if filepath.endswith(".gz") else open(filepath, "w", encoding="utf-8")) as f:
+            json.dump(patch, f, separators=(",", ":"))
+        operator.report({'INFO'}, f"Exported {sum(len(change['numbers']) for change in changes)} changed numbers to {filepath}")
+        return {'FINISHED'}
+
+    @staticmethod
+    def read(operator, filepath):
+        with (gzip.open(filepath, "rt", encoding="utf-8") if filepath.endswith(".gz") else open(filepath, encoding="utf-8")) as f:
+            patch = json.load(f)
+        if patch.get("format") != NumberPatch.format_name or patch.get("version", 0) > NumberPatch.version:
+            operator.report({'ERROR'}, f"{filepath} is not a numbering patch of version {NumberPatch.version} or lower.")
+            return None
+        return patch
+
+    @staticmethod
+    def apply(operator, props, patch, force=False):
+        """Apply the changed numbers of a patch, only looking up the changed elements. Elements with a number that is
+        neither the old nor the new number of the patch, nor one of the numbers accepted by an optional fourth item,
+        are skipped unless force is set.
+        Returns the transaction profiles with the old and new numbers of each storage."""
+        profiles = []
+        missing, conflicts = 0, 0
+        for change in patch["changes"]:
+            settings = change["settings"]
+            change_props = Settings.to_props(settings, props)
+            storage = SaveNumber.get_storage_props(change_props)
+            element_numbers = []
+            for element_id, old_number, new_number, *accepted in change["numbers"]:
+                if (element := get_element(element_id)) is None:
+                    missing += 1
+                    continue
+                element_numbers.append((element, (old_number, new_number, *itertools.chain(*accepted)), new_number))
+            if storage.save_type == "Pset" and storage.pset_name == "Common":
+                SaveNumber.get_pset_common_names([element for element, _, _ in element_numbers])
+            if not force:
+                count = len(element_numbers)
+                element_numbers = [(element, accepted, new_number) for element, accepted, new_number in element_numbers
+                                   if SaveNumber.get_number(element, storage) in accepted]
+                conflicts += count - len(element_numbers)
+            write_count, _, failed, old_numbers, new_numbers = \
+                SaveNumber.save_numbers(((element, new_number) for element, _, new_number in element_numbers), storage)
+            if failed:
+                operator.report({'WARNING'}, f"Failed to save {len(failed)} numbers with {SaveNumber.get_storage_key(storage)}.")
+            NumberRegistry.update(change_props, old_numbers, new_numbers)
+            profiles.append({"settings": settings, "old_value": old_numbers, "new_value": new_numbers, "partial": True})
+            operator.report({'INFO'}, f"Changed {write_count} numbers with {SaveNumber.get_storage_key(storage)}.")
+        if missing:
+            operator.report({'WARNING'}, f"{missing} elements of the patch are not in the IFC file.")
+        if conflicts:
+            operator.report({'WARNING'}, f"Skipped {conflicts} elements with a number changed since the patch was made.")
+        return profiles
+
+    @staticmethod
+    def execute_with_undo(operator, props, filepath, force=False):
+        """Apply a patch file in a single undo step"""
+        if (patch := NumberPatch.read(operator, filepath)) is None:
+            return {'CANCELLED'}
+        UndoOperator.run_transaction(operator, props, "apply_number_patch", lambda: {"profiles": NumberPatch.apply(operator, props, patch, force)})
+        return {'FINISHED'}
+
+class IFC_ExportNumberPatch(bpy.types.Operator):
+    bl_idname = "ifc.export_number_patch"
+    bl_label = "Export Number Patch"
+    bl_description = "Export the numbers changed since the IFC file was loaded as a patch keyed by GlobalId, to apply to another copy of the model"
+    filepath: bpy.props.StringProperty(subtype="FILE_PATH") # pyright: ignore[reportInvalidTypeForm]
+
+    @classmethod
+    def poll(cls, context):
+        return NumberingContext.poll(context)
+
+    def execute(self, context):
+        return NumberPatch.export(self, self.filepath)
+
+    def invoke(self, context, event):
+        self.filepath = "numbering_patch.json"
+        context.window_manager.fileselect_add(self)
+        return {'RUNNING_MODAL'}
+
+class IFC_ApplyNumberPatch(bpy.types.Operator):
+    bl_idname = "ifc.apply_number_patch"
+    bl_label = "Apply Number Patch"
+    bl_description = "Apply the changed numbers of a patch exported from another copy of the model"
+    bl_options = {"REGISTER", "UNDO"}
+    filepath: bpy.props.StringProperty(subtype="FILE_PATH") # pyright: ignore[reportInvalidTypeForm]
+    force: bpy.props.BoolProperty(name="Overwrite changed numbers", description="Also apply the patch to elements with a number " \
+        "that is neither the old nor the new number of the patch", default=False) # pyright: ignore[reportInvalidTypeForm]
+
+    @classmethod
+    def poll(cls, context):
+        return NumberingContext.poll(context)
+
+    def execute(self, context):
+        props = context.scene.ifc_numbering_settings
+        return NumberPatch.execute_with_undo(self, props, self.filepath, self.force)
+
+    def invoke(self, context, event):
+        context.window_manager.fileselect_add(self)
+        return {'RUNNING_MODAL'}
+
+    def rollback(self, data):
+        UndoOperator.rollback(self, data)
+    
+    def commit(self, data):
+        UndoOperator.commit(self, data)
+
+class NumberHistory:
+    """Append-only history of the number changes of a model, kept in a JSON Lines file next to the IFC file so that
+    earlier numbering runs can be reverted after the file was closed. Each entry holds the settings and the changed
+    numbers keyed by GlobalId, and entries are kept in memory until the IFC file has been saved to a path. Entities
+    without a GlobalId, such as grid axes, are left out as in the number patch."""
+
+    file_suffix = ".numbering-history.jsonl"
+
+    @staticmethod
+    def get_path():
+        return IfcStore.path + NumberHistory.file_suffix if IfcStore.path else None
+
+    @staticmethod
+    def get_entries():
+        """Get the entries of the history, read from the history file only once"""
+        numbering_context = NumberingContext.get()
+        if numbering_context.history is None:
+            numbering_context.history = []
+            if (path := NumberHistory.get_path()) and os.path.exists(path):
+                with open(path, encoding="utf-8") as f:
+                    numbering_context.history = [json.loads(line) for line in f if line.strip()]
+            numbering_context.history_written = len(numbering_context.history)
+        return numbering_context.history
+
+    @staticmethod
+    def record(data, reverse=False):
+        """Append the changed numbers of a transaction to the history, in reverse for undo"""
+        if not bpy.context.scene.ifc_numbering_settings.history_toggle:
+            return
+        changes = []
+        profiles = data.get("profiles", [data])
+        for profile_data in reversed(profiles) if reverse else profiles:
+            old_value, new_value = (profile_data["new_value"], profile_data["old_value"]) if reverse else \
+                (profile_data["old_value"], profile_data["new_value"])
+            numbers = [[element_id, old_value.get(element_id), number] for element_id, number in new_value.items()
+                       if old_value.get(element_id) != number and isinstance(element_id, str)]
+            if numbers:
+                changes.append({"settings": profile_data.get("settings") or Settings.get_dict(bpy.context.scene.ifc_numbering_settings),
+                                "numbers": numbers})
+        if changes:
+            NumberHistory.get_entries().append({"time": time.strftime("%Y-%m-%d %H:%M:%S"), "user": get_user(),
+                                                "undo": reverse, "changes": changes})
+            NumberHistory.write()
+
+    @staticmethod
+    def write():
+        """Append the entries that are not in the history file yet, if the IFC file has a path"""
+        numbering_context = NumberingContext.get()
+        if (path := NumberHistory.get_path()) is None or numbering_context.history is None:
+            return
+        with open(path, "a", encoding="utf-8") as f:
+            for entry in numbering_context.history[numbering_context.history_written:]:
+                f.write(json.dumps(entry, separators=(",", ":")) + "\n")
+        numbering_context.history_written = len(numbering_context.history)
+
+    @staticmethod
+    def get_entry_items(prop, context):
+        """Enum items of the entries, newest first, to revert to the numbers after the entry"""
+        entries = NumberHistory.get_entries() if NumberingContext.poll(context) else []
+        items = [(str(index), f"{index + 1}. {entry['time']} {entry['user']}" + (" (undo)" if entry.get("undo") else ""),
+                  f"{sum(len(change['numbers']) for change in entry['changes'])} numbers changed")
+                 for index, entry in reversed(list(enumerate(entries)))]
+        return items + [("-1", "Before the history", "Numbers before the first entry of the history")]
+
+    @staticmethod
+    def get_revert_patch(entries):
+        """Compose the inverse of the changes of the given entries to a patch, from the number after the entries to the
+        number before them. Only the changed elements are visited, so reverting scales with the number of changes."""
+        numbers = {} # Per storage, the target, latest and all numbers of each element in the entries
+        settings = {}
+        for entry in reversed(entries):
+            for change in reversed(entry["changes"]):
+                key = json.dumps({key: change["settings"].get(key) for key in NumberPatch.storage_keys}, sort_keys=True)
+                settings.setdefault(key, change["settings"])
+                storage_numbers = numbers.setdefault(key, {})
+                for element_id, old_number, new_number in change["numbers"]:
+                    if element_id in storage_numbers:
+                        storage_numbers[element_id][0] = old_number
+                        storage_numbers[element_id][2].append(old_number)
+                    else:
+                        storage_numbers[element_id] = [old_number, new_number, [old_number, new_number]]
+        # Numbers in between are accepted as well, e.g. when later changes were not saved in the IFC file
+        return {"changes": [{"settings": settings[key], "numbers": [[element_id, latest, target, values]
+                                                                    for element_id, (target, latest, values) in storage_numbers.items()]}
+                            for key, storage_numbers in numbers.items()]}
+
+    @staticmethod
+    def revert(operator, props, index, force=False):
+        """Revert the numbers to the state after the entry with the given index, or before the history for -1, by applying
+        the inverse changes of the later entries. Returns the transaction profiles, or None if there is nothing to revert."""
+        entries = NumberHistory.get_entries()
+        if not -1 <= index < len(entries):
+            operator.report({'ERROR'}, f"Entry {index + 1} is not in the numbering history of {len(entries)} entries.")
+            return None
+        if index == len(entries) - 1:
+            operator.report({'WARNING'}, "The numbers are already at the last entry of the history.")
+            return None
+        profiles = NumberPatch.apply(operator, props, NumberHistory.get_revert_patch(entries[index + 1:]), force)
+        operator.report({'INFO'}, f"Reverted {len(entries) - index - 1} history entries.")
+        return profiles
+
+    @staticmethod
+    def execute_with_undo(operator, props, index, force=False):
+        """Revert to an entry of the history in a single undo step, which is added to the history as well"""
+        data = UndoOperator.run_transaction(operator, props, "revert_number_history",
+            lambda: None if (profiles := NumberHistory.revert(operator, props, index, force)) is None else {"profiles": profiles})
+        return {'CANCELLED'} if data is None else {'FINISHED'}
+
+class IFC_RevertNumberHistory(bpy.types.Operator):
+    bl_idname = "ifc.revert_number_history"
+    bl_label = "Revert Numbering History"
+    bl_description = "Revert the numbers to an earlier entry of the numbering history, kept next to the IFC file"
+    bl_options = {"REGISTER", "UNDO"}
+    entry: bpy.props.EnumProperty(name="Revert to", description="Entry of the history to revert the numbers to",
+                                  items=NumberHistory.get_entry_items) # pyright: ignore[reportInvalidTypeForm]
+    force: bpy.props.BoolProperty(name="Overwrite changed numbers", description="Also revert elements with a number that was " \
+        "changed outside of the history", default=False) # pyright: ignore[reportInvalidTypeForm]
+
+    @classmethod
+    def poll(cls, context):
+        return NumberingContext.poll(context)
+
+    def execute(self, context):
+        props = context.scene.ifc_numbering_settings
+        return NumberHistory.execute_with_undo(self, props, int(self.entry), self.force)
+
+    def invoke(self, context, event):
+        return context.window_manager.invoke_props_dialog(self)
+
+    def rollback(self, data):
+        UndoOperator.rollback(self, data)
+    
+    def commit(self, data):
+        UndoOperator.commit(self, data)
+
 class IFC_ShowMessage(bpy.types.Operator):
     bl_idname = "ifc.show_message"
     bl_label = "Show Message"
@@ -1021,6 +3826,20 @@ class IFC_ShowMessage(bpy.types.Operator):
         self.report({'INFO'}, self.message)
         return {'FINISHED'}
 
+class IFC_ExportInstrumentation(bpy.types.Operator):
+    bl_idname = "ifc.export_instrumentation"
+    bl_label = "Export Instrumentation"
+    bl_description = "Export the timings and counters of the last numbering run to a JSON file, or its cProfile statistics to a .prof file"
+    filepath: bpy.props.StringProperty(subtype="FILE_PATH") # pyright: ignore[reportInvalidTypeForm]
+
+    def execute(self, context):
+        return Instrumentation.export(self, self.filepath)
+
+    def invoke(self, context, event):
+        self.filepath = "numbering_stats.json"
+        context.window_manager.fileselect_add(self)
+        return {'RUNNING_MODAL'}
+
 class Settings:
 
     pset_name = "Pset_NumberingSettings"
@@ -1033,14 +3852,27 @@ class Settings:
         return {
             "selected_toggle": props.selected_toggle,
             "visible_toggle": props.visible_toggle,
+            "filter_expression": props.filter_expression,
+            "region_mode": props.region_mode,
+            "region_min": tuple(props.region_min),
+            "region_max": tuple(props.region_max),
+            "region_object": props.region_object,
+            "region_structure": props.region_structure,
             "parent_type": props.parent_type,
             "parent_type_other": props.parent_type_other,
+            "grid_toggle": props.grid_toggle,
+            "grid_u_numbering": props.grid_u_numbering,
+            "grid_v_numbering": props.grid_v_numbering,
+            "grid_w_numbering": props.grid_w_numbering,
             "selected_types": list(props.selected_types),
             "x_direction": props.x_direction,
             "y_direction": props.y_direction,
             "z_direction": props.z_direction,
             "axis_order": props.axis_order,
             "location_type": props.location_type,
+            "order_mode": props.order_mode,
+            "path": props.path,
+            "path_reverse": props.path_reverse,
             "precision": (props.precision[0], props.precision[1], props.precision[2]),
             "initial_element_number": props.initial_element_number,
             "initial_type_number": props.initial_type_number,
@@ -1048,7 +3880,13 @@ class Settings:
             "element_numbering": props.element_numbering,
             "type_numbering": props.type_numbering,
             "storey_numbering": props.storey_numbering,
+            "storey_mode": props.storey_mode,
             "format": props.format,
+            "scope": props.scope,
+            "scope_property": props.scope_property,
+            "hierarchy_toggle": props.hierarchy_toggle,
+            "part_format": props.part_format,
+            "validation_pattern": props.validation_pattern,
             "save_type": props.save_type,
             "attribute_name": props.attribute_name,
             "attribute_name_other": props.attribute_name_other,
@@ -1056,12 +3894,50 @@ class Settings:
             "custom_pset_name": props.custom_pset_name,
             "property_name": props.property_name,
             "remove_toggle": props.remove_toggle,
-            "check_duplicates_toggle": props.check_duplicates_toggle
+            "check_duplicates_toggle": props.check_duplicates_toggle,
+            "propagate_toggle": props.propagate_toggle,
+            "registry_toggle": props.registry_toggle,
+            "allocation_toggle": props.allocation_toggle,
+            "allocation_url": props.allocation_url,
+            "allocation_batch": props.allocation_batch
             }
 
+    @staticmethod
+    def get_defaults():
+        """Get the default settings from the property declarations, for numbering without the scene properties"""
+        defaults = {}
+        for name, declaration in IFC_NumberingSettings.__annotations__.items():
+            keywords = getattr(declaration, "keywords", {})
+            if "default" in keywords and not callable(keywords.get("items")):
+                value = keywords["default"]
+            elif "ENUM_FLAG" in keywords.get("options", ()):
+                value = set()
+            elif isinstance(keywords.get("items"), (list, tuple)):
+                value = keywords["items"][0][0]
+            elif callable(keywords.get("items")):
+                # Dynamic enums default to the item at their default index, which may depend on the settings declared before them
+                attributes = {key: value for key, value in vars(IFC_NumberingSettings).items() if not key.startswith("__")}
+                items = keywords["items"](type("DefaultSettings", (), {**attributes, **defaults})(), bpy.context)
+                value = items[keywords.get("default", 0)][0] if items else ""
+            else:
+                value = {"BoolProperty": False, "IntProperty": 0, "FloatProperty": 0.0,
+                         "FloatVectorProperty": (0.0,) * keywords.get("size", 3)}.get(getattr(declaration.function, "__name__", ""), "")
+            defaults[name] = value
+        return Settings.get_dict(types.SimpleNamespace(**defaults))
+
+    @staticmethod
+    def to_props(settings, props=None):
+        """Convert a settings dictionary to a lightweight settings object, with missing settings taken from props"""
+        values = Settings.get_dict(props) if props is not None else {}
+        values.update(settings)
+        values["selected_types"] = set(values.get("selected_types", ()))
+        values["instrumentation"] = getattr(props, "instrumentation", "OFF")
+        return types.SimpleNamespace(**values)
+
     @staticmethod
     def save_settings(operator, props):
         """Save the numbering settings to the IFC file."""
+        ifc_file = get_ifc_file()
         # Save multiple settings by name in a dictionary
         project = ifc_file.by_type("IfcProject")[0]
         settings_name = props.settings_name.strip()
@@ -1076,16 +3952,35 @@ class Settings:
             operator.report({'ERROR'}, "Could not create property set")
             return {'CANCELLED'}
         ifc_api.run("pset.edit_pset", ifc_file, pset=pset_settings, properties={settings_name: json.dumps(Settings.get_dict(props))})
-        Settings.settings_names.add(settings_name)
+        Settings.get_settings_names().add(settings_name)
         operator.report({'INFO'}, f"Saved settings '{settings_name}' to IFCProject element")
         return {'FINISHED'}
 
+    @staticmethod
+    def get_dynamic_items(props, key):
+        """Get the identifiers of a setting whose items depend on the IFC file or the scene, such as the region structure
+        and the path, or None for other settings"""
+        keywords = getattr(IFC_NumberingSettings.__annotations__.get(key), "keywords", {})
+        if not callable(keywords.get("items")) or "ENUM_FLAG" in keywords.get("options", ()):
+            return None
+        return [item[0] for item in keywords["items"](props, bpy.context)]
+
     @staticmethod
     def read_settings(operator, settings, props):
+        """Set the properties to the settings. Settings whose items depend on the file, e.g. saved in another file with a
+        storey or path not found in this one, take their default instead."""
+        defaults = None
         for key, value in settings.items():
             if key == "selected_types":
                 possible_type_names = [t[0] for t in LoadSelection.possible_types]
                 value = set([type_name for type_name in value if type_name in possible_type_names])
+            elif (items := Settings.get_dynamic_items(props, key)) is not None and value not in items:
+                defaults = defaults or Settings.get_defaults()
+                if defaults.get(key) not in items:
+                    operator.report({'WARNING'}, f"Setting {key} {value} is not found in this file and was not loaded.")
+                    continue
+                operator.report({'WARNING'}, f"Setting {key} {value} is not found in this file, using {defaults[key]} instead.")
+                value = defaults[key]
             try:
                 setattr(props, key, value)
             except Exception as e:
@@ -1093,37 +3988,50 @@ class Settings:
 
     @staticmethod
     def get_settings_names():
+        ifc_file = get_ifc_file()
+        if ifc_file is None:
+            return set()
         if Settings.settings_names is None:
             if pset := get_pset(ifc_file.by_type("IfcProject")[0], Settings.pset_name):
                 names = set(pset.keys())
                 names.remove("id")
+                names.discard(NumberAllocation.property_name)
             else:
                 names = set()
             Settings.settings_names = names
         return Settings.settings_names
 
     @staticmethod
-    def load_settings(operator, props):
-        # Load selected settings by name
-        settings_name = props.saved_settings
-        if settings_name == "NONE":
-            operator.report({'WARNING'}, "No saved settings to load.")
-            return {'CANCELLED'}
+    def get_saved_settings(operator, settings_name):
+        """Get the saved settings dictionary with the given name, or None if not found"""
+        ifc_file = get_ifc_file()
         if pset_settings := get_pset(ifc_file.by_type("IfcProject")[0], Settings.pset_name):
             settings = pset_settings.get(settings_name, None)
             if settings is None:
                 operator.report({'WARNING'}, f"Settings '{settings_name}' not found.")
-                return {'CANCELLED'}
-            settings = json.loads(settings)
-            Settings.read_settings(operator, settings, props)
-            operator.report({'INFO'}, f"Loaded settings '{settings_name}' from IFCProject element")
-            return {'FINISHED'}
+                return None
+            return json.loads(settings)
         else:
             operator.report({'WARNING'}, "No settings found")
+            return None
+
+    @staticmethod
+    def load_settings(operator, props):
+        # Load selected settings by name
+        settings_name = props.saved_settings
+        if settings_name == "NONE":
+            operator.report({'WARNING'}, "No saved settings to load.")
+            return {'CANCELLED'}
+        settings = Settings.get_saved_settings(operator, settings_name)
+        if settings is None:
             return {'CANCELLED'}
+        Settings.read_settings(operator, settings, props)
+        operator.report({'INFO'}, f"Loaded settings '{settings_name}' from IFCProject element")
+        return {'FINISHED'}
     
     @staticmethod
     def delete_settings(operator, props):
+        ifc_file = get_ifc_file()
         settings_name = props.saved_settings
         if settings_name == "NONE":
             operator.report({'WARNING'}, "No saved settings to delete.")
@@ -1132,7 +4040,7 @@ class Settings:
             if settings_name in pset_settings:
                 pset_settings = ifc_file.by_id(pset_settings["id"])
                 ifc_api.run("pset.edit_pset", ifc_file, pset=pset_settings, properties={settings_name: None}, should_purge=True)
-                Settings.settings_names.remove(settings_name)
+                Settings.get_settings_names().discard(settings_name)
                 operator.report({'INFO'}, f"Deleted settings '{settings_name}' from IFCProject element")
 
                 if not pset_settings.HasProperties:
@@ -1147,10 +4055,16 @@ class Settings:
 
     @staticmethod
     def clear_settings(operator, props):
+        ifc_file = get_ifc_file()
         project = ifc_file.by_type("IfcProject")[0]
         if pset_settings := get_pset(project, Settings.pset_name):
+            keep_allocations = NumberAllocation.property_name in pset_settings
             pset_settings = ifc_file.by_id(pset_settings["id"])
-            ifc_api.run("pset.remove_pset", ifc_file, product=project, pset=pset_settings)
+            if keep_allocations: # Allocated numbers cannot be reserved again, so they are kept
+                ifc_api.run("pset.edit_pset", ifc_file, pset=pset_settings,
+                            properties={name: None for name in Settings.get_settings_names()}, should_purge=True)
+            else:
+                ifc_api.run("pset.remove_pset", ifc_file, product=project, pset=pset_settings)
             operator.report({'INFO'}, f"Cleared settings from IFCProject element")
             Settings.settings_names = set()
             return {'FINISHED'}
@@ -1158,11 +4072,314 @@ class Settings:
             operator.report({'WARNING'}, "No settings found")
             return {'CANCELLED'}
 
+class NumberRegistry:
+    """Used and reserved numbers per scope and prefix, stored in the IFC Project element so that numbering passes stay unique
+    without scanning the model. The scope is the parent type and storage of the numbers, e.g. IfcElement/Attribute/Tag,
+    so numbers stored elsewhere do not count as used. Numbers are split in a prefix and a trailing integer, e.g. W-012 in W- and 12."""
+
+    pset_name = "Pset_NumberingRegistry"
+    pattern = re.compile(r"^(.*?)(\d+)$")
+
+    entries = None
+    changed = set()
+
+    @staticmethod
+    def split(number):
+        """Split a number in its prefix, trailing integer and number of digits, or return None if it does not end in digits"""
+        if not isinstance(number, str) or (match := NumberRegistry.pattern.match(number)) is None:
+            return None
+        return match.group(1), int(match.group(2)), len(match.group(2))
+
+    @staticmethod
+    def to_ranges(values):
+        """Compress integers to a string of ranges, e.g. 1-5,7"""
+        ranges = []
+        for _, group in itertools.groupby(enumerate(sorted(values)), lambda pair: pair[1] - pair[0]):
+            group = [value for _, value in group]
+            ranges.append(str(group[0]) if len(group) == 1 else f"{group[0]}-{group[-1]}")
+        return ",".join(ranges)
+
+    @staticmethod
+    def from_ranges(ranges):
+        values = set()
+        for part in filter(None, ranges.split(",")):
+            start, _, stop = part.partition("-")
+            values.update(range(int(start), int(stop or start) + 1))
+        return values
+
+    @staticmethod
+    def get_scope(props):
+        """Get the scope of the numbers written with the settings, from their parent type and storage"""
+        storage_key = SaveNumber.get_storage_key(props)
+        return "/".join(str(part) for part in (LoadSelection.get_parent_type(props), *storage_key) if part)
+
+    @staticmethod
+    def get_entries():
+        """Get the registry entries by scope and prefix, read from the IFC file only once"""
+        if NumberRegistry.entries is None:
+            NumberRegistry.entries = {}
+            NumberRegistry.changed = set()
+            if pset := get_pset(get_ifc_file().by_type("IfcProject")[0], NumberRegistry.pset_name):
+                for key, value in pset.items():
+                    if key != "id":
+                        scope, _, prefix = key.partition("[")
+                        entry = json.loads(value)
+                        entry["used"] = NumberRegistry.from_ranges(entry["used"])
+                        NumberRegistry.entries[(scope, prefix[:-1])] = entry
+        return NumberRegistry.entries
+
+    @staticmethod
+    def get_entry(scope, prefix):
+        entries = NumberRegistry.get_entries()
+        if (scope, prefix) not in entries:
+            entries[(scope, prefix)] = {"next": 1, "used": set(), "reserved": []}
+        return entries[(scope, prefix)]
+
+    @staticmethod
+    def is_reserved(entry, value, owner=None):
+        """Whether the value is in a range reserved by another owner"""
+        return any(start <= value < stop and reserved_by != owner for start, stop, reserved_by in entry["reserved"])
+
+    @staticmethod
+    def add(scope, number):
+        """Register a number as used, without checking whether it is free"""
+        if (parts := NumberRegistry.split(number)) is None:
+            return
+        prefix, value, _ = parts
+        entry = NumberRegistry.get_entry(scope, prefix)
+        entry["used"].add(value)
+        entry["next"] = max(entry["next"], value + 1)
+        NumberRegistry.changed.add((scope, prefix))
+
+    @staticmethod
+    def release(scope, number):
+        """Mark a number as free again, the next free number of its prefix is not lowered"""
+        if (parts := NumberRegistry.split(number)) is None:
+            return
+        prefix, value, _ = parts
+        if (entry := NumberRegistry.get_entries().get((scope, prefix))) is not None and value in entry["used"]:
+            entry["used"].discard(value)
+            NumberRegistry.changed.add((scope, prefix))
+
+    @staticmethod
+    def allocate(scope, prefix):
+        """Get the next free number of a prefix, above all used and reserved numbers"""
+        entry = NumberRegistry.get_entry(scope, prefix)
+        value = entry["next"]
+        entry["next"] = value + 1
+        NumberRegistry.changed.add((scope, prefix))
+        return value
+
+    @staticmethod
+    def claim(scope, number, owner=None):
+        """Register a number, replacing it by the next free number of its prefix if it is already used or reserved by another owner"""
+        if (parts := NumberRegistry.split(number)) is None:
+            return number
+        prefix, value, digits = parts
+        entry = NumberRegistry.get_entry(scope, prefix)
+        if value in entry["used"] or NumberRegistry.is_reserved(entry, value, owner):
+            value = NumberRegistry.allocate(scope, prefix)
+            number = prefix + str(value).zfill(digits)
+        NumberRegistry.add(scope, number)
+        return number
+
+    @staticmethod
+    def reserve(scope, prefix, count, owner=""):
+        """Reserve a range of count numbers of a prefix, returned as a range"""
+        entry = NumberRegistry.get_entry(scope, prefix)
+        start = entry["next"]
+        entry["next"] = start + count
+        entry["reserved"].append([start, start + count, owner])
+        NumberRegistry.changed.add((scope, prefix))
+        return range(start, start + count)
+
+    @staticmethod
+    def update(props, old_numbers, new_numbers):
+        """Register the changed numbers keyed by element ID of a write with the settings, if the registry is used.
+        Every write registers its numbers this way, and undo and redo mirror it with the numbers swapped."""
+        if not getattr(props, "registry_toggle", False):
+            return
+        scope = NumberRegistry.get_scope(props)
+        changed = [element_id for element_id, number in new_numbers.items() if old_numbers.get(element_id) != number]
+        for element_id in changed:
+            NumberRegistry.release(scope, old_numbers.get(element_id))
+        for element_id in changed:
+            NumberRegistry.add(scope, new_numbers[element_id])
+        NumberRegistry.save()
+
+    @staticmethod
+    def rebuild(operator, props):
+        """Register the numbers of all elements of the parent type in their storage, keeping the reserved ranges"""
+        numbers = UndoOperator.read_numbers(operator, props)
+        if numbers is None:
+            return {'CANCELLED'}
+        scope = NumberRegistry.get_scope(props)
+        for key, entry in NumberRegistry.get_entries().items():
+            if key[0] == scope:
+                entry["used"] = set()
+                NumberRegistry.changed.add(key)
+        for number in numbers.values():
+            NumberRegistry.add(scope, number)
+        NumberRegistry.save()
+        prefix_count = sum(key[0] == scope for key in NumberRegistry.get_entries())
+        operator.report({'INFO'}, f"Registered {sum(number is not None for number in numbers.values())} numbers with {prefix_count} prefixes in {scope}.")
+        return {'FINISHED'}
+
+    @staticmethod
+    def save():
+        """Write the changed prefixes to the registry Pset of the IFC Project element"""
+        if NumberRegistry.entries is None or not NumberRegistry.changed:
+            return
+        ifc_file = get_ifc_file()
+        project = ifc_file.by_type("IfcProject")[0]
+        if pset := get_pset(project, NumberRegistry.pset_name):
+            pset = ifc_file.by_id(pset["id"])
+        else:
+            pset = ifc_api.run("pset.add_pset", ifc_file, product=project, name=NumberRegistry.pset_name)
+        properties = {}
+        for scope, prefix in NumberRegistry.changed:
+            entry = NumberRegistry.entries[(scope, prefix)]
+            properties[f"{scope}[{prefix}]"] = json.dumps({"next": entry["next"], "used": NumberRegistry.to_ranges(entry["used"]),
+                                                    "reserved": entry["reserved"]})
+        ifc_api.run("pset.edit_pset", ifc_file, pset=pset, properties=properties)
+        NumberRegistry.changed = set()
+
+class AllocationClient:
+    """Client of the number allocation service of allocation_service.py, reserving the ranges of all prefixes in one request"""
+
+    def __init__(self, url, timeout=5.0):
+        self.url = url.rstrip("/")
+        self.timeout = timeout
+
+    def reserve(self, counts, owner=""):
+        """Reserve count numbers for each prefix, returning the reserved range of each prefix as (start, stop).
+        Raises OSError if the service cannot be reached and ValueError for an invalid response."""
+        request = urllib.request.Request(self.url + "/reserve", data=json.dumps({"counts": counts, "owner": owner}).encode(),
+                                         headers={"Content-Type": "application/json"}, method="POST")
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            ranges = json.loads(response.read())["ranges"]
+        return {prefix: (int(start), int(stop)) for prefix, (start, stop) in ranges.items()}
+
+class NumberAllocation:
+    """Numbers reserved for this model from an allocation service shared by the modellers of a project, so that
+    split files numbered at the same time do not use the same numbers. Numbers are split in a prefix and a trailing
+    integer as in the number registry, and the trailing integer is taken from the reserved numbers of the prefix.
+    The reserved numbers are kept in Pset_NumberingSettings of the IFC Project element, so numbering continues
+    offline until they are used up."""
+
+    property_name = "NumberAllocations"
+    backend = None # In-process stand-in for the service, e.g. allocation_service.AllocationStore
+
+    entries = None
+    changed = set()
+
+    @staticmethod
+    def get_backend(props):
+        return NumberAllocation.backend or AllocationClient(props.allocation_url)
+
+    @staticmethod
+    def get_owner():
+        """Name recorded with the reservations in the service, the user and the file name"""
+        return f"{get_user()}:{os.path.basename(IfcStore.path or bpy.data.filepath)}"
+
+    @staticmethod
+    def get_entries():
+        """Get the free and all allocated numbers by prefix, read from the IFC file only once"""
+        if NumberAllocation.entries is None:
+            NumberAllocation.entries = {}
+            NumberAllocation.changed = set()
+            if (pset := get_pset(get_ifc_file().by_type("IfcProject")[0], Settings.pset_name)) and \
+                    (value := pset.get(NumberAllocation.property_name)):
+                for prefix, entry in json.loads(value).items():
+                    NumberAllocation.entries[prefix] = {key: NumberRegistry.from_ranges(ranges) for key, ranges in entry.items()}
+        return NumberAllocation.entries
+
+    @staticmethod
+    def get_entry(prefix):
+        entries = NumberAllocation.get_entries()
+        if prefix not in entries:
+            entries[prefix] = {"free": set(), "allocated": set()}
+        return entries[prefix]
+
+    @staticmethod
+    def allocate(operator, props, records, storage, numbers_cache):
+        """Replace the trailing integer of the formatted numbers of the records by allocated numbers of their prefix.
+        An element keeps its current number if it was allocated to this model and has the same prefix. Missing numbers
+        are reserved from the service in one request for all prefixes, at least allocation_batch numbers per prefix.
+        Returns False if the service could not be reached and too few numbers were reserved before."""
+        pending = []
+        kept = {}
+        for record in records:
+            if (parts := NumberRegistry.split(record.number)) is None:
+                continue
+            prefix, _, digits = parts
+            entry = NumberAllocation.get_entry(prefix)
+            old_parts = NumberRegistry.split(SaveNumber.get_number(record.element, storage, numbers_cache))
+            if old_parts is not None and old_parts[0] == prefix and old_parts[1] in entry["allocated"] and \
+                    old_parts[1] not in entry["free"] and old_parts[1] not in kept.setdefault(prefix, set()):
+                kept[prefix].add(old_parts[1])
+                record.number = prefix + str(old_parts[1]).zfill(digits)
+            else:
+                pending.append((record, prefix, digits))
+
+        counts = {}
+        for _, prefix, _ in pending:
+            counts[prefix] = counts.get(prefix, 0) + 1
+        shortages = {prefix: max(count - len(NumberAllocation.get_entry(prefix)["free"]), 0) for prefix, count in counts.items()}
+        if requests := {prefix: max(shortage, props.allocation_batch) for prefix, shortage in shortages.items() if shortage}:
+            try:
+                ranges = NumberAllocation.get_backend(props).reserve(requests, NumberAllocation.get_owner())
+            except (OSError, ValueError, KeyError) as e:
+                operator.report({'ERROR'}, f"Could not reserve numbers for {len(requests)} prefixes from the allocation service at " \
+                                f"{props.allocation_url}: {e}")
+                return False
+            for prefix, (start, stop) in ranges.items():
+                entry = NumberAllocation.get_entry(prefix)
+                entry["free"].update(range(start, stop))
+                entry["allocated"].update(range(start, stop))
+                NumberAllocation.changed.add(prefix)
+            operator.report({'INFO'}, f"Reserved {sum(stop - start for start, stop in ranges.values())} numbers for " \
+                            f"{len(ranges)} prefixes from the allocation service.")
+
+        free = {prefix: sorted(NumberAllocation.get_entry(prefix)["free"]) for prefix in counts}
+        used = {prefix: 0 for prefix in counts}
+        for record, prefix, digits in pending:
+            if used[prefix] >= len(free[prefix]):
+                operator.report({'ERROR'}, f"The allocation service reserved too few numbers for prefix {prefix}.")
+                return False
+            record.number = prefix + str(free[prefix][used[prefix]]).zfill(digits)
+            used[prefix] += 1
+        for prefix, count in used.items():
+            if count:
+                NumberAllocation.get_entry(prefix)["free"].difference_update(free[prefix][:count])
+                NumberAllocation.changed.add(prefix)
+        return True
+
+    @staticmethod
+    def save():
+        """Write the allocated numbers to Pset_NumberingSettings of the IFC Project element"""
+        if NumberAllocation.entries is None or not NumberAllocation.changed:
+            return
+        ifc_file = get_ifc_file()
+        project = ifc_file.by_type("IfcProject")[0]
+        if pset := get_pset(project, Settings.pset_name):
+            pset = ifc_file.by_id(pset["id"])
+        else:
+            pset = ifc_api.run("pset.add_pset", ifc_file, product=project, name=Settings.pset_name)
+        value = {prefix: {key: NumberRegistry.to_ranges(values) for key, values in entry.items()}
+                 for prefix, entry in NumberAllocation.entries.items() if entry["allocated"]}
+        ifc_api.run("pset.edit_pset", ifc_file, pset=pset, properties={NumberAllocation.property_name: json.dumps(value)})
+        NumberAllocation.changed = set()
+
 class IFC_SaveSettings(bpy.types.Operator):
     bl_idname = "ifc.save_settings"
     bl_label = "Save Settings"
     bl_description = f"Save the current numbering settings to {Settings.pset_name} of the IFC Project element, under the selected name"
 
+    @classmethod
+    def poll(cls, context):
+        return NumberingContext.poll(context)
+
     def execute(self, context):
         props = context.scene.ifc_numbering_settings
         return Settings.save_settings(self, props)
@@ -1172,6 +4389,10 @@ class IFC_LoadSettings(bpy.types.Operator):
     bl_label = "Load Settings"
     bl_description = f"Load the selected numbering settings from {Settings.pset_name} of the IFC Project element"
 
+    @classmethod
+    def poll(cls, context):
+        return NumberingContext.poll(context)
+
     def execute(self, context):
         props = context.scene.ifc_numbering_settings
         return Settings.load_settings(self, props)
@@ -1181,6 +4402,10 @@ class IFC_DeleteSettings(bpy.types.Operator):
     bl_label = "Delete Settings"
     bl_description = f"Delete the selected numbering settings from {Settings.pset_name} of the IFC Project element"
 
+    @classmethod
+    def poll(cls, context):
+        return NumberingContext.poll(context)
+
     def execute(self, context):
         props = context.scene.ifc_numbering_settings
         return Settings.delete_settings(self, props)
@@ -1190,6 +4415,10 @@ class IFC_ClearSettings(bpy.types.Operator):
     bl_label = "Clear Settings"
     bl_description = f"Remove the {Settings.pset_name} Pset and all the saved settings from the IFC Project element"
 
+    @classmethod
+    def poll(cls, context):
+        return NumberingContext.poll(context)
+
     def execute(self, context):
         props = context.scene.ifc_numbering_settings
         return Settings.clear_settings(self, props)
@@ -1203,7 +4432,7 @@ class IFC_ExportSettings(bpy.types.Operator):
     def execute(self, context):
         props = context.scene.ifc_numbering_settings
         with open(self.filepath, 'w') as f:
-            json.dump(Settings.settings_dict(props), f)
+            json.dump(Settings.get_dict(props), f, indent=2)
         self.report({'INFO'}, f"Exported settings to {self.filepath}")
         return {'FINISHED'}
 
@@ -1231,6 +4460,41 @@ class IFC_ImportSettings(bpy.types.Operator):
         context.window_manager.fileselect_add(self)
         return {'RUNNING_MODAL'}
 
+class IFC_RebuildNumberRegistry(bpy.types.Operator):
+    bl_idname = "ifc.rebuild_number_registry"
+    bl_label = "Rebuild Number Registry"
+    bl_description = f"Register the current numbers of all elements of the parent type in {NumberRegistry.pset_name} of the IFC Project element, keeping reserved ranges"
+
+    @classmethod
+    def poll(cls, context):
+        return NumberingContext.poll(context)
+
+    def execute(self, context):
+        props = context.scene.ifc_numbering_settings
+        return NumberRegistry.rebuild(self, props)
+
+class IFC_ReserveNumbers(bpy.types.Operator):
+    bl_idname = "ifc.reserve_numbers"
+    bl_label = "Reserve Numbers"
+    bl_description = f"Reserve a range of numbers with a prefix for the parent type and storage in {NumberRegistry.pset_name}, so that other numbering passes skip them"
+    prefix: bpy.props.StringProperty(name="Prefix", default="") # pyright: ignore[reportInvalidTypeForm]
+    count: bpy.props.IntProperty(name="Count", default=100, min=1) # pyright: ignore[reportInvalidTypeForm]
+    owner: bpy.props.StringProperty(name="Reserved for", description="Name of the saved settings allowed to use the range", default="") # pyright: ignore[reportInvalidTypeForm]
+
+    @classmethod
+    def poll(cls, context):
+        return NumberingContext.poll(context)
+
+    def execute(self, context):
+        props = context.scene.ifc_numbering_settings
+        numbers = NumberRegistry.reserve(NumberRegistry.get_scope(props), self.prefix, self.count, self.owner)
+        NumberRegistry.save()
+        self.report({'INFO'}, f"Reserved numbers {self.prefix}{numbers.start} to {self.prefix}{numbers.stop - 1}")
+        return {'FINISHED'}
+
+    def invoke(self, context, event):
+        return context.window_manager.invoke_props_dialog(self)
+
 # UI Panel (where you see it)
 class IFCNumberingTool(bpy.types.Panel):
     bl_label = "Number Assignment Tool"
@@ -1241,21 +4505,36 @@ class IFCNumberingTool(bpy.types.Panel):
 
     def draw(self, context):
         layout = self.layout
+        if not NumberingContext.poll(context):
+            layout.label(text="No IFC project loaded", icon="INFO")
+            return
         props = context.scene.ifc_numbering_settings
         props.draw(layout)
 
 # Registration
-classes = [IFC_AssignNumbers, IFC_RemoveNumbers, IFC_SaveSettings, IFC_LoadSettings, IFC_ExportSettings, IFC_ImportSettings, IFC_DeleteSettings, IFC_ClearSettings,
-           IFC_ShowMessage, IFC_NumberingSettings, IFCNumberingTool]
+classes = [IFC_AssignNumbers, IFC_RemoveNumbers, IFC_BatchAssignNumbers, IFC_AssignTypeNumbers, IFC_SaveSettings, IFC_LoadSettings, IFC_ExportSettings, IFC_ImportSettings, IFC_DeleteSettings, IFC_ClearSettings,
+           IFC_ShowMessage, IFC_ExportInstrumentation, IFC_ExportSchedule, IFC_ImportNumbers, IFC_ValidateNumbers, IFC_ExportNumberPatch, IFC_ApplyNumberPatch, IFC_RevertNumberHistory,
+           IFC_RebuildNumberRegistry, IFC_ReserveNumbers, IFC_NumberingSettings, IFCNumberingTool]
 
 def register():   
     for cls in classes:
         bpy.utils.register_class(cls)
     bpy.types.Scene.ifc_numbering_settings = bpy.props.PointerProperty(type=IFC_NumberingSettings)
+    bpy.app.handlers.load_post.append(reset_numbering_context)
+    bpy.app.handlers.undo_post.append(reset_scene_caches)
+    bpy.app.handlers.redo_post.append(reset_scene_caches)
+    bpy.app.handlers.depsgraph_update_post.append(update_spatial_index)
 
 def unregister():
     for cls in reversed(classes):
         bpy.utils.unregister_class(cls)
     del bpy.types.Scene.ifc_numbering_settings
+    if reset_numbering_context in bpy.app.handlers.load_post:
+        bpy.app.handlers.load_post.remove(reset_numbering_context)
+    for handlers, handler in ((bpy.app.handlers.undo_post, reset_scene_caches), (bpy.app.handlers.redo_post, reset_scene_caches),
+                              (bpy.app.handlers.depsgraph_update_post, update_spatial_index)):
+        if handler in handlers:
+            handlers.remove(handler)
+    NumberingContext.reset()
 
 register()
\ No newline at end of file
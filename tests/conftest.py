@@ -0,0 +1,42 @@
+"""Set-up shared by the tests, which run the numbering tool on synthetic models through the stand-ins of the benchmarks.
+
+    python -m pytest tests
+"""
+
+import os
+import sys
+
+import pytest
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [REPO_DIR, os.path.join(REPO_DIR, "benchmarks")]
+
+import blender_stub
+
+bpy = blender_stub.install()
+
+import numbering_tool as nt
+from synthetic_model import generate_model
+
+
+@pytest.fixture
+def load_model():
+    """Load a synthetic model with default settings, returning the IFC file"""
+    def load(elements=400, storeys=2, types=4):
+        ifc_file, objects = generate_model(elements, storeys, types)
+        blender_stub.load_file(ifc_file, objects)
+        bpy.context.scene.ifc_numbering_settings = nt.IFC_NumberingSettings()
+        return ifc_file
+    yield load
+    nt.NumberAllocation.backend = None
+    blender_stub.IfcStore.path = ""
+
+
+def get_props(settings=None):
+    """Get the properties of a settings dictionary, missing settings taking their defaults"""
+    return nt.Settings.to_props({**nt.Settings.get_defaults(), **(settings or {})})
+
+
+def get_numbers(elements, attribute="Tag"):
+    """Get the numbers of the elements by GlobalId"""
+    return {element.GlobalId: getattr(element, attribute) for element in elements}
@@ -0,0 +1,51 @@
+"""Tests of the allocation store and of numbering split files with the numbers it reserves."""
+
+import json
+
+from allocation_service import AllocationStore
+
+import blender_stub
+import bpy
+import numbering_tool as nt
+from synthetic_model import generate_model
+
+
+def test_allocation_store_reserve(tmp_path):
+    path = str(tmp_path / "allocations.json")
+    store = AllocationStore(path)
+    assert store.reserve({"W-": 3, "C-": 2}, "a") == {"W-": (1, 4), "C-": (1, 3)}
+    assert store.reserve({"W-": 2, "C-": 0}, "b") == {"W-": (4, 6)}
+    assert store.reserve({"C-": 0}) == {}
+
+    reloaded = AllocationStore(path)
+    assert reloaded.data["next"] == {"W-": 6, "C-": 3}
+    assert [reservation["owner"] for reservation in reloaded.data["reservations"]] == ["a", "b"]
+    assert reloaded.reserve({"W-": 1}) == {"W-": (6, 7)}
+    with open(path) as f:
+        assert json.load(f)["next"]["W-"] == 7
+
+
+def number_split_file(ifc_file, objects, settings):
+    blender_stub.load_file(ifc_file, objects)
+    bpy.context.scene.ifc_numbering_settings = nt.IFC_NumberingSettings()
+    result = nt.number_elements(ifc_file, ifc_file.by_type("IfcElement"), settings)
+    assert result.status == {'FINISHED'}
+    return {element.GlobalId: element.Tag for element in ifc_file.by_type("IfcElement")}
+
+
+def test_number_split_files_with_allocation(load_model):
+    store = nt.NumberAllocation.backend = AllocationStore()
+    settings = {"format": "W-{E}", "allocation_toggle": True, "allocation_batch": 10}
+    first_file, first_objects = generate_model(30, 1, 1, seed=1)
+    second_file, second_objects = generate_model(20, 1, 1, seed=2)
+
+    first = number_split_file(first_file, first_objects, settings)
+    second = number_split_file(second_file, second_objects, settings)
+    assert sorted(int(number[2:]) for number in first.values()) == list(range(1, 31))
+    assert sorted(int(number[2:]) for number in second.values()) == list(range(31, 51))
+    assert store.data["next"] == {"W-": 51}
+
+    # Renumbering keeps the numbers allocated to the file, read back from the project, without another request
+    assert number_split_file(first_file, first_objects, settings) == first
+    assert store.data["next"] == {"W-": 51}
+    assert len(store.data["reservations"]) == 2
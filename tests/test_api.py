@@ -0,0 +1,52 @@
+"""Tests of numbering elements with the Python API, without the operator or selection."""
+
+import ifcopenshell
+import pytest
+
+import blender_stub
+import numbering_tool as nt
+from conftest import get_numbers
+
+
+def remove_objects(elements):
+    for element in elements:
+        blender_stub.Ifc.objects_by_id.pop(element.id(), None)
+
+
+@pytest.mark.parametrize("location_type", ["BOUNDING_BOX", "CENTER"])
+def test_number_elements_without_objects(load_model, location_type):
+    ifc_file = load_model(60, 3, 3)
+    elements = ifc_file.by_type("IfcElement")
+    settings = {"format": "{S}-{E}", "location_type": location_type}
+    nt.number_elements(ifc_file, elements, {**settings, "location_type": "BOUNDING_BOX"})
+    expected = get_numbers(elements)
+
+    # Elements and storeys without objects are located by the origin of their placement, the minimum corner of their box
+    remove_objects(elements[::2] + ifc_file.by_type("IfcBuildingStorey"))
+    for element in elements:
+        element.Tag = None
+    result = nt.number_elements(ifc_file, elements, settings)
+    assert result.status == {'FINISHED'}
+    assert not result.warnings
+    if location_type == "BOUNDING_BOX":
+        assert get_numbers(elements) == expected
+    else:
+        assert sorted(get_numbers(elements).values()) == sorted(expected.values())
+        assert all(element.Tag.partition("-")[0] == expected[element.GlobalId].partition("-")[0] for element in elements)
+
+
+def test_number_elements_without_objects_with_filter(load_model):
+    ifc_file = load_model(40, 1, 2)
+    elements = ifc_file.by_type("IfcElement")
+    remove_objects(elements)
+    nt.number_elements(ifc_file, elements, {"format": "W{E}", "filter_expression": "IfcWall"})
+    walls = ifc_file.by_type("IfcWall")
+    assert sorted(int(wall.Tag[1:]) for wall in walls) == list(range(1, len(walls) + 1))
+    assert all(element.Tag is None for element in elements if not element.is_a("IfcWall"))
+
+
+def test_number_elements_of_another_file(load_model):
+    load_model(10, 1, 1)
+    other_file = ifcopenshell.file(schema="IFC4")
+    with pytest.raises(ValueError):
+        nt.number_elements(other_file, [], {"format": "{E}"})
@@ -0,0 +1,33 @@
+"""Tests of the batch numbering driver, with the numbering of a file run in-process instead of in a Blender worker."""
+
+import blender_stub
+import bpy
+import batch_numbering
+import numbering_tool as nt
+from synthetic_model import generate_model
+
+
+def test_number_file_with_selection_profile(tmp_path, monkeypatch):
+    ifc_file, objects = generate_model(40, 2, 2)
+
+    def load_project(filepath):
+        blender_stub.load_file(ifc_file, objects)
+        bpy.context.scene.ifc_numbering_settings = nt.IFC_NumberingSettings()
+
+    monkeypatch.setattr(batch_numbering, "load_project", load_project)
+    output_path = str(tmp_path / "numbered.ifc")
+    # Nothing is selected in a worker, so the selection setting of the profile is ignored
+    settings = {"selected_toggle": True, "selected_types": ["All"], "format": "B{E}"}
+    row = batch_numbering.number_file(nt, "model.ifc", settings, output_path)
+    assert row["status"] == "numbered"
+    assert row["numbered"] == row["elements"] == 40
+    assert row["duplicates"] == 0
+    assert sorted(element.Tag for element in ifc_file.by_type("IfcElement")) == sorted(f"B{i}" for i in range(1, 41))
+    assert (tmp_path / "numbered.ifc").exists()
+
+
+def test_chunks_mix_file_sizes():
+    files = [f"file{i}" for i in range(10)]
+    chunks = batch_numbering.get_chunks(files, 3, 2)
+    assert chunks == [files[0::5], files[1::5], files[2::5], files[3::5], files[4::5]]
+    assert batch_numbering.get_chunks(files, 4, 20) == [files[0::4], files[1::4], files[2::4], files[3::4]]
@@ -0,0 +1,52 @@
+"""Tests of numbering grid axes from the grid structure."""
+
+import random
+
+import ifcopenshell.guid
+
+import bpy
+import numbering_tool as nt
+
+
+def add_grid(ifc_file, u_offsets, v_offsets):
+    """Add a grid with U axes along Y at the X offsets and V axes along X at the Y offsets, in the given order"""
+    def add_axis(start, end):
+        curve = ifc_file.createIfcPolyline([ifc_file.createIfcCartesianPoint(start), ifc_file.createIfcCartesianPoint(end)])
+        return ifc_file.createIfcGridAxis(None, curve, True)
+
+    u_axes = [add_axis((x, -10.0), (x, 10.0)) for x in u_offsets]
+    v_axes = [add_axis((-10.0, y), (10.0, y)) for y in v_offsets]
+    return ifc_file.createIfcGrid(ifcopenshell.guid.new(), None, "Grid", UAxes=u_axes, VAxes=v_axes)
+
+
+def number_grids(props):
+    props.grid_toggle = True
+    props.parent_type = "Other"
+    props.parent_type_other = "IfcGridAxis"
+    return nt.IFC_AssignNumbers().execute(bpy.context)
+
+
+def test_number_grid_axes_in_order(load_model):
+    ifc_file = load_model(10, 1, 1)
+    offsets = [0.0, 6.0, 12.0, 18.0, 24.0]
+    u_offsets, v_offsets = random.Random(0).sample(offsets, 5), random.Random(1).sample(offsets[:3], 3)
+    grid = add_grid(ifc_file, u_offsets, v_offsets)
+    assert number_grids(bpy.context.scene.ifc_numbering_settings) == {'FINISHED'}
+    assert {axis.AxisTag: axis.AxisCurve.Points[0].Coordinates[0] for axis in grid.UAxes} == \
+        {"1": 0.0, "2": 6.0, "3": 12.0, "4": 18.0, "5": 24.0}
+    assert {axis.AxisTag: axis.AxisCurve.Points[0].Coordinates[1] for axis in grid.VAxes} == {"A": 0.0, "B": 6.0, "C": 12.0}
+
+
+def test_grid_numbers_not_in_patch_or_history(load_model):
+    ifc_file = load_model(10, 1, 1)
+    add_grid(ifc_file, [0.0, 5.0], [0.0, 5.0])
+    props = bpy.context.scene.ifc_numbering_settings
+    props.history_toggle = True
+    assert number_grids(props) == {'FINISHED'}
+    assert all(not numbers for numbers in nt.NumberPatch.get_changes().values())
+    assert nt.NumberHistory.get_entries() == []
+
+    nt.number_elements(ifc_file, ifc_file.by_type("IfcElement"), {"format": "E{E}"})
+    numbers = [number for numbers in nt.NumberPatch.get_changes().values() for number in numbers]
+    assert sorted(numbers) == sorted(element.GlobalId for element in ifc_file.by_type("IfcElement"))
+    assert len(nt.NumberHistory.get_entries()) == 1
@@ -0,0 +1,42 @@
+"""Tests of numbering the parts of assemblies within their parent."""
+
+import ifcopenshell.guid
+
+import blender_stub
+import bpy
+import numbering_tool as nt
+from synthetic_model import box_corners, generate_model
+
+
+def load_assembly_model(elements=12, parts=3):
+    """Load a model of walls with the first walls aggregated in an assembly, returning the IFC file, assembly and parts"""
+    ifc_file, objects = generate_model(elements, 1, 1)
+    walls = ifc_file.by_type("IfcWall")
+    assembly = ifc_file.createIfcElementAssembly(ifcopenshell.guid.new(), None, "Assembly")
+    ifc_file.createIfcRelAggregates(ifcopenshell.guid.new(), None, None, None, assembly, tuple(walls[:parts]))
+    objects.append(blender_stub.Object("IfcElementAssembly/Assembly", blender_stub.Matrix.Translation((-10.0, 0.0, 0.0)),
+                                       box_corners((1.0, 1.0, 1.0)), assembly.id()))
+    blender_stub.load_file(ifc_file, objects)
+    bpy.context.scene.ifc_numbering_settings = nt.IFC_NumberingSettings()
+    return ifc_file, assembly, walls[:parts]
+
+
+def test_number_parts_within_assembly(load_model):
+    ifc_file, assembly, parts = load_assembly_model()
+    elements = ifc_file.by_type("IfcElement")
+    nt.number_elements(ifc_file, elements, {"format": "A{E}"})
+    part_order = sorted(parts, key=lambda part: int(part.Tag[1:]))
+
+    result = nt.number_elements(ifc_file, elements, {"format": "A{E}", "hierarchy_toggle": True, "part_format": "{P}-{E}"})
+    assert result.status == {'FINISHED'}
+    assert [part.Tag for part in part_order] == [f"{assembly.Tag}-{i}" for i in range(1, len(parts) + 1)]
+    others = [element.Tag for element in elements if element not in parts]
+    assert sorted(others, key=lambda tag: int(tag[1:])) == [f"A{i}" for i in range(1, len(others) + 1)]
+
+
+def test_number_parts_of_unnumbered_assembly(load_model):
+    ifc_file, assembly, parts = load_assembly_model()
+    walls = ifc_file.by_type("IfcWall")
+    nt.number_elements(ifc_file, walls, {"format": "A{E}", "hierarchy_toggle": True})
+    assert assembly.Tag is None
+    assert sorted(int(wall.Tag[1:]) for wall in walls) == list(range(1, len(walls) + 1))
@@ -0,0 +1,53 @@
+"""Tests of the numbering history."""
+
+import json
+
+import blender_stub
+import bpy
+import numbering_tool as nt
+
+
+def test_history_revert_patch(load_model):
+    settings = {"save_type": "Attribute", "attribute_name": "Tag"}
+    entries = [
+        {"changes": [{"settings": settings, "numbers": [["a", None, "A1"]]}]},
+        {"changes": [{"settings": settings, "numbers": [["a", "A1", "A2"], ["b", None, "B1"]]}]},
+    ]
+    patch = nt.NumberHistory.get_revert_patch(entries)
+    assert len(patch["changes"]) == 1
+    numbers = {element_id: (latest, target, set(values)) for element_id, latest, target, values in patch["changes"][0]["numbers"]}
+    assert numbers == {"a": ("A2", None, {None, "A1", "A2"}), "b": ("B1", None, {None, "B1"})}
+    patch = nt.NumberHistory.get_revert_patch(entries[1:])
+    numbers = {element_id: (latest, target) for element_id, latest, target, _ in patch["changes"][0]["numbers"]}
+    assert numbers == {"a": ("A2", "A1"), "b": ("B1", None)}
+
+
+def test_history_revert_restores_numbers(load_model):
+    ifc_file = load_model(50, 1, 1)
+    elements = ifc_file.by_type("IfcElement")
+    bpy.context.scene.ifc_numbering_settings.history_toggle = True
+    nt.number_elements(ifc_file, elements, {"format": "A{E}"})
+    first = {element.GlobalId: element.Tag for element in elements}
+    nt.number_elements(ifc_file, elements, {"format": "B{E}"})
+    log = nt.MessageLog()
+    profiles = nt.NumberHistory.revert(log, bpy.context.scene.ifc_numbering_settings, 0)
+    assert profiles is not None
+    assert {element.GlobalId: element.Tag for element in elements} == first
+    assert len(nt.NumberHistory.get_entries()) == 2
+
+
+
+def test_history_file_kept_across_sessions(load_model, tmp_path):
+    ifc_file = load_model(20, 1, 1)
+    blender_stub.IfcStore.path = str(tmp_path / "model.ifc")
+    elements = ifc_file.by_type("IfcElement")
+    bpy.context.scene.ifc_numbering_settings.history_toggle = True
+    nt.number_elements(ifc_file, elements, {"format": "A{E}"})
+    nt.number_elements(ifc_file, elements[:5], {"format": "B{E}"})
+    with open(blender_stub.IfcStore.path + nt.NumberHistory.file_suffix) as f:
+        entries = [json.loads(line) for line in f]
+    assert [len(entry["changes"][0]["numbers"]) for entry in entries] == [20, 5]
+
+    # A new session reads the history back from the file
+    nt.NumberingContext.reset()
+    assert nt.NumberHistory.get_entries() == entries
@@ -0,0 +1,160 @@
+"""Tests of the numbering order: the axes with their precision clusters, paths, serpentine rows and nearest neighbours."""
+
+import functools
+import random
+import types
+
+import numpy as np
+import pytest
+
+import blender_stub
+import bpy
+import numbering_tool as nt
+from conftest import get_props
+
+
+def get_order(elements):
+    """Get the GlobalIds of the elements in the order of their {E} numbers"""
+    return [element.GlobalId for element in sorted(elements, key=lambda element: int(element.Tag))]
+
+
+def get_locations(elements, props):
+    return [tuple(nt.ObjectGeometry.get_object_location(nt.tool.Ifc.get_object(element), props)) for element in elements]
+
+
+def add_path_object(points, name="Path"):
+    """Add a stand-in mesh with a chain of edges through the points to the scene"""
+    data = types.SimpleNamespace(vertices=[types.SimpleNamespace(co=point) for point in points],
+                                 edges=[types.SimpleNamespace(vertices=(i, i + 1)) for i in range(len(points) - 1)])
+    obj = blender_stub.Object(name, blender_stub.Matrix.Identity(), [], type="MESH", data=data)
+    bpy.context.scene.objects.append(obj)
+    return obj
+
+
+def cmp_within_precision(a, b, props, use_dir=True):
+    """Comparator of the sorting before the precision clusters, kept as the reference of the numbering order"""
+    direction = (int(props.x_direction), int(props.y_direction), int(props.z_direction)) if use_dir else (1, 1, 1)
+    for axis in props.axis_order:
+        idx = "XYZ".index(axis)
+        diff = (a[idx] - b[idx]) * direction[idx]
+        if 1000 * abs(diff) > props.precision[idx]:
+            return 1 if diff > 0 else -1
+    return 0
+
+
+@pytest.mark.parametrize("location_type", ["CENTER", "BOUNDING_BOX"])
+def test_sort_matches_comparator(load_model, location_type):
+    ifc_file = load_model()
+    elements = ifc_file.by_type("IfcElement")
+    settings = {"location_type": location_type}
+    props = get_props(settings)
+    objects = {element: nt.tool.Ifc.get_object(element) for element in elements}
+    locations = {element: nt.ObjectGeometry.get_object_location(objects[element], props) for element in elements}
+    dimensions = {element: nt.ObjectGeometry.get_object_dimensions(objects[element]) for element in elements}
+    expected = sorted(elements, key=functools.cmp_to_key(lambda a, b: cmp_within_precision(dimensions[a], dimensions[b], props, use_dir=False)))
+    expected.sort(key=functools.cmp_to_key(lambda a, b: cmp_within_precision(locations[a], locations[b], props)))
+
+    nt.number_elements(ifc_file, elements, {**settings, "format": "{E}"})
+    assert get_order(elements) == [element.GlobalId for element in expected]
+    # Type numbers count in the same order within each class
+    nt.number_elements(ifc_file, elements, {**settings, "format": "{T}"})
+    for ifc_class in {element.is_a() for element in elements}:
+        assert get_order(ifc_file.by_type(ifc_class)) == [element.GlobalId for element in expected if element.is_a() == ifc_class]
+
+
+def test_shuffled_grid_numbers_identically(load_model):
+    ifc_file = load_model(900, 1, 3)
+    elements = ifc_file.by_type("IfcElement")
+    nt.number_elements(ifc_file, elements, {"format": "{E}"})
+    numbers = {element.GlobalId: element.Tag for element in elements}
+    shuffled = list(elements)
+    for seed in range(3):
+        random.Random(seed).shuffle(shuffled)
+        nt.number_elements(ifc_file, shuffled, {"format": "E{E}"})
+        assert {element.GlobalId: element.Tag[1:] for element in elements} == numbers
+
+
+def test_project_on_path_matches_brute_force():
+    rng = np.random.default_rng(0)
+    path = np.cumsum(rng.uniform(-1, 1, (300, 3)), axis=0)
+    points = rng.uniform(path.min(axis=0), path.max(axis=0), (500, 3))
+    distances, offsets = nt.PathOrder.project(points, path)
+
+    starts, vectors = path[:-1], np.diff(path, axis=0)
+    t = np.clip(np.einsum("pij,ij->pi", points[:, None] - starts, vectors) / np.einsum("ij,ij->i", vectors, vectors), 0, 1)
+    squared = np.sum((starts + t[..., None] * vectors - points[:, None]) ** 2, axis=2)
+    closest = squared.argmin(axis=1)
+    lengths = np.r_[0.0, np.cumsum(np.linalg.norm(vectors, axis=1))]
+    along = lengths[closest] + t[np.arange(len(points)), closest] * np.linalg.norm(vectors[closest], axis=1)
+    assert np.sqrt(squared.min(axis=1)) == pytest.approx(offsets)
+    assert along == pytest.approx(distances)
+
+
+@pytest.mark.parametrize("path_reverse", [False, True])
+def test_number_along_path(load_model, path_reverse):
+    ifc_file = load_model(64, 1, 2)
+    elements = ifc_file.by_type("IfcElement")
+    # A path running along the rows against the X axis, and back along the next row, numbers the rows in turns
+    add_path_object([(40.0, 0.0, 0.0), (-5.0, 0.0, 0.0), (-5.0, 5.0, 0.0), (40.0, 5.0, 0.0)])
+    settings = {"order_mode": "PATH", "path": "OBJECT/Path", "path_reverse": path_reverse, "format": "{E}"}
+    result = nt.number_elements(ifc_file, elements, settings)
+    assert result.numbered == len(elements)
+
+    props = get_props(settings)
+    ordered = sorted(elements, key=lambda element: int(element.Tag), reverse=path_reverse)
+    locations = get_locations(ordered, props)
+    first_rows = [location for location in locations if location[1] < 2.5]
+    assert [round(y / 5) for _, y, _ in locations[:len(first_rows)]] == [0] * len(first_rows)
+    assert all(b[0] <= a[0] + 0.001 for a, b in zip(first_rows, first_rows[1:]))
+    second_row = [location for location in locations if 2.5 < location[1] < 7.5]
+    assert all(b[0] >= a[0] - 0.001 for a, b in zip(second_row, second_row[1:]))
+
+
+def test_number_along_missing_path(load_model):
+    ifc_file = load_model(10, 1, 1)
+    result = nt.number_elements(ifc_file, ifc_file.by_type("IfcElement"), {"order_mode": "PATH", "path": "OBJECT/Missing"})
+    assert result.numbered == 0
+    assert result.messages[-1][0] == "ERROR"
+
+
+def get_greedy_tour(locations):
+    """Reference nearest neighbour tour, searching all unvisited locations at every step"""
+    locations = np.asarray(locations)
+    unvisited = np.ones(len(locations), dtype=bool)
+    order = [0]
+    unvisited[0] = False
+    while unvisited.any():
+        distances = np.where(unvisited, np.linalg.norm(locations - locations[order[-1]], axis=1), np.inf)
+        order.append(int(distances.argmin()))
+        unvisited[order[-1]] = False
+    return order
+
+
+@pytest.mark.parametrize("clusters", [1, 5])
+def test_nearest_neighbour_order_matches_greedy_tour(clusters):
+    rng = np.random.default_rng(clusters)
+    # Dense clusters far apart make the tour pass many visited locations on the way to the next cluster
+    centres = rng.uniform(0, 1000, (clusters, 3))
+    locations = (centres[rng.integers(clusters, size=400)] + rng.normal(0, 1, (400, 3))).tolist()
+    assert nt.ObjectGeometry.get_nearest_neighbour_order(locations) == get_greedy_tour(locations)
+
+
+def test_serpentine_order(load_model):
+    ifc_file = load_model(9, 1, 1)
+    elements = ifc_file.by_type("IfcElement")
+    nt.number_elements(ifc_file, elements, {"order_mode": "SERPENTINE", "format": "{E}"})
+    locations = get_locations(sorted(elements, key=lambda element: int(element.Tag)), get_props())
+    rows = [[round(x / 5) for x, _, _ in locations[row * 3:row * 3 + 3]] for row in range(3)]
+    assert rows == [[0, 1, 2], [2, 1, 0], [0, 1, 2]]
+    assert [round(y / 5) for _, y, _ in locations] == [0, 0, 0, 1, 1, 1, 2, 2, 2]
+
+
+def test_nearest_neighbour_numbering(load_model):
+    ifc_file = load_model(16, 1, 1)
+    elements = ifc_file.by_type("IfcElement")
+    nt.number_elements(ifc_file, elements, {"format": "{E}"})
+    axis_locations = get_locations(sorted(elements, key=lambda element: int(element.Tag)), get_props())
+    nt.number_elements(ifc_file, elements, {"order_mode": "NEAREST", "format": "{E}"})
+    locations = get_locations(sorted(elements, key=lambda element: int(element.Tag)), get_props())
+    # The tour starts at the first element in the axis order
+    assert locations == [axis_locations[i] for i in get_greedy_tour(axis_locations)]
@@ -0,0 +1,63 @@
+"""Tests of exporting the changed numbers as a patch and applying it to another copy of the model."""
+
+import ifcopenshell
+
+import blender_stub
+import bpy
+import numbering_tool as nt
+from conftest import get_numbers
+
+
+def number_and_export(load_model, tmp_path, filename="patch.json"):
+    """Number a model with the operator and export the patch, returning the model, a copy of it before numbering and the
+    patch path"""
+    ifc_file = load_model(40, 2, 2)
+    copy = ifcopenshell.file.from_string(ifc_file.to_string())
+    props = bpy.context.scene.ifc_numbering_settings
+    props.selected_types = {"All"}
+    props.format = "P{E}"
+    assert nt.IFC_AssignNumbers().execute(bpy.context) == {'FINISHED'}
+    filepath = str(tmp_path / filename)
+    assert nt.NumberPatch.export(nt.MessageLog(), filepath) == {'FINISHED'}
+    return ifc_file, copy, filepath
+
+
+def load_copy(copy):
+    blender_stub.load_file(copy, [])
+    bpy.context.scene.ifc_numbering_settings = nt.IFC_NumberingSettings()
+    return bpy.context.scene.ifc_numbering_settings
+
+
+def test_patch_round_trip(load_model, tmp_path):
+    ifc_file, copy, filepath = number_and_export(load_model, tmp_path, "patch.json.gz")
+    props = load_copy(copy)
+    operator = nt.IFC_ApplyNumberPatch()
+    assert nt.NumberPatch.execute_with_undo(operator, props, filepath) == {'FINISHED'}
+    assert get_numbers(copy.by_type("IfcElement")) == get_numbers(ifc_file.by_type("IfcElement"))
+
+    operator.rollback(operator.transaction_data)
+    assert all(element.Tag is None for element in copy.by_type("IfcElement"))
+
+
+def test_patch_skips_conflicts_unless_forced(load_model, tmp_path):
+    ifc_file, copy, filepath = number_and_export(load_model, tmp_path)
+    props = load_copy(copy)
+    changed = copy.by_type("IfcElement")[0]
+    changed.Tag = "Changed"
+    log = nt.MessageLog()
+    profiles = nt.NumberPatch.apply(log, props, nt.NumberPatch.read(log, filepath))
+    assert changed.Tag == "Changed"
+    assert len(profiles[0]["new_value"]) == len(copy.by_type("IfcElement")) - 1
+    assert ("WARNING", "Skipped 1 elements with a number changed since the patch was made.") in log.messages
+
+    nt.NumberPatch.apply(log, props, nt.NumberPatch.read(log, filepath), force=True)
+    assert get_numbers(copy.by_type("IfcElement")) == get_numbers(ifc_file.by_type("IfcElement"))
+
+
+def test_patch_drops_numbers_changed_back(load_model, tmp_path):
+    ifc_file, _, filepath = number_and_export(load_model, tmp_path)
+    operator = nt.IFC_RemoveNumbers()
+    assert operator.execute(bpy.context) == {'FINISHED'}
+    log = nt.MessageLog()
+    assert nt.NumberPatch.export(log, str(tmp_path / "empty.json")) == {'CANCELLED'}
+    assert log.messages[-1][0] == "WARNING"
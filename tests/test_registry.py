@@ -0,0 +1,46 @@
+"""Tests of the number registry in the IFC project."""
+
+import numbering_tool as nt
+
+
+def test_registry_claim_and_release(load_model):
+    load_model(10, 1, 1)
+    scope = "IfcElement/Attribute/Tag"
+    assert nt.NumberRegistry.claim(scope, "N01") == "N01"
+    assert nt.NumberRegistry.claim(scope, "N01") == "N02"
+    assert nt.NumberRegistry.claim("IfcElement/Attribute/Description", "N01") == "N01"
+    nt.NumberRegistry.release(scope, "N01")
+    assert nt.NumberRegistry.claim(scope, "N01") == "N01"
+    assert nt.NumberRegistry.claim(scope, "no digits") == "no digits"
+
+    reserved = nt.NumberRegistry.reserve(scope, "N", 5, "other")
+    assert reserved == range(3, 8)
+    assert nt.NumberRegistry.claim(scope, "N04") == "N08"
+    assert nt.NumberRegistry.claim(scope, "N04", "other") == "N04"
+
+    nt.NumberRegistry.save()
+    nt.NumberRegistry.entries = None
+    entry = nt.NumberRegistry.get_entry(scope, "N")
+    assert entry["used"] == {1, 2, 4, 8}
+    assert entry["next"] == 9
+    assert entry["reserved"] == [[3, 8, "other"]]
+
+
+def test_registry_is_kept_per_storage(load_model):
+    ifc_file = load_model(20, 1, 1)
+    elements = ifc_file.by_type("IfcElement")
+    settings = {"format": "N{E}", "registry_toggle": True}
+    nt.number_elements(ifc_file, elements, settings)
+    nt.number_elements(ifc_file, elements, {**settings, "attribute_name": "Description"})
+    assert {element.Tag for element in elements} == {element.Description for element in elements}
+    result = nt.number_elements(ifc_file, elements, settings)
+    assert result.numbered == 0
+
+
+def test_registry_skips_reserved_numbers(load_model):
+    ifc_file = load_model(3, 1, 1)
+    elements = ifc_file.by_type("IfcElement")
+    nt.NumberRegistry.reserve("IfcElement/Attribute/Tag", "N", 2, "other")
+    nt.NumberRegistry.save()
+    nt.number_elements(ifc_file, elements, {"format": "N{E}", "registry_toggle": True})
+    assert sorted(element.Tag for element in elements) == ["N3", "N4", "N5"]
@@ -0,0 +1,101 @@
+"""Tests of the schedule export and of importing numbers from a table."""
+
+import csv
+import json
+
+import pytest
+
+import bpy
+import numbering_tool as nt
+
+
+@pytest.mark.parametrize("file_format", ["CSV", "JSONL"])
+def test_export_schedule(load_model, tmp_path, file_format):
+    ifc_file = load_model(60, 2, 3)
+    elements = ifc_file.by_type("IfcElement")
+    nt.number_elements(ifc_file, elements[:40], {"format": "N{E}"})
+    props = bpy.context.scene.ifc_numbering_settings
+    props.selected_types = {"All"}
+    filepath = str(tmp_path / f"schedule{nt.Schedule.file_formats[file_format]}")
+    log = nt.MessageLog()
+    assert nt.Schedule.export(log, props, filepath) == {'FINISHED'}
+
+    with open(filepath, newline="") as f:
+        rows = list(csv.DictReader(f)) if file_format == "CSV" else [json.loads(line) for line in f]
+    assert len(rows) == len(elements)
+    rows = {row["GlobalId"]: row for row in rows}
+    for element in elements:
+        row = rows[element.GlobalId]
+        location = nt.ObjectGeometry.get_object_location(nt.tool.Ifc.get_object(element), props)
+        assert row["IfcClass"] == element.is_a()
+        assert row["TypeName"] == nt.get_type(element).Name
+        assert row["Storey"] == element.ContainedInStructure[0].RelatingStructure.Name
+        assert (row["Number"] or None) == element.Tag
+        assert [float(row[axis]) for axis in "XYZ"] == pytest.approx(list(location))
+
+
+def test_export_schedule_of_selected_types(load_model, tmp_path):
+    ifc_file = load_model(60, 1, 3)
+    props = bpy.context.scene.ifc_numbering_settings
+    props.selected_types = {"IfcWall", "IfcBeam"}
+    filepath = str(tmp_path / "schedule.csv")
+    assert nt.Schedule.export(nt.MessageLog(), props, filepath) == {'FINISHED'}
+    with open(filepath, newline="") as f:
+        rows = list(csv.DictReader(f))
+    assert sorted(row["GlobalId"] for row in rows) == sorted(element.GlobalId for ifc_class in ("IfcWall", "IfcBeam")
+                                                             for element in ifc_file.by_type(ifc_class))
+
+
+def write_table(filepath, rows):
+    with open(filepath, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["GlobalId", "Number"])
+        writer.writerows(rows)
+
+
+def test_import_numbers_round_trip(load_model, tmp_path):
+    ifc_file = load_model(30, 1, 2)
+    elements = ifc_file.by_type("IfcElement")
+    props = bpy.context.scene.ifc_numbering_settings
+    filepath = str(tmp_path / "numbers.csv")
+    write_table(filepath, [(element.GlobalId, f"I{i:02d}") for i, element in enumerate(elements)])
+
+    operator = nt.IFC_ImportNumbers()
+    assert nt.Schedule.execute_with_undo(operator, props, filepath) == {'FINISHED'}
+    assert [element.Tag for element in elements] == [f"I{i:02d}" for i in range(len(elements))]
+    operator.rollback(operator.transaction_data)
+    assert all(element.Tag is None for element in elements)
+    operator.commit(operator.transaction_data)
+    assert elements[0].Tag == "I00"
+
+    # Importing the same table again changes no numbers
+    operator = nt.IFC_ImportNumbers()
+    assert nt.Schedule.execute_with_undo(operator, props, filepath) == {'FINISHED'}
+    assert not operator.transaction_data["new_value"]
+
+
+def test_import_numbers_reports_unmatched_and_duplicates(load_model, tmp_path):
+    ifc_file = load_model(10, 1, 1)
+    elements = ifc_file.by_type("IfcElement")
+    filepath = str(tmp_path / "numbers.csv")
+    write_table(filepath, [(elements[0].GlobalId, "A"), ("0000000000000000000000", "B"), (elements[1].GlobalId, "A"),
+                           (elements[0].GlobalId, "C"), (elements[2].GlobalId, "")])
+    elements[2].Tag = "old"
+    log = nt.MessageLog()
+    summary = nt.Schedule.import_numbers(log, bpy.context.scene.ifc_numbering_settings, filepath)
+    assert summary["unmatched"] == ["0000000000000000000000"]
+    assert summary["duplicate_ids"] == [elements[0].GlobalId]
+    assert summary["duplicate_numbers"] == []
+    assert (elements[0].Tag, elements[1].Tag, elements[2].Tag) == ("C", "A", None)
+    assert summary["written"] == 3
+    assert [level for level, _ in log.messages] == ["WARNING", "WARNING", "INFO"]
+
+
+def test_import_numbers_with_missing_columns(load_model, tmp_path):
+    load_model(5, 1, 1)
+    filepath = str(tmp_path / "numbers.jsonl")
+    with open(filepath, "w") as f:
+        f.write(json.dumps({"Id": "x", "Number": "1"}) + "\n")
+    log = nt.MessageLog()
+    assert nt.Schedule.import_numbers(log, bpy.context.scene.ifc_numbering_settings, filepath) is None
+    assert log.messages[0][0] == "ERROR"
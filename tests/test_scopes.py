@@ -0,0 +1,64 @@
+"""Tests of restarting the element numbers per storey, spatial container or property value."""
+
+import ifcopenshell.api
+import ifcopenshell.guid
+import pytest
+
+import numbering_tool as nt
+
+
+def get_scope_numbers(elements, get_key):
+    """Get the sorted element numbers of the elements by scope key, from numbers ending in -{E}"""
+    numbers = {}
+    for element in elements:
+        numbers.setdefault(get_key(element), []).append(int(element.Tag.rpartition("-")[2]))
+    return {key: sorted(values) for key, values in numbers.items()}
+
+
+def assert_restarted(numbers):
+    for values in numbers.values():
+        assert values == list(range(1, len(values) + 1))
+
+
+def test_restart_per_storey(load_model):
+    ifc_file = load_model(60, 3, 2)
+    elements = ifc_file.by_type("IfcElement")
+    nt.number_elements(ifc_file, elements, {"format": "{S}-{E}", "scope": "STOREY"})
+    numbers = get_scope_numbers(elements, lambda element: element.Tag.partition("-")[0])
+    assert sorted(numbers) == ["0", "1", "2"]
+    assert_restarted(numbers)
+
+
+def test_restart_per_container(load_model):
+    ifc_file = load_model(40, 2, 2)
+    storey = ifc_file.by_type("IfcBuildingStorey")[0]
+    rel = storey.ContainsElements[0]
+    space = ifc_file.createIfcSpace(ifcopenshell.guid.new(), None, "Space")
+    ifc_file.createIfcRelAggregates(ifcopenshell.guid.new(), None, None, None, storey, (space,))
+    ifc_file.createIfcRelContainedInSpatialStructure(ifcopenshell.guid.new(), None, None, None, rel.RelatedElements[:5], space)
+    rel.RelatedElements = rel.RelatedElements[5:]
+
+    elements = ifc_file.by_type("IfcElement")
+    nt.number_elements(ifc_file, elements, {"format": "{S}-{E}", "scope": "CONTAINER", "storey_mode": "INFERRED"})
+    numbers = get_scope_numbers(elements, lambda element: element.ContainedInStructure[0].RelatingStructure.Name)
+    assert {key: len(values) for key, values in numbers.items()} == {"Space": 5, "Storey 00": 15, "Storey 01": 20}
+    assert_restarted(numbers)
+    # The elements of the space take the storey of the space for {S}
+    assert all(element.Tag.startswith("0-") for element in space.ContainsElements[0].RelatedElements)
+
+
+@pytest.mark.parametrize("scope_property", ["Pset_Numbering.Zone", "Pset_Numbering.Missing"])
+def test_restart_per_property_value(load_model, scope_property):
+    ifc_file = load_model(30, 1, 2)
+    elements = ifc_file.by_type("IfcElement")
+    for i, element in enumerate(elements):
+        pset = ifcopenshell.api.run("pset.add_pset", ifc_file, product=element, name="Pset_Numbering")
+        ifcopenshell.api.run("pset.edit_pset", ifc_file, pset=pset, properties={"Zone": "AB"[i % 2]})
+    nt.number_elements(ifc_file, elements, {"format": "Z-{E}", "scope": "PROPERTY", "scope_property": scope_property})
+    if scope_property.endswith("Missing"):
+        # Elements without the property are numbered in one sequence
+        numbers = get_scope_numbers(elements, lambda element: None)
+    else:
+        numbers = get_scope_numbers(elements, lambda element: nt.get_pset(element, "Pset_Numbering", "Zone"))
+        assert sorted(numbers) == ["A", "B"]
+    assert_restarted(numbers)
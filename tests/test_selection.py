@@ -0,0 +1,137 @@
+"""Tests of selecting the elements to number by region and filter expression."""
+
+import subprocess
+import sys
+import types
+
+import blender_stub
+import bpy
+import numbering_tool as nt
+from conftest import REPO_DIR, get_props
+
+
+def get_centre(obj):
+    min_corner, max_corner = nt.ObjectGeometry.get_object_bbox(obj)
+    return [0.5 * (a + b) for a, b in zip(min_corner, max_corner)]
+
+
+def in_box(obj, box_min, box_max):
+    return all(low <= c <= high for c, low, high in zip(get_centre(obj), box_min, box_max))
+
+
+def update_depsgraph(*ids):
+    """Send the depsgraph updates of the given objects and collections to the handler of the numbering tool"""
+    updates = [types.SimpleNamespace(id=id, is_updated_transform=True, is_updated_geometry=False) for id in ids]
+    nt.update_spatial_index(bpy.context.scene, types.SimpleNamespace(updates=updates))
+
+
+def test_region_matches_centres_in_box(load_model):
+    load_model(300, 3, 2)
+    box = ((-1.0, 4.0, -1.0), (22.0, 31.0, 4.0))
+    props = get_props({"region_mode": "BOX", "region_min": box[0], "region_max": box[1]})
+    expected = [obj for obj in bpy.context.scene.objects if in_box(obj, *box)]
+    assert 0 < len(expected) < len(bpy.context.scene.objects)
+    # In scene order, so the numbering does not depend on the order of the cells
+    assert nt.Regions.get_region_objects(props) == expected
+
+
+def test_region_decides_by_bounding_box_centre(load_model):
+    ifc_file = load_model(4, 1, 1)
+    wall = ifc_file.by_type("IfcWall")[0]
+    obj = nt.tool.Ifc.get_object(wall)
+    min_corner, max_corner = nt.ObjectGeometry.get_object_bbox(obj)
+    centre = get_centre(obj)
+    # A box holding most of the wall but not its centre leaves the wall out, and a box holding only its centre takes it in
+    without_centre = get_props({"region_mode": "BOX", "region_min": tuple(min_corner), "region_max": (centre[0] - 0.01, *max_corner[1:])})
+    with_centre = get_props({"region_mode": "BOX", "region_min": tuple(c - 0.01 for c in centre), "region_max": tuple(c + 0.01 for c in centre)})
+    assert obj not in nt.Regions.get_region_objects(without_centre)
+    assert nt.Regions.get_region_objects(with_centre) == [obj]
+
+
+def test_region_follows_moved_added_and_deleted_objects(load_model, monkeypatch):
+    load_model(100, 1, 1)
+    box = ((-1.0, -1.0, -1.0), (6.0, 6.0, 2.0))
+    props = get_props({"region_mode": "BOX", "region_min": box[0], "region_max": box[1]})
+    objects = nt.Regions.get_region_objects(props)
+    assert objects == [obj for obj in bpy.context.scene.objects if in_box(obj, *box)]
+
+    moved = next(obj for obj in bpy.context.scene.objects if not in_box(obj, *box))
+    moved.matrix_world = blender_stub.Matrix.Translation((2.0, 2.0, 0.0))
+    update_depsgraph(moved)
+    assert moved in nt.Regions.get_region_objects(props)
+
+    deleted = objects[0]
+    bpy.context.scene.objects.remove(deleted)
+    added = blender_stub.Object("Added", blender_stub.Matrix.Translation((3.0, 3.0, 0.0)), moved.bound_box)
+    bpy.context.scene.objects.append(added)
+    centres = []
+    monkeypatch.setattr(nt.SpatialIndex, "get_centre", lambda obj: centres.append(obj) or get_centre(obj))
+    update_depsgraph(blender_stub.Collection())
+    objects = nt.Regions.get_region_objects(props)
+    assert deleted not in objects and added in objects
+    # Only the added object is located again, the other objects keep their cells
+    assert centres == [added]
+    assert objects == [obj for obj in bpy.context.scene.objects if in_box(obj, *box)]
+
+
+def test_region_selection_visits_only_region_objects(load_model, monkeypatch):
+    load_model(400, 2, 3)
+    box = ((-1.0, -1.0, -1.0), (11.0, 11.0, 2.0))
+    props = get_props({"region_mode": "BOX", "region_min": box[0], "region_max": box[1], "filter_expression": "IfcWall"})
+    region = nt.Regions.get_region_objects(props)
+    resolved = []
+    get_entity = nt.tool.Ifc.get_entity
+    monkeypatch.setattr(nt.tool.Ifc, "get_entity", lambda obj: resolved.append(obj) or get_entity(obj))
+    objects = nt.LoadSelection.load_selected_objects(props)
+    assert objects == [obj for obj in region if get_entity(obj).is_a("IfcWall")]
+    assert resolved == region
+
+
+def test_number_in_region_keeps_numbers_outside(load_model):
+    ifc_file = load_model(100, 1, 1)
+    elements = ifc_file.by_type("IfcElement")
+    nt.number_elements(ifc_file, elements, {"format": "A{E}"})
+    box = ((-1.0, -1.0, -1.0), (11.0, 11.0, 2.0))
+    props = bpy.context.scene.ifc_numbering_settings
+    props.selected_types = {"All"}
+    props.region_mode, props.region_min, props.region_max, props.format = "BOX", box[0], box[1], "R{E}"
+    assert nt.IFC_AssignNumbers().execute(bpy.context) == {'FINISHED'}
+    inside = {element for element in elements if in_box(nt.tool.Ifc.get_object(element), *box)}
+    assert inside
+    assert sorted(element.Tag for element in inside) == sorted(f"R{i}" for i in range(1, len(inside) + 1))
+    assert all(element.Tag.startswith("A") for element in elements if element not in inside)
+
+
+def test_storey_region(load_model):
+    ifc_file = load_model(60, 3, 1)
+    storey = ifc_file.by_type("IfcBuildingStorey")[1]
+    props = get_props({"region_mode": "STRUCTURE", "region_structure": storey.GlobalId})
+    elements = {nt.tool.Ifc.get_entity(obj) for obj in nt.Regions.get_region_objects(props)} - {storey}
+    assert elements == set(storey.ContainsElements[0].RelatedElements)
+
+
+def test_filter_expression(load_model):
+    ifc_file = load_model(60, 1, 3)
+    props = get_props({"filter_expression": "IfcWall, IfcBeam"})
+    objects = nt.LoadSelection.load_selected_objects(props)
+    expected = sorted(ifc_file.by_type("IfcWall") + ifc_file.by_type("IfcBeam"), key=lambda element: element.id())
+    assert [nt.tool.Ifc.get_entity(obj) for obj in objects] == expected
+
+    result = nt.number_elements(ifc_file, ifc_file.by_type("IfcElement"), {"filter_expression": "IfcWall", "format": "W{E}"})
+    assert result.numbered == len(ifc_file.by_type("IfcWall"))
+    assert all(element.Tag is None for element in ifc_file.by_type("IfcBeam"))
+
+
+def test_invalid_filter_expression(load_model):
+    ifc_file = load_model(10, 1, 1)
+    result = nt.number_elements(ifc_file, ifc_file.by_type("IfcElement"), {"filter_expression": "IfcWall, ((("})
+    assert result.numbered == 0
+    assert result.messages[-1][0] == "ERROR" and "Invalid filter expression" in result.messages[-1][1]
+
+
+def test_selector_is_imported_on_first_filter():
+    # The selector grammar is built when its module is imported, which would slow down loading the add-on
+    code = ("import sys; sys.path[:0] = [sys.argv[1], sys.argv[1] + '/benchmarks']; import blender_stub; blender_stub.install(); "
+            "import numbering_tool; print('ifcopenshell.util.selector' in sys.modules)")
+    output = subprocess.run([sys.executable, "-c", code, REPO_DIR], capture_output=True, text=True, check=True).stdout
+    assert output.strip() == "False"
@@ -0,0 +1,39 @@
+"""Tests of saving and loading settings and of batch numbering with several saved settings."""
+
+import bpy
+import numbering_tool as nt
+
+
+def test_read_settings_of_another_file(load_model):
+    ifc_file = load_model(20, 2, 1)
+    props = bpy.context.scene.ifc_numbering_settings
+    log = nt.MessageLog()
+    nt.Settings.read_settings(log, {"format": "X{E}", "region_structure": "2Storey0of0another0file", "path": "OBJECT/Missing curve"}, props)
+    assert props.format == "X{E}"
+    assert props.region_structure == ifc_file.by_type("IfcBuildingStorey")[0].GlobalId
+    assert props.path == "NONE"
+    assert [level for level, _ in log.messages] == ["WARNING", "WARNING"]
+
+    log = nt.MessageLog()
+    nt.Settings.read_settings(log, {"region_structure": ifc_file.by_type("IfcBuildingStorey")[1].GlobalId}, props)
+    assert props.region_structure == ifc_file.by_type("IfcBuildingStorey")[1].GlobalId
+    assert not log.messages
+
+
+def test_batch_numbering_with_saved_settings(load_model):
+    ifc_file = load_model(30, 1, 2)
+    props = bpy.context.scene.ifc_numbering_settings
+    props.selected_types = {"All"}
+    log = nt.MessageLog()
+    for name, settings in (("tags", {"format": "T{E}"}), ("descriptions", {"format": "D{E}", "attribute_name": "Description"})):
+        nt.Settings.read_settings(log, settings, props)
+        props.settings_name = name
+        assert nt.Settings.save_settings(log, props) == {'FINISHED'}
+    assert nt.Settings.get_settings_names() == {"tags", "descriptions"}
+
+    profiles = nt.BatchNumbering.assign_numbers(log, props, ["tags", "descriptions", "missing"])
+    assert [profile["name"] for profile in profiles] == ["tags", "descriptions"]
+    assert all(profile["result"] == {'FINISHED'} for profile in profiles)
+    elements = ifc_file.by_type("IfcElement")
+    assert {element.Tag[1:] for element in elements} == {element.Description[1:] for element in elements} == {str(i) for i in range(1, 31)}
+    assert all(element.Tag[1:] == element.Description[1:] for element in elements)
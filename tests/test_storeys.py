@@ -0,0 +1,38 @@
+"""Tests of inferring the storey of elements that are not contained in a storey."""
+
+import ifcopenshell.guid
+import pytest
+
+import numbering_tool as nt
+
+
+def uncontain(element):
+    rel = element.ContainedInStructure[0]
+    rel.RelatedElements = [related for related in rel.RelatedElements if related != element]
+
+
+@pytest.mark.parametrize("storey_mode", ["CONTAINMENT", "INFERRED"])
+def test_infer_storeys(load_model, storey_mode):
+    ifc_file = load_model(30, 3, 1)
+    storeys = ifc_file.by_type("IfcBuildingStorey")
+    elements = ifc_file.by_type("IfcElement")
+    part, loose = storeys[2].ContainsElements[0].RelatedElements[0], storeys[1].ContainsElements[0].RelatedElements[0]
+    uncontain(part)
+    uncontain(loose)
+    # The part takes the storey of its assembly over its elevation, the loose element the storey at its elevation
+    assembly = ifc_file.createIfcElementAssembly(ifcopenshell.guid.new(), None, "Assembly")
+    ifc_file.createIfcRelAggregates(ifcopenshell.guid.new(), None, None, None, assembly, (part,))
+    ifc_file.createIfcRelContainedInSpatialStructure(ifcopenshell.guid.new(), None, None, None, (assembly,), storeys[0])
+
+    result = nt.number_elements(ifc_file, elements, {"format": "{S}-{E}", "storey_mode": storey_mode})
+    assert result.status == {'FINISHED'}
+    if storey_mode == "INFERRED":
+        assert (part.Tag.partition("-")[0], loose.Tag.partition("-")[0]) == ("0", "1")
+        assert ("INFO", "Inferred the storey of 1 elements from their parent structure and of 1 elements from their elevation.") \
+            in result.messages
+        assert not result.warnings
+    else:
+        assert (part.Tag.partition("-")[0], loose.Tag.partition("-")[0]) == ("x", "x")
+        assert len(result.warnings) == 1 and result.warnings[0].startswith("2 elements are not contained in any storey")
+    assert all(element.Tag.partition("-")[0] == str(storeys.index(element.ContainedInStructure[0].RelatingStructure))
+               for element in elements if element not in (part, loose))
@@ -0,0 +1,53 @@
+"""Tests of numbering type objects and propagating their numbers to the occurrences."""
+
+from ifcopenshell.util.element import get_pset, get_type
+
+import bpy
+import numbering_tool as nt
+
+
+def test_type_numbers_propagate_to_occurrences(load_model):
+    ifc_file = load_model(40, 1, 4)
+    props = bpy.context.scene.ifc_numbering_settings
+    props.selected_types = {"All"}
+    props.format = "[T]{T}-T{E}"
+    props.propagate_toggle = True
+    operator = nt.IFC_AssignTypeNumbers()
+    assert nt.TypeNumbering.execute_with_undo(operator, props) == {'FINISHED'}
+
+    # Sorted by IFC class, the type numbers count within each class
+    assert {type_object.is_a(): type_object.Tag for type_object in ifc_file.by_type("IfcTypeObject")} == \
+        {"IfcBeamType": "B1-T1", "IfcColumnType": "C1-T2", "IfcSlabType": "S1-T3", "IfcWallType": "W1-T4"}
+    assert all(element.Tag == get_type(element).Tag for element in ifc_file.by_type("IfcElement"))
+
+    operator.rollback(operator.transaction_data)
+    assert all(element.Tag is None for element in ifc_file.by_type("IfcRoot") if hasattr(element, "Tag"))
+
+
+def test_type_numbers_of_selected_types(load_model):
+    ifc_file = load_model(40, 1, 4)
+    props = bpy.context.scene.ifc_numbering_settings
+    props.selected_types = {"IfcWall"}
+    props.format = "W{E}"
+    summary = nt.TypeNumbering.assign_numbers(nt.MessageLog(), props)
+    assert summary["types"] == 1
+    assert ifc_file.by_type("IfcWallType")[0].Tag == "W1"
+    assert ifc_file.by_type("IfcColumnType")[0].Tag is None
+    assert all(element.Tag == "W1" for element in ifc_file.by_type("IfcWall"))
+    assert all(element.Tag is None for element in ifc_file.by_type("IfcColumn"))
+
+
+def test_type_numbers_inherited_through_pset(load_model):
+    ifc_file = load_model(20, 1, 2)
+    props = bpy.context.scene.ifc_numbering_settings
+    props.selected_types = {"All"}
+    props.format = "T{E}"
+    props.save_type = "Pset"
+    props.custom_pset_name = "Pset_Numbering"
+    props.pset_name = "Custom Pset"
+    props.propagate_toggle = True
+    summary = nt.TypeNumbering.assign_numbers(nt.MessageLog(), props)
+    # Occurrences inherit the number of their type, so only the type objects are written
+    assert summary["written"] == 2
+    for element in ifc_file.by_type("IfcElement"):
+        assert get_pset(element, "Pset_Numbering", "Number") == get_pset(get_type(element), "Pset_Numbering", "Number")
@@ -0,0 +1,52 @@
+"""Tests of validating the stored numbers against the numbering settings."""
+
+import csv
+
+import numbering_tool as nt
+
+
+def test_validate_numbered_model(load_model):
+    ifc_file = load_model(60, 3, 2)
+    settings = {"format": "{S}-[T]{E}", "storey_numbering": "number"}
+    nt.number_elements(ifc_file, ifc_file.by_type("IfcElement"), settings)
+    summary = nt.validate_numbers(ifc_file, settings)
+    assert (summary["checked"], summary["unnumbered"]) == (60, 0)
+    assert summary["violations"] == []
+
+
+def test_validate_reports_violations(load_model, tmp_path):
+    ifc_file = load_model(60, 3, 2)
+    settings = {"format": "{S}-{E}"}
+    elements = ifc_file.by_type("IfcElement")
+    nt.number_elements(ifc_file, elements, settings)
+    elements[0].Tag = "bad"
+    elements[1].Tag = elements[2].Tag
+    storey, _, number = elements[3].Tag.partition("-")
+    elements[3].Tag = f"{int(storey) + 1}-{number}"
+    elements[4].Tag = None
+
+    filepath = str(tmp_path / "violations.csv")
+    summary = nt.validate_numbers(ifc_file, settings, filepath)
+    assert {key: summary[key] for key in ("checked", "unnumbered", "format", "duplicate", "storey")} == \
+        {"checked": 59, "unnumbered": 1, "format": 1, "duplicate": 1, "storey": 1}
+    with open(filepath, newline="") as f:
+        rows = list(csv.DictReader(f))
+    assert {(row["GlobalId"], row["Violation"]) for row in rows} == \
+        {(elements[0].GlobalId, "format"), (elements[3].GlobalId, "storey"),
+         (max(elements[1:3], key=lambda element: element.id()).GlobalId, "duplicate")}
+
+
+def test_validate_duplicates_within_scope(load_model):
+    ifc_file = load_model(40, 2, 1)
+    nt.number_elements(ifc_file, ifc_file.by_type("IfcElement"), {"format": "{E}", "scope": "STOREY"})
+    assert nt.validate_numbers(ifc_file, {"format": "{E}", "scope": "STOREY"})["duplicate"] == 0
+    assert nt.validate_numbers(ifc_file, {"format": "{E}"})["duplicate"] == 20
+
+
+def test_validate_with_pattern(load_model):
+    ifc_file = load_model(20, 1, 1)
+    nt.number_elements(ifc_file, ifc_file.by_type("IfcElement"), {"format": "W{E}"})
+    assert nt.validate_numbers(ifc_file, {"validation_pattern": r"W\d{1,2}"})["format"] == 0
+    assert nt.validate_numbers(ifc_file, {"validation_pattern": r"W\d"})["format"] == 11
+    summary = nt.validate_numbers(ifc_file, {"validation_pattern": "W("})
+    assert summary["messages"][0][0] == "ERROR"